@@ -32,17 +32,30 @@ allList = '\n__all__ = ["gui", "misc", "visual", "core", "event", "data", "filte
 
 getGitShaRuntime="""
 if __git_sha__=='n/a':
-    import subprocess
-    #see if we're in a git repo and fetch from there
-    repo_commit=False
-    proc = subprocess.Popen('git rev-parse --short HEAD',
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            cwd='.', shell=True)
-    repo_commit, _ = proc.communicate()
-    del proc#to get rid of the background process
-    if repo_commit:
-        __git_sha__=repo_commit.strip()#remove final linefeed
+    #see if we're in a git repo and fetch from there (reading the files
+    #directly is much quicker than starting git in a subprocess)
+    def _getGitSha():
+        import os
+        gitDir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.git')
+        try:
+            if os.path.isfile(gitDir):#a worktree or submodule: 'gitdir: path'
+                gitDir = os.path.join(os.path.dirname(gitDir),
+                    open(gitDir).read().split(':',1)[1].strip())
+            head = open(os.path.join(gitDir, 'HEAD')).read().strip()
+            if not head.startswith('ref:'):
+                return head[:7]#a detached head is just the sha
+            ref = head[4:].strip()
+            refFile = os.path.join(gitDir, *ref.split('/'))
+            if os.path.isfile(refFile):
+                return open(refFile).read().strip()[:7]
+            for line in open(os.path.join(gitDir, 'packed-refs')):
+                if line.rstrip().endswith(' '+ref):
+                    return line.split()[0][:7]
+        except (IOError, OSError, IndexError):
+            pass
+        return 'n/a'
+    __git_sha__ = _getGitSha()
+    del _getGitSha
 
 from psychopy.preferences import Preferences
 import sys
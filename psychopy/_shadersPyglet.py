@@ -5,7 +5,9 @@
 from ctypes import *
 import pyglet
 GL=pyglet.gl
-import sys
+import sys, os, struct
+from hashlib import sha1
+from psychopy import logging
 
 def print_log(shader):
     length = c_int()
@@ -17,8 +19,11 @@ def print_log(shader):
         print >> sys.stderr, log.value
 
 
-def compileProgram(vertexSource=None, fragmentSource=None):
+def compileProgram(vertexSource=None, fragmentSource=None, retrievable=False):
         """Create and compile a vertex and fragment shader pair from their sources (strings)
+
+        If `retrievable` is True the driver is asked to keep the linked binary
+        available for glGetProgramBinary (see :class:`ShaderProgram`)
         """
 
         def compileShader( source, shaderType ):
@@ -43,6 +48,7 @@ def compileProgram(vertexSource=None, fragmentSource=None):
                 return shader
 
         program = GL.glCreateProgramObjectARB()
+        vertexShader = fragmentShader = None
 
         if vertexSource:
                 vertexShader = compileShader(
@@ -55,6 +61,8 @@ def compileProgram(vertexSource=None, fragmentSource=None):
                 )
                 GL.glAttachObjectARB(program, fragmentShader)
 
+        if retrievable:
+                GL.glProgramParameteri(program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
         GL.glValidateProgramARB( program )
         GL.glLinkProgramARB(program)
 
@@ -65,6 +73,170 @@ def compileProgram(vertexSource=None, fragmentSource=None):
 
         return program
 
+def haveProgramBinary():
+    """Whether the driver can save and load linked programs (GL_ARB_get_program_binary)
+    """
+    if not GL.gl_info.have_extension('GL_ARB_get_program_binary'):
+        return False
+    nFormats = GL.GLint()
+    GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS, byref(nFormats))
+    return nFormats.value>0
+
+class _Locations(dict):
+    """A dict of name:location whose missing names are at location -1, as
+    glGetUniformLocation would say for a variable that the compiler optimised
+    out (and setting a uniform at -1 is silently ignored)
+    """
+    def __missing__(self, name):
+        return -1
+
+def _activeVariables(program, countEnum, getActive, getLocation):
+    """Returns a dict of name:location for the active uniforms (or attributes)
+    of a program (inactive names are at -1)
+    """
+    count = GL.GLint()
+    GL.glGetProgramiv(program, countEnum, byref(count))
+    names = _Locations()
+    nameBuffer = create_string_buffer(256)
+    length, size, varType = GL.GLsizei(), GL.GLint(), GL.GLenum()
+    for index in range(count.value):
+        getActive(program, index, 256, byref(length), byref(size), byref(varType), nameBuffer)
+        name = nameBuffer.value
+        location = getLocation(program, name)
+        if location<0:#a built-in variable such as gl_Vertex
+            continue
+        names[name] = location
+        if name.endswith('[0]'):#arrays can be referred to by name too
+            names[name[:-3]] = location
+    return names
+
+class ShaderProgram(object):
+    """A GLSL program that is compiled and linked the first time it is used
+    (when its `handle` is first needed).
+
+    Once compiled, `uniforms` and `attributes` map the names of the program's
+    active uniform and attribute variables to their locations, so that draw
+    code needn't look them up (by string) itself. A name that isn't active
+    (e.g. a uniform that the compiler optimised out) is at location -1::
+
+        prog = win.getShader('signedTexMask')
+        GL.glUseProgram(prog.handle)
+        GL.glUniform1i(prog.uniforms['mask'], 1)
+
+    If `binaryCacheDir` is given and the driver supports
+    GL_ARB_get_program_binary, the linked program is saved there and loaded
+    (rather than compiled) next time. The cached binary is specific to the
+    graphics card and driver, and is silently recompiled if the driver rejects it.
+    """
+    def __init__(self, vertexSource=None, fragmentSource=None, binaryCacheDir=None):
+        self.vertexSource = vertexSource
+        self.fragmentSource = fragmentSource
+        self.binaryCacheDir = binaryCacheDir
+        self.uniforms = _Locations()
+        self.attributes = _Locations()
+        self.fromBinaryCache = False#True if the last compile() loaded a cached binary
+        self._handle = None
+    def _getHandle(self):
+        if self._handle is None:
+            self.compile()
+        return self._handle
+    handle = property(_getHandle, doc="The GL program (compiled on first use)")
+    def isCompiled(self):
+        return self._handle is not None
+    def compile(self):
+        """Compile and link the program now (rather than on first use)
+        """
+        useCache = bool(self.binaryCacheDir) and haveProgramBinary()
+        program = None
+        if useCache:
+            program = self._loadBinary()
+        self.fromBinaryCache = program is not None
+        if program is None:
+            program = compileProgram(self.vertexSource, self.fragmentSource,
+                retrievable=useCache)
+            if useCache:
+                self._saveBinary(program)
+        self._handle = program
+        self.uniforms = _activeVariables(program, GL.GL_ACTIVE_UNIFORMS,
+            GL.glGetActiveUniform, GL.glGetUniformLocation)
+        self.attributes = _activeVariables(program, GL.GL_ACTIVE_ATTRIBUTES,
+            GL.glGetActiveAttrib, GL.glGetAttribLocation)
+    def delete(self):
+        """Delete the GL program (it will be recompiled if used again)
+        """
+        if self._handle is not None:
+            GL.glDeleteProgram(self._handle)
+            self._handle = None
+    def _binaryFileName(self):
+        key = sha1()
+        for text in [GL.gl_info.get_vendor(), GL.gl_info.get_renderer(),
+                GL.gl_info.get_version(), self.vertexSource or '', self.fragmentSource or '']:
+            key.update(text)
+            key.update('\0')
+        return os.path.join(self.binaryCacheDir, key.hexdigest()+'.bin')
+    def _loadBinary(self):
+        fileName = self._binaryFileName()
+        if not os.path.isfile(fileName):
+            return None
+        try:
+            f = open(fileName, 'rb')
+            data = f.read()
+            f.close()
+        except IOError:
+            return None
+        if len(data)<=4:
+            return None
+        binaryFormat = struct.unpack('<I', data[:4])[0]
+        program = GL.glCreateProgram()
+        GL.glProgramBinary(program, binaryFormat, data[4:], len(data)-4)
+        status = GL.GLint()
+        GL.glGetProgramiv(program, GL.GL_LINK_STATUS, byref(status))
+        if not status.value:#e.g. the driver has been updated
+            GL.glDeleteProgram(program)
+            return None
+        return program
+    def _saveBinary(self, program):
+        length = GL.GLint()
+        GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH, byref(length))
+        if length.value<=0:
+            return
+        data = create_string_buffer(length.value)
+        binaryFormat = GL.GLenum()
+        GL.glGetProgramBinary(program, length.value, None, byref(binaryFormat), data)
+        try:
+            if not os.path.isdir(self.binaryCacheDir):
+                os.makedirs(self.binaryCacheDir)
+            f = open(self._binaryFileName(), 'wb')
+            f.write(struct.pack('<I', binaryFormat.value)+data.raw)
+            f.close()
+        except (IOError, OSError), err:
+            logging.debug('Could not save shader binary: %s' %err)
+
+class ShaderRegistry(object):
+    """The shader programs of a Window, by name. Programs are only compiled
+    when first used (see :class:`ShaderProgram`) and each is compiled once per
+    Window.
+    """
+    def __init__(self, binaryCacheDir=None):
+        self.binaryCacheDir = binaryCacheDir
+        self._programs = {}
+    def __contains__(self, name):
+        return name in self._programs
+    def register(self, name, vertexSource=None, fragmentSource=None):
+        """Add a program (replacing any existing program of that name) and
+        return its :class:`ShaderProgram`
+        """
+        if name in self._programs:
+            self._programs[name].delete()
+        prog = ShaderProgram(vertexSource, fragmentSource, self.binaryCacheDir)
+        self._programs[name] = prog
+        return prog
+    def get(self, name):
+        return self._programs[name]
+    def deleteAll(self):
+        for prog in self._programs.values():
+            prog.delete()
+
 fragSignedColor = '''
     // Fragment program
     uniform sampler2D texture;
@@ -125,6 +297,19 @@ vertSimple = """
             gl_Position =  ftransform();
     }
     """
+#as vertSimple, but the coords of texture 0 are scaled and offset by
+#texTransform (xScale, yScale, xOffset, yOffset), so that e.g. the phase and sf
+#of a grating can change without changing its vertices
+vertTexTransform = """
+    uniform vec4 texTransform;
+    void main() {
+            gl_FrontColor = gl_Color;
+            gl_TexCoord[0] = vec4(gl_MultiTexCoord0.xy*texTransform.xy+texTransform.zw, 0.0, 1.0);
+            gl_TexCoord[1] = gl_MultiTexCoord1;
+            gl_TexCoord[2] = gl_MultiTexCoord2;
+            gl_Position =  ftransform();
+    }
+    """
 cartoonVertexSource = '''
     // Vertex program
     varying vec3 normal;
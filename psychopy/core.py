@@ -21,6 +21,10 @@ except:
     havePyglet = False
     checkPygletDuringWait = False
 
+#held while the event dispatchers of windows (win._eventDispatchers) are
+#dispatched, so that an event.InputPoller thread can poll them too
+_dispatchLock = threading.RLock()
+
 def quit():
     """Close everything and exit nicely (ending the experiment)
     """
@@ -116,16 +120,183 @@ class CountdownTimer(Clock):
         """
         self.timeAtLastReset += t
 
-def wait(secs, hogCPUperiod=0.2):
+class WaitScheduler(object):
+    """Waits until a time as precisely as possible without hogging the CPU
+    for longer than needed. Used by :func:`wait` and :func:`waitUntil`
+    (as `core.waitScheduler`), so you only need it to change the settings::
+
+        core.waitScheduler.pumpRate = 250#dispatch events at 250Hz while waiting
+
+    Most of the wait is spent in time.sleep(). Sleeping can overshoot (by
+    how much depends on the OS), so the final part of the wait, a little
+    longer than the overshoot, polls the clock instead (spins). The overshoot
+    is first measured during the first wait of at least 50ms and is then
+    updated after every sleep (quickly if sleeps overshoot more than
+    expected, slowly if they overshoot less).
+
+    While waiting (in the main thread) the events of the pyglet windows and
+    pyglet.media are dispatched `pumpRate` times per second (None for never,
+    or set core.checkPygletDuringWait = False), rather than on every loop of
+    the spin.
+
+    :Parameters:
+
+        pumpRate : how often (Hz) to dispatch events while waiting
+
+        spinFactor : the spin lasts spinFactor*sleepOvershoot (+0.2ms)
+
+    `getStats()` reports how precisely the waits ended.
+    """
+    def __init__(self, pumpRate=1000.0, spinFactor=1.5):
+        self.pumpRate = pumpRate
+        self.spinFactor = spinFactor
+        self.sleepOvershoot = 0.002#until it is measured
+        self.calibrated = False
+        self._lock = threading.Lock()
+        self.resetStats()
+    def calibrate(self, nSleeps=10, sleepTime=0.001, maxTime=None):
+        """Measures how much time.sleep(sleepTime) overshoots (the 90th
+        percentile of nSleeps, or of those that fit in maxTime) and sets
+        `sleepOvershoot`
+        """
+        overshoots = []
+        tStart = getTime()
+        for n in range(nSleeps):
+            t0 = getTime()
+            time.sleep(sleepTime)
+            overshoots.append(getTime()-t0-sleepTime)
+            if maxTime is not None and getTime()-tStart+sleepTime+max(overshoots)>maxTime:
+                break
+        nSleeps = len(overshoots)
+        overshoots.sort()
+        overshoot = max(overshoots[int(0.9*(nSleeps-1))], 0.0)
+        with self._lock:#waits can run in several threads (e.g. emulators)
+            self.sleepOvershoot = overshoot
+            self.calibrated = True
+        return overshoot
+    def resetStats(self):
+        """Resets the statistics reported by getStats()"""
+        with self._lock:
+            self._nWaits = 0
+            self._sumErr = 0.0
+            self._sumSqErr = 0.0
+            self._maxErr = 0.0
+            self._waitTime = 0.0
+            self._spinTime = 0.0
+    def getStats(self):
+        """Returns a dict about the waits since resetStats(): nWaits,
+        meanError, sdError and maxError (how late they ended, in s),
+        spinFraction (the proportion of the waiting time spent polling the
+        clock) and sleepOvershoot
+        """
+        with self._lock:
+            n = self._nWaits
+            stats = {'nWaits': n, 'maxError': self._maxErr,
+                'sleepOvershoot': self.sleepOvershoot, 'meanError': None,
+                'sdError': None, 'spinFraction': None}
+            if n:
+                mean = self._sumErr/n
+                stats['meanError'] = mean
+                stats['sdError'] = max(self._sumSqErr/n-mean**2, 0.0)**0.5
+            if self._waitTime>0:
+                stats['spinFraction'] = self._spinTime/self._waitTime
+        return stats
+    def waitUntil(self, t, hogCPUperiod=None):
+        """Waits until core.getTime() reaches t. If hogCPUperiod is given
+        the clock is polled for that long (at most) at the end, instead of
+        for the adaptive period
+        """
+        tStart = now = getTime()
+        if t-now>=0.05 and not self.calibrated:
+            self.calibrate(maxTime=(t-now)/2.0)#a few ms that were to be slept anyway
+            now = getTime()
+        pump = self.pumpRate and havePyglet and checkPygletDuringWait \
+            and threading.current_thread() is _mainThread
+        if pump:
+            pumpInterval = 1.0/self.pumpRate
+            tPump = now
+        else:
+            pumpInterval = t-now#only need to wake up to spin
+        #sleep (in chunks, to dispatch events in between)
+        while True:
+            if hogCPUperiod is None:
+                spin = self.sleepOvershoot*self.spinFactor+0.0002
+            else:
+                spin = hogCPUperiod
+            toSleep = min(t-now-spin, pumpInterval)
+            if toSleep<=0:
+                break
+            time.sleep(toSleep)
+            slept = getTime()-now
+            self._updateOvershoot(slept-toSleep)
+            now += slept
+            if pump:
+                _pumpEvents()
+                now = tPump = getTime()
+        #spin, dispatching events at pumpRate
+        tSpin = now
+        while now<t:
+            if pump and now-tPump>=pumpInterval:
+                _pumpEvents()
+                tPump = getTime()
+            now = getTime()
+        with self._lock:
+            err = now-t
+            self._nWaits += 1
+            self._sumErr += err
+            self._sumSqErr += err*err
+            self._maxErr = max(self._maxErr, err)
+            self._waitTime += now-tStart
+            self._spinTime += now-tSpin
+    def _updateOvershoot(self, overshoot):
+        #rise quickly when the sleeps overshoot more, decay slowly when less
+        with self._lock:
+            if overshoot>self.sleepOvershoot:
+                self.sleepOvershoot += 0.5*(overshoot-self.sleepOvershoot)
+            else:
+                self.sleepOvershoot += 0.02*(overshoot-self.sleepOvershoot)
+
+_mainThread = threading.current_thread()
+
+def _pumpEvents():
+    """Dispatches the events of pyglet.media and the pyglet windows (if they
+    have been imported, i.e. there could be any)
+    """
+    try:
+        if 'pyglet.media' in sys.modules:
+            # this takes focus away from command line terminal window:
+            pyglet.media.dispatch_events()#events for sounds/video should run independently of wait()
+        if 'pyglet.window' in sys.modules:
+            _dispatchWindowEvents()
+    except:
+        pass #presumably not pyglet
+
+def _dispatchWindowEvents():
+    """Dispatches the events of all pyglet windows (in the main thread; an
+    event.InputPoller only polls the windows' other input devices, see
+    _dispatchLock), for core.wait() and event.getKeys() etc.
+    """
+    wins = pyglet.window.get_platform().get_default_display().get_windows()
+    for win in wins: win.dispatch_events()#pump events on pyglet windows
+
+waitScheduler = WaitScheduler()
+
+def wait(secs, hogCPUperiod=None):
     """Wait for a given time period.
 
-    If secs=10 and hogCPU=0.2 then for 9.8s python's time.sleep function will be used,
-    which is not especially precise, but allows the cpu to perform housekeeping. In
-    the final hogCPUperiod the more precise method of constantly polling the clock
-    is used for greater precision.
+    Most of the wait uses python's time.sleep function, which is not
+    especially precise but allows the cpu to perform housekeeping, and the
+    final part constantly polls the clock for precision. How long that
+    final part is adapts to how precise time.sleep is on this computer (see
+    :class:`WaitScheduler`), or is hogCPUperiod if that is given.
+
+    Events of pyglet windows are dispatched throughout the wait (at
+    core.waitScheduler.pumpRate), so key-presses during the wait are
+    collected and can be retrieved with event.getKeys() after calling
+    core.wait().
 
-    If you want to obtain key-presses during the wait, be sure to use pyglet and
-    to hogCPU for the entire time, and then call event.getKeys() after calling core.wait()
+    To wait until a particular time, without the small errors of successive
+    waits adding up, use :func:`waitUntil`.
 
     If you want to suppress checking for pyglet events during the wait, do this once:
         core.checkPygletDuringWait = False
@@ -133,24 +304,30 @@ def wait(secs, hogCPUperiod=0.2):
         core.wait(sec)
     This will preserve terminal-window focus during command line usage.
     """
-    #initial relaxed period, using sleep (better for system resources etc)
-    if secs>hogCPUperiod:
-        time.sleep(secs-hogCPUperiod)
-        secs=hogCPUperiod#only this much is now left
-
-    #hog the cpu, checking time
-    t0=getTime()
-    while (getTime()-t0)<secs:
-        if not (havePyglet and checkPygletDuringWait):
-            continue
-        #let's see if pyglet collected any event in meantime
-        try:
-            # this takes focus away from command line terminal window:
-            pyglet.media.dispatch_events()#events for sounds/video should run independently of wait()
-            wins = pyglet.window.get_platform().get_default_display().get_windows()
-            for win in wins: win.dispatch_events()#pump events on pyglet windows
-        except:
-            pass #presumably not pyglet
+    waitScheduler.waitUntil(getTime()+secs, hogCPUperiod=hogCPUperiod)
+
+def waitUntil(t, clock=None, hogCPUperiod=None):
+    """Wait until time t, on the given `Clock` (or core.getTime() if None).
+
+    Unlike successive calls to :func:`wait` the deadlines don't drift, e.g.
+    to show a stimulus every 2s for a whole scan::
+
+        scanClock = core.Clock()
+        for volN in range(1, 200):
+            ...
+            core.waitUntil(volN*2.0, clock=scanClock)
+
+    Returns immediately if t has passed already.
+    """
+    if clock is not None:
+        t += clock.timeAtLastReset
+    waitScheduler.waitUntil(t, hogCPUperiod=hogCPUperiod)
+
+def getWaitStats():
+    """Returns statistics about how precisely waits have ended (see
+    :meth:`WaitScheduler.getStats`)
+    """
+    return waitScheduler.getStats()
 
 def shellCall(shellCmd, stdin='', stderr=False):
     """Call a single system command with arguments, return its stdout.
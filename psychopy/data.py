@@ -8,21 +8,20 @@ from psychopy import misc, gui, logging
 import psychopy
 import cPickle, string, sys, platform, os, time, copy, csv
 import numpy
-from scipy import optimize, special
-from matplotlib import mlab    #used for importing csv files
+from psychopy.lazyImport import LazyModule, isInstalled
+optimize = LazyModule('scipy.optimize')#only needed for fitting functions
+special = LazyModule('scipy.special')
 from contrib.quest import *    #used for QuestHandler
 import inspect #so that Handlers can find the script that called them
 import codecs, locale
 import weakref
 import re
+import shutil
+import ast, hashlib
 
-try:
-    import openpyxl
-    from openpyxl.cell import get_column_letter
-    from openpyxl.reader.excel import load_workbook
-    haveOpenpyxl=True
-except:
-    haveOpenpyxl=False
+haveOpenpyxl = isInstalled('openpyxl')#but only import it if it gets used
+_openpyxlCell = LazyModule('openpyxl.cell')
+_openpyxlExcelReader = LazyModule('openpyxl.reader.excel')
 
 _experiments=weakref.WeakValueDictionary()
 _nonalphanumeric_re = re.compile(r'\W') # will match all bad var name chars
@@ -38,6 +37,7 @@ class ExperimentHandler(object):
         exp = data.ExperimentHandler(name="Face Preference",version='0.1.0')
 
     """
+    _wideTextStream=None#so that handlers from older psydat files have this too
     def __init__(self,
                 name='',
                 version='',
@@ -46,7 +46,9 @@ class ExperimentHandler(object):
                 originPath=None,
                 savePickle=True,
                 saveWideText=True,
-                dataFileName=''):
+                dataFileName='',
+                streamWideText=False,
+                fsyncEvery=50):
         """
         :parameters:
 
@@ -75,6 +77,22 @@ class ExperimentHandler(object):
                 The handler will attempt to populate the file even in the
                 event of a (not too serious) crash!
 
+            streamWideText : True or *False*
+                If True (and a dataFileName is given) each entry is written to
+                the wide-text file (dataFileName+'.csv') as soon as
+                nextEntry() is called, rather than being kept in memory and
+                saved at the end. The data are then safe even after a serious
+                crash and long sessions need no memory for the entries (so
+                `exp.entries` stays empty). If new columns appear after the
+                first entry they are added to the ends of the rows and the
+                complete header is kept in a sidecar file
+                (dataFileName+'.csv.header') until the handler is finished.
+
+            fsyncEvery : int (default 50)
+                When streaming, the file is flushed after every entry and
+                forced onto the disk (os.fsync) after this many entries
+                (0 or None for never).
+
         """
         self.loops=[]
         self.loopsUnfinished=[]
@@ -93,8 +111,13 @@ class ExperimentHandler(object):
         self.entries=[]#chronological list of entries
         self._paramNamesSoFar=[]
         self.dataNames=[]#names of all the data (eg. resp.keys)
+        self._wideTextStream=None
         if dataFileName in ['', None]:
             logging.warning('ExperimentHandler created with no dataFileName parameter. No data will be saved in the event of a crash')
+            if streamWideText:
+                logging.warning('ExperimentHandler needs a dataFileName to use streamWideText')
+        elif streamWideText:
+            self._wideTextStream=_WideTextStream(dataFileName+'.csv', delim=',', fsyncEvery=fsyncEvery)
     def __del__(self):
         if self.dataFileName not in ['', None]:
             logging.debug('Saving data for %s ExperimentHandler' %self.name)
@@ -102,6 +125,8 @@ class ExperimentHandler(object):
                 self.saveAsPickle(self.dataFileName)
             if self.saveWideText==True:
                 self.saveAsWideText(self.dataFileName+'.csv', delim=',')
+        if self._wideTextStream is not None:
+            self._wideTextStream.close()
     def addLoop(self, loopHandler):
         """Add a loop such as a `~psychopy.data.TrialHandler` or `~psychopy.data.StairHandler`
         Data from this loop will be included in the resulting data files.
@@ -220,9 +245,19 @@ class ExperimentHandler(object):
         #add the extraInfo dict to the data
         if type(self.extraInfo)==dict:
             this.update(self.extraInfo)#NB update() really means mergeFrom()
-        self.entries.append(this)
+        if self._wideTextStream is not None:
+            self._wideTextStream.write(this, self._getWideTextNames())
+        else:
+            self.entries.append(this)
         #then create new empty entry for n
         self.thisEntry = {}
+    def _getWideTextNames(self):
+        """Returns the column names of the wide-text output
+        """
+        names = self._getAllParamNames()
+        names.extend(self.dataNames)
+        names.extend(self._getExtraInfo()[0]) #names from the extraInfo dictionary
+        return names
     def saveAsWideText(self, fileName, delim=None,
                    matrixOnly=False,
                    appendFile=False):
@@ -234,7 +269,17 @@ class ExperimentHandler(object):
 
         If `matrixOnly=True` then the file will not contain a header row, which can be handy if you want to append data
         to an existing file of the same format.
+
+        If the handler was created with `streamWideText=True` the entries have
+        already been written, so this just completes that file.
         """
+        if self._wideTextStream is not None:
+            if os.path.abspath(fileName)!=os.path.abspath(self._wideTextStream.fileName):
+                logging.warning('Data for %s were streamed to %s (not saved to %s)'
+                    %(self.name, self._wideTextStream.fileName, fileName))
+            self._wideTextStream.close()
+            self.saveWideText=False
+            return
 
         #create the file or print to stdout
         if appendFile: writeFormat='a'
@@ -257,25 +302,13 @@ class ExperimentHandler(object):
             else:
                 f=codecs.open(fileName+'.dlm',writeFormat, encoding = "utf-8")
 
-        names = self._getAllParamNames()
-        names.extend(self.dataNames)
-        names.extend(self._getExtraInfo()[0]) #names from the extraInfo dictionary
+        names = self._getWideTextNames()
         #write a header line
         if not matrixOnly:
-            for heading in names:
-                f.write(u'%s%s' %(heading,delim))
-            f.write('\n')
+            f.write(_wideTextRow(names, delim))
         #write the data for each entry
         for entry in self.entries:
-            for name in names:
-                if name in entry.keys():
-                    if ',' in unicode(entry[name]):
-                        f.write(u'"%s"%s' %(entry[name],delim))
-                    else:
-                        f.write(u'%s%s' %(entry[name],delim))
-                else:
-                    f.write(delim)
-            f.write('\n')
+            f.write(_wideTextEntry(entry, names, delim))
         f.close()
         self.saveWideText=False
     def saveAsPickle(self,fileName, fileCollisionMethod = 'rename'):
@@ -309,6 +342,108 @@ class ExperimentHandler(object):
         """
         self.savePickle=False
         self.saveWideText=False
+        if self._wideTextStream is not None:
+            self._wideTextStream.close()#entries so far have already been written
+
+def _wideTextRow(cells, delim):
+    """Returns one line of a wide-text file (each cell is followed by delim)
+    """
+    return u''.join([u'%s%s' %(cell,delim) for cell in cells])+u'\n'
+
+def _wideTextEntry(entry, names, delim):
+    """Returns the line for one entry (dict) of an ExperimentHandler, with
+    a cell for each of `names` (empty if the entry has no such key)
+    """
+    cells=[]
+    for name in names:
+        if name in entry:
+            val = entry[name]
+            if ',' in unicode(val):
+                cells.append(u'"%s"' %val)
+            else:
+                cells.append(val)
+        else:
+            cells.append(u'')
+    return _wideTextRow(cells, delim)
+
+class _WideTextStream(object):
+    """Appends the entries of an ExperimentHandler to a wide-text file as they
+    are completed (see ExperimentHandler `streamWideText`).
+
+    The header line is written along with the first entry. Columns that appear
+    later are added to the end of the rows and the full header is kept in a
+    sidecar file (fileName+'.header'), which is merged into the data file by
+    close().
+    """
+    def __init__(self, fileName, delim=',', fsyncEvery=50):
+        self.fileName=fileName
+        self.headerFileName=fileName+'.header'
+        self.delim=delim
+        self.fsyncEvery=fsyncEvery
+        self.names=[]
+        self._knownNames=set()
+        self._nNamesInFile=0#number of names in the header line of the data file
+        self.nEntries=0
+        if os.path.exists(fileName):
+            logging.warning('Data file, %s, will be overwritten' %fileName)
+        self._file=codecs.open(fileName, 'w', encoding = "utf-8")
+    def __getstate__(self):
+        #open files can't be pickled (e.g. as part of an ExperimentHandler)
+        state=self.__dict__.copy()
+        state['_file']=None
+        return state
+    def write(self, entry, names):
+        """Write one entry (a dict). New columns are taken in the order of
+        `names` and then any other keys of the entry
+        """
+        if self._file is None:
+            logging.error('Data stream to %s has already been closed' %self.fileName)
+            return
+        nNames=len(self.names)
+        for name in names:
+            if name not in self._knownNames:
+                self.names.append(name)
+                self._knownNames.add(name)
+        for name in entry:
+            if name not in self._knownNames:
+                self.names.append(name)
+                self._knownNames.add(name)
+        if self.nEntries==0:
+            self._file.write(_wideTextRow(self.names, self.delim))
+            self._nNamesInFile=len(self.names)
+        if len(self.names)>nNames:
+            self._writeHeaderFile()
+        self._file.write(_wideTextEntry(entry, self.names, self.delim))
+        self._file.flush()
+        self.nEntries+=1
+        if self.fsyncEvery and self.nEntries%self.fsyncEvery==0:
+            os.fsync(self._file.fileno())
+    def _writeHeaderFile(self):
+        f=codecs.open(self.headerFileName, 'w', encoding = "utf-8")
+        f.write(_wideTextRow(self.names, self.delim))
+        f.close()
+    def close(self):
+        """Finish the file, rewriting its header line if columns were added
+        after the first entry, and remove the sidecar header file
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file=None
+        if len(self.names)>self._nNamesInFile:
+            #copy the rows (not all in memory) below the complete header
+            tmpFileName=self.fileName+'.tmp'
+            src=codecs.open(self.fileName, 'r', encoding = "utf-8")
+            dst=codecs.open(tmpFileName, 'w', encoding = "utf-8")
+            src.readline()#the incomplete header
+            dst.write(_wideTextRow(self.names, self.delim))
+            shutil.copyfileobj(src, dst)
+            src.close()
+            dst.close()
+            os.remove(self.fileName)
+            os.rename(tmpFileName, self.fileName)
+        if os.path.exists(self.headerFileName):
+            os.remove(self.headerFileName)
 
 class TrialType(dict):
     """This is just like a dict, except that you can access keys with obj.key
@@ -605,7 +740,8 @@ class TrialHandler(_BaseTrialHandler):
     """Class to handle trial sequencing and data storage.
 
     Calls to .next() will fetch the next trial object given to this handler,
-    according to the method specified (random, sequential, fullRandom). Calls
+    according to the method specified (random, sequential, fullRandom, or one
+    of the other :func:`~psychopy.data.registerSequenceMethod` names). Calls
     will raise a StopIteration error if trials have finished.
 
     See demo_trialHandler.py
@@ -642,6 +778,12 @@ class TrialHandler(_BaseTrialHandler):
                 occur once before the second repeat etc. 'fullRandom' fully randomises the
                 trials across repeats as well, which means you could potentially run all trials of
                 one condition before any trial of another.
+                'randomNoRepeat' is like 'random' but never presents the same condition twice in
+                a row (at the boundary between repeats). 'blocked' runs all the repeats of one
+                condition before moving on to the next, with the conditions in random order.
+                'latinSquare' uses the rows of a balanced Latin square (a different row for each
+                repeat) so that each condition follows every other equally often.
+                Other methods can be added with :func:`~psychopy.data.registerSequenceMethod`
 
             dataTypes: (optional) list of names for data storage. e.g. ['corr','rt','resp']
                 If not provided then these will be created as needed during calls to
@@ -653,7 +795,9 @@ class TrialHandler(_BaseTrialHandler):
 
             seed: an integer
                 If provided then this fixes the random number generator to use the same pattern
-                of trials, by seeding its startpoint
+                of trials, by seeding its startpoint. Each TrialHandler has its own generator
+                (a numpy.random.RandomState). Without a seed that generator is itself seeded
+                from numpy.random, so numpy.random.seed() still makes the sequence repeatable
 
             originPath: a string describing the location of the script/experiment file path
                 The psydat file format will store a copy of the experiment if possible. If no file path
@@ -680,6 +824,9 @@ class TrialHandler(_BaseTrialHandler):
 
             .thisTrial - a dictionary giving the parameters of the current trial
 
+            .sequenceIndices - the condition index of every trial, as an int array of
+                [conditionN, repN] (a view onto the flat schedule, in presentation order)
+
             .finished - True/False for have we finished yet
 
             .extraInfo - the dictionary of extra info as given at beginning
@@ -709,6 +856,9 @@ class TrialHandler(_BaseTrialHandler):
         self.extraInfo=extraInfo
         self._warnUseOfNext=True
         self.seed=seed
+        if seed is None:
+            seed = numpy.random.randint(2**31-1)
+        self._rng = numpy.random.RandomState(seed)
         #create dataHandler
         self.data = DataHandler(trials=self)
         if dataTypes!=None:
@@ -717,7 +867,7 @@ class TrialHandler(_BaseTrialHandler):
         self.data['ran'].mask=False#this is a bool - all entries are valid
         self.data.addDataType('order')
         #generate stimulus sequence
-        if self.method in ['random','sequential', 'fullRandom']:
+        if self.method in _sequenceMethods:
             self.sequenceIndices = self._createSequence()
         else: self.sequenceIndices=[]
 
@@ -783,62 +933,20 @@ class TrialHandler(_BaseTrialHandler):
         These 30 trials will be returned by .next() in the order:
             0, 1, 2, 3, 4, 5,   0, 1, 2, ...  ... 3, 4, 5
 
-        To add a new type of sequence (as of v1.65.02):
-        - add the sequence generation code here
-        - adjust "if self.method in [ ...]:" in both __init__ and .next()
-        - adjust allowedVals in experiment.py -> shows up in DlgLoopProperties
-        Note that users can make any sequence whatsoever outside of PsychoPy, and
-        specify sequential order; any order is possible this way.
-        """
-        # create indices for a single rep
-        indices = numpy.asarray(self._makeIndices(self.trialList), dtype=int)
-
-        if self.method == 'random':
-            sequenceIndices = []
-            seed=self.seed
-            for thisRep in range(self.nReps):
-                thisRepSeq = misc.shuffleArray(indices.flat, seed=seed).tolist()
-                seed=None#so that we only seed the first pass through!
-                sequenceIndices.append(thisRepSeq)
-            sequenceIndices = numpy.transpose(sequenceIndices)
-        elif self.method == 'sequential':
-            sequenceIndices = numpy.repeat(indices,self.nReps,1)
-        elif self.method == 'fullRandom':
-            # indices*nReps, flatten, shuffle, unflatten; only use seed once
-            sequential = numpy.repeat(indices, self.nReps,1) # = sequential
-            randomFlat = misc.shuffleArray(sequential.flat, seed=self.seed)
-            sequenceIndices = numpy.reshape(randomFlat, (len(indices), self.nReps))
+        The sequence itself is generated by the function registered for
+        self.method (see :func:`~psychopy.data.registerSequenceMethod`) as a
+        flat schedule in presentation order, stored in self._schedule. The
+        array returned here is a view onto that schedule.
+        """
+        nConds = len(self.trialList)
+        schedule = _sequenceMethods[self.method](nConds, self.nReps, self._rng)
+        self._schedule = numpy.asarray(schedule, dtype=numpy.int32).ravel()
+        if self._schedule.shape!=(nConds*self.nReps,):
+            raise ValueError, 'sequence method %r returned %i trials (expected %i)' \
+                %(self.method, len(self._schedule), nConds*self.nReps)
         logging.exp('Created sequence: %s, trialTypes=%d, nReps=%i, seed=%s' %
-                (self.method, len(indices), self.nReps, str(self.seed) )  )
-        return sequenceIndices
-
-    def _makeIndices(self,inputArray):
-        """
-        Creates an array of tuples the same shape as the input array
-        where each tuple contains the indices to itself in the array.
-
-        Useful for shuffling and then using as a reference.
-        """
-        inputArray  = numpy.asarray(inputArray, 'O')#make sure its an array of objects (can be strings etc)
-        #get some simple variables for later
-        dims=inputArray.shape
-        dimsProd=numpy.product(dims)
-        dimsN = len(dims)
-        dimsList = range(dimsN)
-        listOfLists = []
-        arrayOfTuples = numpy.ones(dimsProd, 'O')#this creates space for an array of any objects
-
-        #for each dimension create list of its indices (using modulo)
-        for thisDim in dimsList:
-            prevDimsProd = numpy.product(dims[:thisDim])
-            thisDimVals = numpy.arange(dimsProd)/prevDimsProd % dims[thisDim] #NB this means modulus in python
-            listOfLists.append(thisDimVals)
-
-        #convert to array
-        indexArr = numpy.asarray(listOfLists)
-        for n in range(dimsProd):
-            arrayOfTuples[n] = tuple((indexArr[:,n]))
-        return (numpy.reshape(arrayOfTuples,dims)).tolist()
+                (self.method, nConds, self.nReps, str(self.seed) )  )
+        return self._schedule.reshape(self.nReps, nConds).T
 
     def next(self):
         """Advances to next trial and returns it.
@@ -877,8 +985,8 @@ class TrialHandler(_BaseTrialHandler):
             self._terminate()
 
         #fetch the trial info
-        if self.method in ['random','sequential','fullRandom']:
-            self.thisIndex = self.sequenceIndices[self.thisTrialN][self.thisRepN]
+        if self.method in _sequenceMethods:
+            self.thisIndex = self.sequenceIndices[self.thisTrialN,self.thisRepN]
             self.thisTrial = self.trialList[self.thisIndex]
             self.data.add('ran',1)
             self.data.add('order',self.thisN)
@@ -891,8 +999,8 @@ class TrialHandler(_BaseTrialHandler):
         """
         if n>self.nRemaining:
             return None
-        seqs = numpy.array(self.sequenceIndices).transpose().flat
-        condIndex=seqs[self.thisN+n]
+        repN, trialN = divmod(self.thisN+n, len(self.trialList))
+        condIndex = self.sequenceIndices[trialN][repN]
         return self.trialList[condIndex]
 
     def _createOutputArray(self,stimOut,dataOut,delim=None,
@@ -1182,6 +1290,70 @@ class TrialHandler(_BaseTrialHandler):
             self.getExp().addData(thisType, value)
 
 
+def _sequenceSequential(nConds, nReps, rng):
+    return numpy.tile(numpy.arange(nConds), nReps)
+def _sequenceRandom(nConds, nReps, rng):
+    #a separate shuffle for each repeat (one random draw for all of them)
+    return rng.random_sample((nReps, nConds)).argsort(axis=1)
+def _sequenceFullRandom(nConds, nReps, rng):
+    #shuffle all trials together. The shuffled trials fill the [cond,rep] array
+    #row by row (as they always have) so a given seed gives the same trials
+    sequential = numpy.repeat(numpy.arange(nConds), nReps)
+    shuffled = sequential[rng.random_sample(nConds*nReps).argsort()]
+    return shuffled.reshape(nConds, nReps).T
+def _sequenceRandomNoRepeat(nConds, nReps, rng):
+    seq = _sequenceRandom(nConds, nReps, rng)
+    if nConds==2:#the only way to avoid repeats is to alternate
+        return numpy.tile(seq[0], nReps)
+    if nConds<2 or nReps<2:
+        return seq
+    #where a repeat starts with the condition that ended the previous one, swap
+    #its first trial with a random trial from the middle of that repeat (leaving
+    #the last trial alone so that the next boundary is unaffected)
+    repeats = numpy.flatnonzero(seq[1:,0]==seq[:-1,-1])+1
+    swapWith = rng.randint(1, nConds-1, len(repeats))
+    first = seq[repeats,0].copy()
+    seq[repeats,0] = seq[repeats,swapWith]
+    seq[repeats,swapWith] = first
+    return seq
+def _sequenceBlocked(nConds, nReps, rng):
+    return numpy.repeat(rng.permutation(nConds), nReps)
+def _sequenceLatinSquare(nConds, nReps, rng):
+    #balanced (Williams) Latin square: first row is 0, 1, n-1, 2, n-2, ...
+    posN = numpy.arange(nConds)
+    firstRow = numpy.where(posN%2, (posN+1)//2, (nConds-posN//2)%nConds)
+    rows = (firstRow+posN[:,None])%nConds
+    if nConds%2:#odd numbers of conditions also need each row reversed
+        rows = numpy.vstack([rows, rows[:,::-1]])
+    #use the rows in a random order, then start again
+    rowOrder = numpy.concatenate([rng.permutation(len(rows))
+        for n in range(nReps//len(rows)+1)])[:nReps]
+    return rows[rowOrder]
+
+_sequenceMethods = {'sequential':_sequenceSequential,
+                    'random':_sequenceRandom,
+                    'fullRandom':_sequenceFullRandom,
+                    'randomNoRepeat':_sequenceRandomNoRepeat,
+                    'blocked':_sequenceBlocked,
+                    'latinSquare':_sequenceLatinSquare}
+
+def registerSequenceMethod(name, func):
+    """Adds a method for ordering the trials of a :class:`TrialHandler`, which
+    can then be used as `TrialHandler(..., method=name)`
+
+    `func(nConditions, nReps, randomState)` should return the index of the
+    condition for every trial, in the order they should be presented, as an
+    array (or list) of nConditions*nReps integers. Any randomisation should
+    use `randomState` (a numpy.random.RandomState) so that the handler's seed
+    has an effect. e.g. to present each condition nReps times in a row::
+
+        def repeated(nConds, nReps, randomState):
+            return numpy.repeat(numpy.arange(nConds), nReps)
+        data.registerSequenceMethod('repeated', repeated)
+
+    """
+    _sequenceMethods[name] = func
+
 def importTrialTypes(fileName, returnFieldNames=False):
     """importTrialTypes is DEPRECATED (as of v1.70.00)
     Please use `importConditions` for identical functionality.
@@ -1189,14 +1361,15 @@ def importTrialTypes(fileName, returnFieldNames=False):
     logging.warning("importTrialTypes is DEPRECATED (as of v1.70.00). Please use `importConditions` for identical functionality.")
     return importConditions(fileName, returnFieldNames)
 
-def importConditions(fileName, returnFieldNames=False):
-    """Imports a list of conditions from an .xlsx, .csv, or .pkl file
+def importConditions(fileName, returnFieldNames=False, useCache=True):
+    """Imports a list of conditions from an .xlsx, .csv, .tsv or .pkl file
 
     The output is suitable as an input to :class:`TrialHandler` `trialTypes` or to
     :class:`MultiStairHandler` as a `conditions` list.
 
     If `fileName` ends with:
         - .csv:  import as a comma-separated-value file (header + row x col)
+        - .tsv:  import as a tab-separated-value file (header + row x col)
         - .xlsx: import as Excel 2007 (xlsx) files. Sorry no support for older (.xls) is planned.
         - .pkl:  import from a pickle file as list of lists (header + row x col)
 
@@ -1208,6 +1381,15 @@ def importConditions(fileName, returnFieldNames=False):
         - begin with a letter (upper or lower case)
         - contain no spaces or other punctuation (underscores are permitted)
 
+    In csv/tsv files each column is given a single type: True/False, integer,
+    float (empty cells become nan) or else text. Cells that look like a list or
+    tuple, e.g. `[1, 0.5]`, are converted if they contain only literal values
+    (numbers, strings...).
+
+    If `useCache` is True then large csv, tsv and xlsx files (over 64kB) are
+    stored, once parsed, in the conditionsCache folder of the user prefs.
+    This is used instead of parsing the file again until the file changes.
+
     """
     def _assertValidVarNames(fieldNames, fileName):
         """screens a list of names as candidate variable names. if all names are
@@ -1228,34 +1410,36 @@ def importConditions(fileName, returnFieldNames=False):
     if not os.path.isfile(fileName):
         raise ImportError, 'Conditions file not found: %s' %os.path.abspath(fileName)
 
-    if fileName.endswith('.csv'):
-        #use csv import library to fetch the fieldNames
+    cached = None
+    if useCache and not fileName.endswith('.pkl') and \
+            os.path.getsize(fileName)>=_ConditionsCache.minSize:
+        cached = _ConditionsCache(fileName)
+    if cached and cached.load():
+        trialList, fieldNames = cached.trialList, cached.fieldNames
+    elif fileName.endswith('.csv') or fileName.endswith('.tsv'):
         f = open(fileName, 'rU')#the U converts line endings to os.linesep (not unicode!)
-        #lines = f.read().split(os.linesep)#csv module is temperamental with line endings
         try:
-            reader = csv.reader(f)#.split(os.linesep))
-        except:
+            if fileName.endswith('.tsv'):
+                rows = list(csv.reader(f, delimiter='\t'))
+            else:
+                rows = list(csv.reader(f))
+        except csv.Error:
             raise ImportError, 'Could not open %s as conditions' % fileName
-        fieldNames = reader.next() # first row
+        finally:
+            f.close()
+        rows = [row for row in rows if len(row)]#csv2rec also skipped blank lines
+        if not rows:
+            raise ImportError, 'Could not open %s as conditions (no header row)' % fileName
+        fieldNames = rows[0]
+        if fieldNames[0].startswith(codecs.BOM_UTF8):
+            fieldNames[0] = fieldNames[0][len(codecs.BOM_UTF8):]
         _assertValidVarNames(fieldNames, fileName)
-        #use matplotlib to import data and intelligently check for data types
         #all data in one column will be given a single type (e.g. if one cell is string, all will be set to string)
-        trialsArr = mlab.csv2rec(f) # data = non-header row x col
-        f.close()
-        #convert the record array into a list of dicts
-        trialList = []
-        for trialN, trialType in enumerate(trialsArr):
-            thisTrial ={}
-            for fieldN, fieldName in enumerate(fieldNames):
-                val = trialsArr[trialN][fieldN]
-                if type(val)==numpy.string_:
-                    val = unicode(val.decode('utf-8'))
-                    #if it looks like a list, convert it:
-                    if val.startswith('[') and val.endswith(']'):
-                        #exec('val=%s' %unicode(val.decode('utf8')))
-                        val = eval(val)
-                thisTrial[fieldName] = val
-            trialList.append(thisTrial)
+        columns = []
+        for colN in range(len(fieldNames)):
+            column = [row[colN] if colN<len(row) else '' for row in rows[1:]]
+            columns.append(_convertConditionsColumn(column, fileName))
+        trialList = [dict(zip(fieldNames, values)) for values in zip(*columns)]
     elif fileName.endswith('.pkl'):
         f = open(fileName, 'rU') # is U needed?
         try:
@@ -1275,34 +1459,30 @@ def importConditions(fileName, returnFieldNames=False):
         if not haveOpenpyxl:
             raise ImportError, 'openpyxl is required for loading excel format files, but it was not found.'
         try:
-            wb = load_workbook(filename = fileName)
+            wb = _openpyxlExcelReader.load_workbook(filename = fileName)
         except: # InvalidFileException(unicode(e)): # this fails
             raise ImportError, 'Could not open %s as conditions' % fileName
         ws = wb.worksheets[0]
-        nCols = ws.get_highest_column()
-        nRows = ws.get_highest_row()
+        rows = [[cell.value for cell in row] for row in ws.rows]
 
         #get parameter names from the first row header
-        fieldNames = []
-        for colN in range(nCols):
-            fieldName = ws.cell(_getExcelCellName(col=colN, row=0)).value
-            fieldNames.append(fieldName)
+        if not rows:
+            raise ImportError, 'Could not open %s as conditions (no header row)' % fileName
+        fieldNames = rows[0]
         _assertValidVarNames(fieldNames, fileName)
 
         #loop trialTypes
         trialList = []
-        for rowN in range(1, nRows):#skip header first row
+        for row in rows[1:]:#skip header first row
             thisTrial={}
-            for colN in range(nCols):
-                val = ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+            for fieldName, val in zip(fieldNames, row):
                 #if it looks like a list, convert it
-                if type(val) in [unicode, str] and (
-                        val.startswith('[') and val.endswith(']') or
-                        val.startswith('(') and val.endswith(')') ):
-                    val = eval(val)
-                fieldName = fieldNames[colN]
+                if type(val) in [unicode, str]:
+                    val = _parseConditionsLiteral(val, fileName)
                 thisTrial[fieldName] = val
             trialList.append(thisTrial)
+    if cached and not cached.loaded:
+        cached.save(trialList, fieldNames)
 
     logging.exp('Imported %s as conditions, %d conditions, %d params' %
                  (fileName, len(trialList), len(fieldNames)))
@@ -1311,6 +1491,109 @@ def importConditions(fileName, returnFieldNames=False):
     else:
         return trialList
 
+def _parseConditionsLiteral(val, fileName):
+    """Converts a string that looks like a list or tuple to that list/tuple
+    (if it only contains literals), otherwise returns the string
+    """
+    if (val.startswith('[') and val.endswith(']') or
+            val.startswith('(') and val.endswith(')')):
+        try:
+            return ast.literal_eval(val)
+        except (ValueError, SyntaxError):
+            logging.warning('Conditions file %s: %s looks like a list but is not one'
+                %(fileName, val))
+    return val
+
+def _convertConditionsColumn(column, fileName):
+    """Converts a list of strings (one column of a csv file) to a list of
+    values, all of the same type (bool, int, float or unicode)
+    """
+    strings = numpy.array(column, dtype=str)
+    stripped = numpy.char.strip(strings)
+    missing = stripped==''
+    present = stripped[~missing]
+    if len(present) and numpy.all((present=='True')|(present=='False')):
+        return [{'True':True, 'False':False}.get(val) for val in stripped]
+    for dtype in [int, float]:
+        if dtype==int and missing.any():
+            continue#missing values need nan, so a float
+        try:
+            values = numpy.where(missing, 'nan', stripped).astype(dtype)
+        except (ValueError, OverflowError):
+            continue
+        return values.tolist()
+    return [_parseConditionsLiteral(val.decode('utf-8'), fileName) for val in column]
+
+class _ConditionsCache(object):
+    """A pickled copy of an imported conditions file, kept in the user's
+    prefs folder (conditionsCache/) rather than next to the file, so that
+    only the user can write the pickles that get loaded. It's only used while
+    it matches the file's size and modification time or, failing that, its
+    md5 hash (and then the size and time are updated so the file needn't be
+    hashed again).
+    """
+    version = 2#increase this if the parsing of files changes
+    minSize = 64*1024#smaller files are quick enough to parse anyway
+    cacheDir = None#defaults to the conditionsCache folder of the user prefs
+    def __init__(self, fileName):
+        self.fileName = os.path.abspath(fileName)
+        cacheDir = self.cacheDir or \
+            os.path.join(psychopy.prefs.paths['userPrefsDir'], 'conditionsCache')
+        name = self.fileName
+        if type(name)==unicode:
+            name = name.encode('utf-8')
+        self.cacheName = os.path.join(cacheDir, hashlib.md5(name).hexdigest()+'.cache')
+        stat = os.stat(fileName)
+        self.size, self.mtime = stat.st_size, stat.st_mtime
+        self.loaded = False
+        self._md5 = None
+    def md5(self):
+        if self._md5 is None:
+            f = open(self.fileName, 'rb')
+            self._md5 = hashlib.md5(f.read()).hexdigest()
+            f.close()
+        return self._md5
+    def load(self):
+        """Returns True if a valid cache was loaded into self.trialList
+        and self.fieldNames
+        """
+        if not os.path.isfile(self.cacheName):
+            return False
+        try:
+            f = open(self.cacheName, 'rb')
+            try:
+                key = cPickle.load(f)
+                if key['version']!=self.version or key['fileName']!=self.fileName:
+                    return False
+                changed = (key['size'], key['mtime'])!=(self.size, self.mtime)
+                if changed and key['md5']!=self.md5():
+                    return False
+                self.trialList, self.fieldNames = cPickle.load(f)
+            finally:
+                f.close()
+        except Exception, e:
+            logging.warning('Could not use conditions cache %s: %s' %(self.cacheName, e))
+            return False
+        if changed:#the same contents (e.g. a copied file), so store the new time
+            self.save(self.trialList, self.fieldNames)
+        self.loaded = True
+        return True
+    def save(self, trialList, fieldNames):
+        key = {'version':self.version, 'fileName':self.fileName,
+               'size':self.size, 'mtime':self.mtime, 'md5':self.md5()}
+        try:
+            cacheDir = os.path.dirname(self.cacheName)
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            f = open(self.cacheName, 'wb')
+            try:
+                cPickle.dump(key, f, cPickle.HIGHEST_PROTOCOL)
+                cPickle.dump((trialList, fieldNames), f, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+        except (IOError, OSError), e:#e.g. a read-only folder; just don't cache
+            logging.warning('Could not save conditions cache %s: %s' %(self.cacheName, e))
+
 def createFactorialTrialList(factors):
     """Create a trialList by entering a list of factors with names (keys) and levels (values)
     it will return a trialList in which all factors have been factorially combined (so for example
@@ -2456,10 +2739,15 @@ class DataHandler(dict):
     by users directly)
 
     Numeric data are stored as numpy masked arrays where the mask is set True for missing entries.
+    Numbers (including numpy scalars) are stored as floats and a data type that only ever
+    receives bools is stored as a masked bool array.
     When any non-numeric data (string, list or array) get inserted using DataHandler.add(val) the array
     is converted to a standard (not masked) numpy array with dtype='O' and where missing entries have
     value="--"
 
+    If data arrive for more repeats than the arrays were created for, the arrays
+    are extended (doubling the number of repeats each time).
+
     Attributes:
         - ['key']=data arrays containing values for that key
             (e.g. data['accuracy']=...)
@@ -2471,6 +2759,7 @@ class DataHandler(dict):
         self.trials=trials
         self.dataTypes=[]#names will be added during addDataType
         self.isNumeric={}
+        self._nRan={}#number of times each trial index has run (so the current repN is known)
         #if given dataShape use it - otherwise guess!
         if dataShape: self.dataShape=dataShape
         elif self.trials:
@@ -2510,29 +2799,72 @@ class DataHandler(dict):
         """
         if not self.has_key(thisType):
             self.addDataType(thisType)
+        countRan=False
         if position==None:
             #'ran' is always the first thing to update
+            repN = self._getNRan(self.trials.thisIndex)
             if thisType=='ran':
-                repN = sum(self['ran'][self.trials.thisIndex])
+                countRan=True
             else:
-                repN = sum(self['ran'][self.trials.thisIndex])-1#because it has already been updated
+                repN -= 1#because it has already been updated
             #make a list where 1st digit is trial number
             position= [self.trials.thisIndex]
             position.append(repN)
 
         #check whether data falls within bounds
-        posArr = numpy.asarray(position)
-        shapeArr = numpy.asarray(self.dataShape)
-        if not numpy.alltrue(posArr<shapeArr):
-            #array isn't big enough
-            logging.warning('need a bigger array for:'+thisType)
-            self[thisType]=misc.extendArr(self[thisType],posArr)#not implemented yet!
+        for dim, pos in enumerate(position):
+            if pos>=self.dataShape[dim]:
+                #array isn't big enough
+                self._extendArrays(position)
+                break
         #check for ndarrays with more than one value and for non-numeric data
-        if self.isNumeric[thisType] and \
-            ((type(value)==numpy.ndarray and len(value)>1) or (type(value) not in [float, int])):
+        if self.isNumeric[thisType]:
+            valueType = _dataValueType(value)
+            if valueType=='object':
                 self._convertToObjectArray(thisType)
+            elif valueType=='bool' and self[thisType].dtype!=bool and numpy.all(self[thisType].mask):
+                self._convertToBoolArray(thisType)#nothing stored yet so we can be a bool array
+            elif valueType=='float' and self[thisType].dtype==bool:
+                self[thisType]=self[thisType].astype('f')
         #insert the value
         self[thisType][position[0],position[1]]=value
+        if countRan:
+            self._nRan[self.trials.thisIndex] = self._getNRan(self.trials.thisIndex)+1
+    def _getNRan(self, index):
+        """Returns the number of times that the trial `index` has been run
+        (without summing the 'ran' array each time)
+        """
+        if not hasattr(self, '_nRan'):#from an older pickled file
+            self._nRan={}
+        if index not in self._nRan:
+            self._nRan[index] = int(numpy.sum(self['ran'][index]))
+        return self._nRan[index]
+    def _extendArrays(self, position):
+        """Extend all the data arrays so that `position` is within them.
+        Dimensions are (at least) doubled, so that this is rarely needed.
+        """
+        newShape=[]
+        for dim, pos in enumerate(position):
+            if pos>=self.dataShape[dim]:
+                newShape.append(max(pos+1, 2*self.dataShape[dim]))
+            else:
+                newShape.append(self.dataShape[dim])
+        logging.info('Extending data arrays from %s to %s' %(self.dataShape, newShape))
+        oldSlice = tuple([slice(0, n) for n in self.dataShape])
+        for thisType in self.dataTypes:
+            old = self[thisType]
+            if isinstance(old, numpy.ma.MaskedArray):
+                new = numpy.ma.zeros(newShape, old.dtype)
+                new.mask=True
+                new[oldSlice] = old
+                if thisType=='ran':
+                    new.mask=False#this is a bool - all entries are valid
+            else:
+                new = numpy.empty(newShape, 'O')
+                new.fill('--')
+                new[oldSlice] = old
+            self[thisType] = new
+        self.dataShape = newShape
     def _convertToObjectArray(self, thisType):
         """Convert this datatype from masked numeric array to unmasked object array
         """
@@ -2541,6 +2873,24 @@ class DataHandler(dict):
         #masked vals should be "--", others keep data
         self[thisType] = numpy.where(dat.mask, '--',dat).astype('O')#we have to repeat forcing to 'O' or text gets truncated to 4chars
         self.isNumeric[thisType]=False
+    def _convertToBoolArray(self, thisType):
+        """Convert this (empty) datatype from masked float array to a masked bool array
+        """
+        dat = self[thisType]
+        self[thisType] = numpy.ma.zeros(dat.shape, bool)
+        self[thisType].mask = dat.mask
+
+def _dataValueType(value):
+    """Returns the kind of array that a value for a DataHandler can be stored in,
+    'bool', 'float' or 'object' (strings, lists, arrays of more than one value...)
+    """
+    if isinstance(value, (bool, numpy.bool_)):
+        return 'bool'
+    elif isinstance(value, (int, long, float, numpy.integer, numpy.floating)):
+        return 'float'
+    elif type(value)==numpy.ndarray and value.size==1 and value.dtype.kind in 'iuf':
+        return 'float'
+    return 'object'
 
 class FitFunction:
     """Deprecated - use the specific functions; FitWeibull, FitLogistic...
@@ -3053,5 +3403,5 @@ def _getExcelCellName(col, row):
     >>> _getExcelCellName(2,1)
     'C2'
     """
-    return "%s%i" %(get_column_letter(col+1), row+1)#BEWARE - openpyxl uses indexing at 1, to fit with Excel
+    return "%s%i" %(_openpyxlCell.get_column_letter(col+1), row+1)#BEWARE - openpyxl uses indexing at 1, to fit with Excel
 
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+
+#Measures how long the DotStim takes to update its dots on each frame (the
+#CPU part of the work, which is done before anything gets drawn) for
+#different numbers of dots and for each of the signalDots/noiseDots modes.
+#At 120Hz you have about 8ms per frame for everything, so keep an eye on
+#the larger fields.
+
+from psychopy import visual, core
+
+nFrames=200
+nDotsList=[500, 1000, 5000, 10000, 20000, 50000]
+win = visual.Window([200,200], units='norm', allowGUI=False)
+
+print "per-frame update cost (ms) for a circular field"
+print "%-20s" %('signal/noise') + ''.join(["%10i" %n for n in nDotsList])
+timer = core.Clock()
+for signalDots in ['same','different']:
+    for noiseDots in ['direction','position','walk']:
+        row = "%-20s" %(signalDots+'/'+noiseDots)
+        for nDots in nDotsList:
+            dots = visual.DotStim(win, nDots=nDots, fieldShape='circle', fieldSize=1,
+                dotLife=5, speed=0.01, coherence=0.5, dir=90,
+                signalDots=signalDots, noiseDots=noiseDots, autoLog=False)
+            timer.reset()
+            for frameN in range(nFrames):
+                dots._update_dotsXY()
+            row += "%10.3f" %(timer.getTime()*1000.0/nFrames)
+        print row
+win.close()
+core.quit()
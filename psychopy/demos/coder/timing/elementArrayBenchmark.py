@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+#Measures the frame time of an ElementArrayStim for different numbers of
+#elements, when only the oris change, only the xys change or when all the
+#attributes change on every frame. Each case is run with and without
+#vertex buffer objects (useVBO=True) so you can see which suits your
+#graphics card. Requires a card that supports shaders.
+
+from psychopy import visual, core
+import numpy
+
+nFrames=100
+nElementsList=[100, 1000, 5000, 10000, 20000]
+win = visual.Window([800,800], units='pix', allowGUI=False, waitBlanking=False)
+
+def changeOris(stim, N):
+    stim.setOris(1, '+', log=False)
+def changeXYs(stim, N):
+    stim.setXYs(numpy.random.uniform(-400, 400, [N,2]), log=False)
+def changeAll(stim, N):
+    stim.setOris(1, '+', log=False)
+    stim.setXYs(numpy.random.uniform(-400, 400, [N,2]), log=False)
+    stim.setOpacities(numpy.random.rand(N), log=False)
+    stim.setPhases(0.05, '+', log=False)
+
+print "mean frame time (ms), waitBlanking=False"
+print "%-16s" %('update') + ''.join(["%10i" %n for n in nElementsList])
+timer = core.Clock()
+for useVBO in [False, True]:
+    for label, updateFunc in [('oris',changeOris), ('xys',changeXYs), ('all',changeAll)]:
+        row = "%-16s" %('%s (VBO=%s)' %(label, useVBO))
+        for N in nElementsList:
+            stim = visual.ElementArrayStim(win, nElements=N, sizes=16, sfs=0.1,
+                xys=numpy.random.uniform(-400, 400, [N,2]),
+                useVBO=useVBO, autoLog=False)
+            stim.draw(); win.flip()#warm up
+            timer.reset()
+            for frameN in range(nFrames):
+                updateFunc(stim, N)
+                stim.draw()
+                win.flip()
+            row += "%10.2f" %(timer.getTime()*1000.0/nFrames)
+            stim.clearTextures()
+        print row
+win.close()
+core.quit()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+#Compares the time taken to build an optimised GIF palette and to convert
+#frames to it, for the previous pure-python (pixel by pixel) code and the
+#numpy code now used by makeMovies (e.g. for win.saveMovieFrames('movie.gif')).
+#The frames are synthetic drifting gratings with 64 grey levels. The old code
+#gets slow quickly, so the larger sizes are only run with the new code.
+
+from psychopy import makeMovies, core
+import numpy, Image
+
+nFrames=10
+sizes=[32, 64, 128, 256, 512]
+maxOldSize=128
+
+def oldRgbHistogram(images):
+    #the previous makeMovies.RgbHistogram (dict of repr(color) for every pixel)
+    datalist=[]
+    for imgRgb in images:
+        datalist.extend(imgRgb.getdata())
+    dicthist = {}
+    for color in datalist:
+        key = repr(color)
+        if dicthist.has_key(key): dicthist[key] += 1
+        else: dicthist[key] = 1
+    hist = [(count, eval(key)) for key, count in dicthist.iteritems()]
+    hist.sort()
+    hist.reverse()
+    return hist
+
+def oldRgb2palette(imgRgb, palette):
+    #the previous makeMovies.rgb2palette (a palette lookup and putpixel per pixel)
+    listPalette = numpy.reshape(numpy.asarray(palette), [256,3]).tolist()
+    imgP = Image.new('P', imgRgb.size)
+    imgP.putpalette(palette)
+    datalist = list(imgRgb.getdata())
+    xsize, ysize = imgRgb.size
+    for yord in xrange(ysize):
+        for xord in xrange(xsize):
+            pxlcolor = list(datalist[yord*xsize + xord])
+            if pxlcolor in listPalette: index = listPalette.index(pxlcolor)
+            else: index=0
+            imgP.putpixel((xord, yord), index)
+    return imgP
+
+def makeFrames(size):
+    x = numpy.linspace(0, 4*numpy.pi, size)
+    frames = []
+    for frameN in range(nFrames):
+        grating = numpy.sin(x+frameN*0.3)[numpy.newaxis,:].repeat(size, axis=0)
+        grey = (numpy.round((grating+1)*31.5)*4).astype(numpy.uint8)
+        frames.append(Image.fromarray(numpy.dstack([grey,grey,grey])))
+    return frames
+
+print "time (ms) for %i frames, histogram+palette / conversion" %nFrames
+print "%-10s%16s%16s%16s%16s" %('size', 'old palette', 'new palette', 'old convert', 'new convert')
+timer = core.Clock()
+for size in sizes:
+    frames = makeFrames(size)
+    row = "%-10s" %('%ix%i' %(size,size))
+    if size<=maxOldSize:
+        timer.reset()
+        oldHist = oldRgbHistogram(frames)
+        tOldPalette = timer.getTime()
+    timer.reset()
+    palette = makeMovies.makePalette(frames)
+    tNewPalette = timer.getTime()
+    if size<=maxOldSize:
+        assert oldHist==makeMovies.RgbHistogram(frames)
+        timer.reset()
+        oldFrames = [oldRgb2palette(frame, palette) for frame in frames]
+        tOldConvert = timer.getTime()
+    timer.reset()
+    newFrames = [makeMovies.rgb2palette(frame, palette) for frame in frames]
+    tNewConvert = timer.getTime()
+    if size<=maxOldSize:
+        for old, new in zip(oldFrames, newFrames):
+            assert old.tostring()==new.tostring()
+        row += "%16.1f%16.1f%16.1f%16.1f" %(tOldPalette*1000, tNewPalette*1000,
+            tOldConvert*1000, tNewConvert*1000)
+    else:
+        row += "%16s%16.1f%16s%16.1f" %('-', tNewPalette*1000, '-', tNewConvert*1000)
+    print row
+core.quit()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+#Measures how late the key presses of an input device are timestamped, for
+#different amounts of drawing per frame, when the device is only polled by
+#win.flip() and when an event.InputPoller polls it from a background thread
+#(1000Hz).
+#The flips wait for the screen refresh, as in a real experiment.
+#The 'keyboard' here is emulated: it presses keys (event._onPygletKey(...,
+#emulated=True)) at known times, but like a real keyboard they are only seen
+#when its events are next dispatched, so the timestamp error is the time
+#that a key waited to be dispatched.
+
+from psychopy import visual, core, event
+import numpy
+
+class EmulatedKeyboard(object):
+    """Presses keys at the scheduled times, when its events are dispatched
+    (by win.flip() or an InputPoller, as it is one of the win's dispatchers)
+    """
+    def __init__(self):
+        self.presses = []#(time, key), in order
+    def schedule(self, times):
+        self.presses = [(t, str(n)) for n, t in enumerate(sorted(times))]
+    def _dispatch_events(self):
+        now = core.getTime()
+        while self.presses and self.presses[0][0]<=now:
+            t, key = self.presses.pop(0)
+            event._onPygletKey(key, None, emulated=True)
+
+nFrames=120
+nPresses=40
+drawTimesList=[0, 5, 12, 30]#ms of (simulated) drawing per frame
+win = visual.Window([400,400], allowGUI=False, waitBlanking=True)#flips wait for the vsync
+keyboard = EmulatedKeyboard()
+win._eventDispatchers.append(keyboard)
+
+print "mean (and max) key timestamp error (ms)"
+print "%-16s" %('draw time (ms)') + ''.join(["%20i" %n for n in drawTimesList])
+for pollRate in [None, 1000]:
+    row = "%-16s" %({None:'flip only', 1000:'1000Hz poller'}[pollRate])
+    for drawTime in drawTimesList:
+        if pollRate:
+            event.startInputPolling(pollRate=pollRate, win=win)
+        win.flip()
+        event.clearEvents()
+        tStart = core.getTime()
+        duration = nFrames*(drawTime/1000.0+1/60.0)#roughly
+        pressTimes = numpy.sort(tStart+numpy.random.uniform(0.1, duration-0.1, nPresses))
+        keyboard.schedule(pressTimes)
+        while keyboard.presses:
+            tDrawn = core.getTime()+drawTime/1000.0
+            while core.getTime()<tDrawn:
+                pass#busy 'drawing'
+            win.flip()
+        event.stopInputPolling()
+        keys = event.getKeys(timeStamped=True)
+        errors = numpy.array([t-pressTimes[int(key)] for key, t in keys])*1000.0
+        row += "%20s" %("%.2f (%.2f)" %(errors.mean(), errors.max()))
+    print row
+win.close()
+core.quit()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+#Measures how fast the background serial readers of cedrus.RB730 and
+#forp.ButtonBox decode what a device sends (throughput), and how late its
+#events are timestamped (latency) when the port is read in the background or
+#polled once per frame (as getKeyEvents() used to read it). A pseudo-terminal
+#stands in for the device, so this runs without one (on linux or OS X, with
+#pyserial installed).
+
+from psychopy import core
+from psychopy.hardware import cedrus, forp
+import os, tty, struct, time
+import serial
+import numpy
+
+def openPty():
+    device, computer = os.openpty()
+    tty.setraw(computer)
+    port = serial.Serial(os.ttyname(computer), timeout=0)
+    os.close(computer)
+    return device, port
+
+def xid(key, rt):
+    return 'k'+chr(key<<5 | 1<<4)+struct.pack('<i', rt)
+
+def makeDevice(name, port, readInBackground):
+    if name=='RB730':
+        return cedrus.RB730(port, readInBackground=readInBackground)
+    else:
+        return forp.ButtonBox(serialPort=port, readInBackground=readInBackground)
+
+def packet(name, n):
+    if name=='RB730':
+        return xid(n%7+1, n)
+    else:#a press of the blue button (and a release)
+        return chr(1)+chr(0)
+
+nPackets=20000
+nPresses=100
+print "throughput (events/s, written as fast as possible)"
+for name in ['RB730', 'fORP']:
+    device, port = openPty()
+    box = makeDevice(name, port, True)
+    data = ''.join([packet(name, n) for n in range(nPackets)])
+    t0 = core.getTime()
+    for start in range(0, len(data), 1024):
+        os.write(device, data[start:start+1024])
+    while box.reader.nEvents<nPackets and core.getTime()-t0<10:
+        time.sleep(0.0001)
+    print "%-16s%12.0f" %(name, box.reader.nEvents/(core.getTime()-t0))
+    box.close()
+    os.close(device)
+
+print "mean (and max) timestamp latency (ms)"
+print "%-16s%20s%20s" %('', 'background', 'polled per frame')
+for name in ['RB730', 'fORP']:
+    row = "%-16s" %(name)
+    for readInBackground in [True, False]:
+        device, port = openPty()
+        box = makeDevice(name, port, readInBackground)
+        tWrites = []
+        tNextPoll = core.getTime()
+        for n in range(nPresses):
+            tWrites.append(core.getTime())
+            os.write(device, packet(name, n))
+            tNext = core.getTime()+numpy.random.uniform(0.005, 0.02)
+            while core.getTime()<tNext:
+                if not readInBackground and core.getTime()>tNextPoll:
+                    box.reader.poll()#what a frame loop would do
+                    tNextPoll += 1/60.0
+        core.wait(0.05)
+        box.reader.poll()
+        times = [evt.time for evt in box._keyReader.getEvents()] if name=='RB730' \
+            else [evt.time for evt in box._pressReader.getEvents()]
+        latency = (numpy.array(times)-tWrites[:len(times)])*1000.0
+        row += "%20s" %("%.3f (%.3f)" %(latency.mean(), latency.max()))
+        box.close()
+        os.close(device)
+    print row
+core.quit()
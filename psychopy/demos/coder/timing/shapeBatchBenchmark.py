@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+#Measures the frame time for drawing different numbers of Circles (with
+#autoDraw) when each one is drawn separately and when the window draws them
+#in batches (win.setBatchDraw(True)), with the positions changing on every
+#frame. Batching sends all the circles to the graphics card in one call, so
+#the gain grows with the number of circles. (Only shapes that are all fills, or
+#all outlines, are batched.)
+
+from psychopy import visual, core
+import numpy
+
+nFrames=100
+nCirclesList=[10, 100, 500, 1000, 2000]
+win = visual.Window([800,800], units='pix', allowGUI=False, waitBlanking=False)
+
+print "mean frame time (ms), waitBlanking=False"
+print "%-16s" %('drawing') + ''.join(["%10i" %n for n in nCirclesList])
+timer = core.Clock()
+for batchDraw in [False, True]:
+    win.setBatchDraw(batchDraw)
+    row = "%-16s" %(['separate','batched'][batchDraw])
+    for N in nCirclesList:
+        circles = [visual.Circle(win, radius=8, edges=16, fillColor='red', lineColor=None,
+                        pos=numpy.random.uniform(-400, 400, 2), autoLog=False)
+                   for n in range(N)]
+        for circle in circles:
+            circle.setAutoDraw(True)
+        win.flip()#warm up
+        timer.reset()
+        for frameN in range(nFrames):
+            for circle in circles:
+                circle.setPos(numpy.random.uniform(-4, 4, 2), '+', log=False)
+            win.flip()
+        row += "%10.2f" %(timer.getTime()*1000.0/nFrames)
+        for circle in circles:
+            circle.setAutoDraw(False)
+    print row
+win.close()
+core.quit()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+#Measures the frame time of a rapid serial visual presentation (RSVP) of words
+#with a TextStim, at different presentation rates (items per second at 60Hz),
+#against building a new pyglet.font.Text for each item (which is what
+#TextStim.setText() used to do). TextStim lays the words out with the glyphs
+#that the font has already rendered, and remembers the layouts of recent words,
+#so changing the text costs much less than a frame.
+
+from psychopy import visual, core
+import pyglet
+import numpy
+
+nItems=200
+ratesList=[10, 20, 30, 60]#items per second, at 60 frames per second
+letters = list('abcdefghijklmnopqrstuvwxyz')
+words = [''.join([letters[i] for i in numpy.random.randint(len(letters), size=numpy.random.randint(3,9))])
+         for n in range(50)]
+stream = [words[n] for n in numpy.random.randint(len(words), size=nItems)]
+win = visual.Window([800,800], units='pix', allowGUI=False, waitBlanking=False)
+stim = visual.TextStim(win, text='+', height=40, autoLog=False)
+
+print "mean (and max) frame time (ms), waitBlanking=False"
+print "%-16s" %('items/s') + ''.join(["%20i" %n for n in ratesList])
+timer = core.Clock()
+for method in ['TextStim', 'pyglet Text']:
+    row = "%-16s" %(method)
+    for rate in ratesList:
+        framesPerItem = 60/rate
+        frameTimes = []
+        win.flip()#warm up
+        for item in stream:
+            for frameN in range(framesPerItem):
+                timer.reset()
+                if frameN==0:
+                    if method=='TextStim':
+                        stim.setText(item, log=False)
+                    else:
+                        text = pyglet.font.Text(stim._font, item, halign='center',
+                                                valign='center', width=stim._wrapWidthPix)
+                        text.x = -stim._wrapWidthPix/2#the window's origin is its centre
+                if method=='TextStim':
+                    stim.draw()
+                else:
+                    win.setScale('pix')
+                    text.draw()
+                win.flip()
+                frameTimes.append(timer.getTime()*1000.0)
+        row += "%20s" %("%.2f (%.2f)" %(numpy.mean(frameTimes), numpy.max(frameTimes)))
+    print row
+win.close()
+core.quit()
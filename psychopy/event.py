@@ -8,20 +8,22 @@ See demo_mouse.py and i{demo_joystick.py} for examples
 
 # 01/2011 modified by Dave Britton to get mouse event timing
 
-import sys, time, copy
+import sys, os, time, copy, threading, weakref, collections
 import psychopy.core, psychopy.misc
 from psychopy import logging
 from psychopy.constants import *
 import string, numpy
 
 #try to import pyglet & pygame and hope the user has at least one of them!
-try:
-    from pygame import mouse, locals, joystick, display
-    import pygame.key
-    import pygame.event as evt
-    havePygame = True
-except:
-    havePygame = False
+#(pygame is slow to import so that only happens if it gets used)
+from psychopy.lazyImport import LazyModule, isInstalled, isLoaded
+havePygame = isInstalled('pygame')
+pygame = LazyModule('pygame')
+mouse = LazyModule('pygame.mouse')
+locals = LazyModule('pygame.locals')
+joystick = LazyModule('pygame.joystick')
+display = LazyModule('pygame.display')
+evt = LazyModule('pygame.event')
 
 try:
     import pyglet
@@ -31,10 +33,262 @@ except:
 if havePygame: usePygame=True#will become false later if win not initialised
 else: usePygame=False
 
+def _pygameDisplayInit():
+    """True if there is a pygame window (without importing pygame if there isn't)"""
+    return isLoaded(display) and display.get_init()
+
+InputEvent = collections.namedtuple('InputEvent', ['type', 'value', 'time', 'source'])
+
+class InputEventQueue(object):
+    """A thread-safe queue of timestamped input events (keys, mouse buttons
+    and wheel, response boxes, scanner sync pulses...) that any number of
+    :class:`EventReader` objects read independently, so that one reader
+    doesn't take the events that another one is waiting for.
+
+    Events are added with `put()` from any thread (the pyglet event handlers,
+    emulator threads or hardware readers) without waiting for a lock, and are
+    stamped with core.getTime() as they arrive. They are kept until every
+    reader has seen them (or until there are more than `maxEvents`, when the
+    oldest are dropped and counted in `nDropped`).
+
+    `event.inputEvents` is the queue used by getKeys() and the pyglet handlers::
+
+        buttons = event.inputEvents.newReader(types=['button'])
+        ...
+        for evt in buttons.getEvents():
+            print evt.value, evt.time
+    """
+    def __init__(self, maxEvents=100000):
+        self.maxEvents = maxEvents
+        self.nDropped = 0
+        self._events = []#only ever appended to, except by _trim()
+        self._base = 0#the number of events that have been trimmed from the start
+        self._lock = threading.Lock()#for the readers (put() doesn't need it)
+        self._readers = weakref.WeakKeyDictionary()#reader:None (WeakSet needs python 2.7)
+    def put(self, type, value, time=None, source=''):
+        """Adds an event (e.g. put('key', 'space')) and returns it.
+        The time defaults to now (core.getTime())
+        """
+        if time is None:
+            time = psychopy.core.getTime()
+        evt = InputEvent(type, value, time, source)
+        self._events.append(evt)#atomic, so producers can't interfere
+        if len(self._events)>self.maxEvents:
+            with self._lock:
+                nExtra = len(self._events)-self.maxEvents
+                if nExtra>0:
+                    self._trim(self._base+nExtra)
+                    self.nDropped += nExtra
+        return evt
+    def newReader(self, types=None):
+        """Returns an :class:`EventReader` for the events of the given types
+        (or all of them) that arrive from now on
+        """
+        return EventReader(self, types)
+    def _register(self, reader):
+        with self._lock:
+            self._readers[reader] = None
+            return self._base+len(self._events)
+    def _read(self, reader):
+        """Returns the events that `reader` hasn't seen (with their numbers)
+        and then drops the events that no reader still needs
+        """
+        with self._lock:
+            start = max(reader._cursor-self._base, 0)
+            new = self._events[start:]
+            first = self._base+start
+            reader._cursor = first+len(new)
+            cursors = [r._cursor for r in self._readers.keys()]
+            self._trim(min(cursors))
+        return first, new
+    def _trim(self, upTo):
+        #call with the lock held
+        if upTo>self._base:
+            del self._events[:upTo-self._base]
+            self._base = upTo
+
+class EventReader(object):
+    """Reads the events from an :class:`InputEventQueue` independently of
+    other readers. Create one with `queue.newReader(types)`.
+
+    The events are stored by type and value, so reading the events with
+    particular values (e.g. the keys in a keyList) only costs as much as the
+    number of events returned.
+    """
+    def __init__(self, queue, types=None):
+        self.queue = queue
+        if types is not None:
+            types = set(types)
+        self.types = types
+        self._pending = {}#type:{value:[(eventN, event),...]}
+        self._cursor = queue._register(self)
+    def _update(self):
+        first, new = self.queue._read(self)
+        for eventN, evt in enumerate(new, first):
+            if self.types is None or evt.type in self.types:
+                self._pending.setdefault(evt.type, {}).setdefault(evt.value, []).append((eventN, evt))
+    def getEvents(self, types=None, values=None, clear=True):
+        """Returns the events (in the order they arrived) of the given types
+        and values (e.g. getEvents('key', ['left','right'])), or of any type
+        or value if those are None. If `clear` is True they are also removed
+        from this reader, otherwise they can be read again.
+        """
+        self._update()
+        if types is None:
+            types = self._pending.keys()
+        elif isinstance(types, basestring):
+            types = [types]
+        found = []
+        for thisType in types:
+            byValue = self._pending.get(thisType)
+            if not byValue:
+                continue
+            if values is None:
+                matching = byValue.keys()
+            elif type(values) in [list, tuple, set, frozenset, dict]:
+                matching = [value for value in values if value in byValue]
+            else:#e.g. a string of key names, so check each value against it
+                matching = [value for value in byValue.keys() if value in values]
+            for value in set(matching):
+                if clear:
+                    found.extend(byValue.pop(value))
+                else:
+                    found.extend(byValue[value])
+        found.sort()
+        return [evt for eventN, evt in found]
+    def clear(self, types=None):
+        """Discards the events of the given types (or all of them) that have
+        arrived so far
+        """
+        self._update()
+        if types is None:
+            self._pending = {}
+        else:
+            if isinstance(types, basestring):
+                types = [types]
+            for thisType in types:
+                self._pending.pop(thisType, None)
+
+#the keys (and other input) from all sources go into this queue, and getKeys()
+#reads them with its own reader
+inputEvents = InputEventQueue()
+_keyReader = inputEvents.newReader(types=['key'])
+
+class InputPoller(object):
+    """Polls the input devices of the given window(s) (the event dispatchers
+    added to win._eventDispatchers, e.g. pyglet joysticks or emulated
+    keyboards) from a background thread at a fixed rate (e.g. 1000Hz),
+    independently of drawing.
+
+    Normally they are only polled (and their events timestamped) when the
+    script next calls win.flip(), which can be a frame or more after the
+    events happened. While an InputPoller runs they are timestamped within
+    about 1/pollRate s of arriving and are read as usual with getKeys(),
+    waitKeys() etc::
+
+        poller = event.startInputPolling(pollRate=1000, win=win)
+        ...
+        keys = event.getKeys(timeStamped=True)
+        ...
+        event.stopInputPolling()
+
+    The pyglet windows themselves (the keyboard and mouse) are still
+    dispatched by the main thread, by win.flip(), getKeys(), core.wait()
+    etc: Xlib isn't thread-safe here and some window events make the GL
+    context current in the thread that dispatches them.
+
+    `nPolls` counts the polls and `maxInterval` is the longest time (s)
+    between two of them (see `resetStats()`).
+    """
+    def __init__(self, pollRate=1000.0, win=None, autoStart=True):
+        self.pollRate = float(pollRate)
+        if win is None:
+            wins = []
+        elif type(win) in [list, tuple]:
+            wins = list(win)
+        else:
+            wins = [win]
+        self.wins = wins
+        self.nPolls = 0
+        self.maxInterval = 0.0
+        self._error = None
+        self._stopEvent = threading.Event()
+        self._thread = None
+        if autoStart:
+            self.start()
+    def start(self):
+        """Starts the polling thread (if it isn't running already)"""
+        if self.running:
+            return
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._run, name='InputPoller')
+        self._thread.daemon = True
+        self._thread.start()
+    def stop(self):
+        """Stops the polling thread (after its current poll)"""
+        if self._thread is None:
+            return
+        self._stopEvent.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            logging.error("InputPoller stopped after an error: %s" %self._error)
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    def resetStats(self):
+        """Resets `nPolls` and `maxInterval`"""
+        self.nPolls = 0
+        self.maxInterval = 0.0
+    def _poll(self):
+        with psychopy.core._dispatchLock:
+            for win in self.wins:
+                for dispatcher in win._eventDispatchers:
+                    dispatcher._dispatch_events()
+    def _run(self):
+        interval = 1.0/self.pollRate
+        getTime = psychopy.core.getTime
+        tLast = tNext = getTime()
+        try:
+            while not self._stopEvent.is_set():
+                self._poll()
+                now = getTime()
+                self.nPolls += 1
+                if now-tLast > self.maxInterval:
+                    self.maxInterval = now-tLast
+                tLast = now
+                tNext += interval
+                if tNext>now:
+                    time.sleep(tNext-now)
+                else:#running late, so don't try to catch up
+                    tNext = now
+        except Exception, e:
+            self._error = e
+            logging.error("InputPoller: %s" %e)
+
+_inputPoller = None
+def startInputPolling(pollRate=1000.0, win=None):
+    """Starts dispatching input events from a background thread, pollRate
+    times per second, and returns the :class:`InputPoller`
+    (see there for details). Stop it with stopInputPolling().
+    """
+    global _inputPoller
+    stopInputPolling()
+    _inputPoller = InputPoller(pollRate=pollRate, win=win)
+    return _inputPoller
+
+def stopInputPolling():
+    """Stops the :class:`InputPoller` started by startInputPolling() (if any)"""
+    global _inputPoller
+    if _inputPoller is not None:
+        _inputPoller.stop()
+        _inputPoller = None
+
+_dispatchWindowEvents = psychopy.core._dispatchWindowEvents#shared with core.wait()
+
 if havePyglet:
 
-    global _keyBuffer
-    _keyBuffer = []
     global mouseButtons
     mouseButtons = [0,0,0]
     global mouseWheelRel
@@ -71,15 +325,15 @@ def _onPygletText(text, emulated=False):
         keySource = 'EmulatedKey'
     else:
         keySource = 'KeyPress'
-    _keyBuffer.append( (text, keyTime) )
+    inputEvents.put('key', text, keyTime, keySource)
     logging.data("%s: %s" % (keySource, text))
 
 def _onPygletKey(symbol, modifiers, emulated=False):
     """handler for on_key_press pyglet events, or call directly to emulate a key press
 
-    Appends a tuple with (keyname, timepressed) into the global _keyBuffer. The
-    _keyBuffer can then be accessed as normal using event.getKeys(), .waitKeys(),
-    clearBuffer(), etc.
+    Puts a 'key' event with the keyname and the time pressed into the
+    `inputEvents` queue. The keys can then be accessed as normal using
+    event.getKeys(), .waitKeys(), clearEvents(), etc.
 
     J Gray 2012: Emulated means add a key (symbol) to the buffer virtually.
     This is useful for fMRI_launchScan, and for unit testing (in testTheApp)
@@ -107,7 +361,7 @@ def _onPygletKey(symbol, modifiers, emulated=False):
         useText = False
         thisKey = thisKey.lstrip('_').lstrip('NUM_')
         keySource = 'Keypress'
-    _keyBuffer.append( (thisKey,keyTime) ) # tuple
+    inputEvents.put('key', thisKey, keyTime, keySource)
     logging.data("%s: %s" % (keySource, thisKey))
 
 def _onPygletMousePress(x,y, button, modifiers):
@@ -124,6 +378,8 @@ def _onPygletMousePress(x,y, button, modifiers):
         mouseButtons[2]=1
         mouseTimes[2]= psychopy.core.getTime()-mouseClick[2].timeAtLastReset
         label='Right'
+    inputEvents.put('mousePress', label.lower(), source='Mouse')
+    _recordMouse(x, y)
     logging.data("Mouse: %s button down, pos=(%i,%i)" %(label, x,y))
 
 def _onPygletMouseRelease(x,y, button, modifiers):
@@ -137,18 +393,39 @@ def _onPygletMouseRelease(x,y, button, modifiers):
     if button == pyglet.window.mouse.RIGHT:
         mouseButtons[2]=0
         label='Right'
+    inputEvents.put('mouseRelease', label.lower(), source='Mouse')
+    _recordMouse(x, y)
     logging.data("Mouse: %s button up, pos=(%i,%i)" %(label, x,y))
 
 def _onPygletMouseWheel(x,y,scroll_x, scroll_y):
     global mouseWheelRel
     mouseWheelRel = mouseWheelRel+numpy.array([scroll_x, scroll_y])
+    inputEvents.put('mouseWheel', (scroll_x, scroll_y), source='Mouse')
     logging.data("Mouse: wheel shift=(%i,%i), pos=(%i,%i)" %(scroll_x, scroll_y,x,y))
 
-def _onPygletMouseMotion(x, y, dx, dy): # will this work? how are pyglet event handlers defined?
+def _onPygletMouseMotion(x, y, dx, dy):
     global mouseMove
     # mouseMove is a core.Clock() that is reset when the mouse moves
     # default is None, but start and stopMoveClock() create and remove it, mouseMove.reset() resets it by hand
     if mouseMove: mouseMove.reset()
+    if _mouseRecorders:
+        _recordMouse(x, y)
+
+def _onPygletMouseDrag(x, y, dx, dy, buttons, modifiers):
+    #pyglet sends these instead of on_mouse_motion while a button is down
+    _onPygletMouseMotion(x, y, dx, dy)
+
+#the _TrajectoryBuffers of the Mice that are recording (replaced, not
+#modified, so that the handlers can use it from any thread)
+_mouseRecorders = ()
+
+def _recordMouse(x, y):
+    if not _mouseRecorders:
+        return
+    t = psychopy.core.getTime()
+    buttons = mouseButtons[0] | mouseButtons[1]<<1 | mouseButtons[2]<<2
+    for recorder in _mouseRecorders:
+        recorder.add(t, x, y, buttons)
 
 def startMoveClock():
     global mouseMove
@@ -200,37 +477,16 @@ def getKeys(keyList=None, timeStamped=False):
         - 2009 keyList functionality added by Gary Strangman
         - 2009 timeStamped code provided by Dave Britton
     """
-    keys=[]
-
-
-    if havePygame and display.get_init():#see if pygame has anything instead (if it exists)
+    if _pygameDisplayInit():#see if pygame has anything instead (if it exists)
         for evts in evt.get(locals.KEYDOWN):
-            keys.append( (pygame.key.name(evts.key),0) )#pygame has no keytimes
+            inputEvents.put('key', pygame.key.name(evts.key), 0, 'pygame')#pygame has no keytimes
 
     elif havePyglet:
         #for each (pyglet) window, dispatch its events before checking event buffer
-        wins = pyglet.window.get_platform().get_default_display().get_windows()
-        for win in wins: win.dispatch_events()#pump events on pyglet windows
-
-        global _keyBuffer
-        if len(_keyBuffer)>0:
-            #then pyglet is running - just use this
-            keys = _keyBuffer
-    #        _keyBuffer = []  # DO /NOT/ CLEAR THE KEY BUFFER ENTIRELY
-
-    if keyList==None:
-        _keyBuffer = [] #clear buffer entirely
-        targets=keys  # equivalent behavior to getKeys()
-    else:
-        nontargets = []
-        targets = []
-        # split keys into keepers and pass-thrus
-        for key in keys:
-            if key[0] in keyList:
-                targets.append(key)
-            else:
-                nontargets.append(key)
-        _keyBuffer = nontargets  # save these
+        _dispatchWindowEvents()
+
+    #keys that aren't in keyList stay in the buffer (only the keys in the list are looked up)
+    targets = [(k.value, k.time) for k in _keyReader.getEvents('key', keyList)]
 
     #now we have a list of tuples called targets
     #did the user want timestamped tuples or keynames?
@@ -266,8 +522,7 @@ def waitKeys(maxWait=float('inf'), keyList=None, timeStamped=False):
     while key == None and timer.getTime() < maxWait:
         # Pump events on pyglet windows if they exist
         if havePyglet:
-            wins = pyglet.window.get_platform().get_default_display().get_windows()
-            for win in wins: win.dispatch_events()
+            _dispatchWindowEvents()
 
         # Get keypresses and return if anything is pressed
         keys = getKeys(keyList=keyList, timeStamped=timeStamped)
@@ -285,6 +540,63 @@ def xydist(p1=[0.0,0.0],p2=[0.0,0.0]):
     """
     return numpy.sqrt(pow(p1[0]-p2[0],2)+pow(p1[1]-p2[1],2))
 
+class _TrajectoryBuffer(object):
+    """Mouse samples (time, x, y in pixels from the bottom left of the
+    window, and the buttons as bits), stored in numpy arrays that double in
+    size when full. Once `maxSamples` are stored it becomes a ring buffer,
+    so the oldest samples are overwritten (and counted in `nDropped`).
+    """
+    def __init__(self, capacity=1024, maxSamples=None):
+        self.maxSamples = maxSamples
+        if maxSamples is not None:
+            capacity = min(capacity, maxSamples)
+        self._times = numpy.zeros(capacity, 'f8')
+        self._xys = numpy.zeros([capacity, 2], 'f8')
+        self._buttons = numpy.zeros(capacity, 'u1')
+        self._start = 0#index of the oldest sample
+        self.nSamples = 0
+        self.nDropped = 0
+        self._lock = threading.Lock()#samples arrive from the event dispatching thread
+    def add(self, t, x, y, buttons):
+        with self._lock:
+            capacity = len(self._times)
+            if self.nSamples==capacity:
+                if self.maxSamples is None or capacity<self.maxSamples:
+                    newCapacity = capacity*2
+                    if self.maxSamples is not None:
+                        newCapacity = min(newCapacity, self.maxSamples)
+                    self._resize(newCapacity)
+                    capacity = newCapacity
+                else:#overwrite the oldest
+                    self._start = (self._start+1)%capacity
+                    self.nSamples -= 1
+                    self.nDropped += 1
+            i = (self._start+self.nSamples)%capacity
+            self._times[i] = t
+            self._xys[i] = x, y
+            self._buttons[i] = buttons
+            self.nSamples += 1
+    def _ordered(self):
+        #indices of the samples in time order (call with the lock held)
+        return (self._start+numpy.arange(self.nSamples))%len(self._times)
+    def _resize(self, capacity):
+        order = self._ordered()
+        for name in ['_times', '_xys', '_buttons']:
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,)+old.shape[1:], old.dtype)
+            new[:self.nSamples] = old[order]
+            setattr(self, name, new)
+        self._start = 0
+    def read(self, clear=True):
+        """Returns copies of the times, xys and buttons, oldest first"""
+        with self._lock:
+            order = self._ordered()
+            samples = self._times[order], self._xys[order], self._buttons[order]
+            if clear:
+                self._start = 0
+                self.nSamples = 0
+        return samples
+
 class Mouse:
     """Easy way to track what your mouse is doing.
     It needn't be a class, but since Joystick works better
@@ -314,12 +626,89 @@ class Mouse:
         self.movedistance=0.0
         #if pygame isn't initialised then we must use pyglet
         global usePygame
-        if (havePygame and not pygame.display.get_init()):
+        if (havePygame and not _pygameDisplayInit()):
             usePygame=False
         if not usePygame:
             global mouseButtons
             mouseButtons = [0,0,0]
         if newPos is not None: self.setPos(newPos)
+        self._recorder=None
+
+    def startRecording(self, maxSamples=None):
+        """Records every movement of the mouse (and every button press and
+        release) from now on, with its time, as the events arrive rather than
+        once per frame (pyglet windows only). Retrieve the samples with
+        :meth:`getTrajectory` or write them to a file with
+        :meth:`saveTrajectory`, e.g. at the end of each trial::
+
+            mouse.startRecording()
+            for trial in trials:
+                ...
+                mouse.saveTrajectory('reaches.tsv', trial=trials.thisN)
+
+        The samples are stored in numpy arrays that grow as needed. If
+        `maxSamples` is given only the most recent `maxSamples` are kept.
+        For more samples than the frame rate the events must be dispatched
+        more often than once per frame (e.g. by core.wait(), which dispatches
+        them throughout the wait).
+        """
+        global _mouseRecorders
+        if usePygame:
+            logging.warning("Mouse.startRecording() needs a pyglet window")
+        if self.win is None:
+            raise ValueError("Mouse.startRecording() needs the Mouse to have a win")
+        self.stopRecording()
+        self._recorder = _TrajectoryBuffer(maxSamples=maxSamples)
+        _mouseRecorders = _mouseRecorders+(self._recorder,)
+
+    def stopRecording(self):
+        """Stops recording the mouse. The samples so far can still be
+        retrieved (until the next startRecording())
+        """
+        global _mouseRecorders
+        if self._recorder is not None:
+            _mouseRecorders = tuple([rec for rec in _mouseRecorders if rec is not self._recorder])
+
+    def getTrajectory(self, clear=True, units=None, clock=None):
+        """Returns the samples recorded since :meth:`startRecording` (or the
+        last call with `clear=True`) as three numpy arrays::
+
+            times, positions, buttons = mouse.getTrajectory()
+
+        `times` are from core.getTime() unless a `core.Clock` is given (then
+        they are relative to its last reset), `positions` are (x,y) in the
+        window's units (or those given; (0,0) is the centre) and `buttons`
+        has a column for each of the 3 buttons (1 while it was down).
+        """
+        if self._recorder is None:
+            return numpy.zeros(0), numpy.zeros([0,2]), numpy.zeros([0,3], 'u1')
+        times, xys, buttons = self._recorder.read(clear=clear)
+        if clock is not None:
+            times -= clock.timeAtLastReset
+        xys -= numpy.asarray(self.win.size)/2.0
+        if units is None:
+            units = self.win.units
+        positions = self._pix2units(xys, units)
+        buttons = (buttons[:,numpy.newaxis]>>numpy.arange(3, dtype='u1'))&1
+        return times, positions, buttons
+
+    def saveTrajectory(self, fileName, trial='', clear=True, units=None, clock=None, delim='\t'):
+        """Appends the samples recorded so far (see :meth:`getTrajectory`) to
+        a text file, one row per sample: trial, time, x, y, left, middle and
+        right. The header row is written when the file is new. With
+        `clear=True` the samples are then removed, so the samples of each
+        trial are written in turn.
+        """
+        times, positions, buttons = self.getTrajectory(clear=clear, units=units, clock=clock)
+        isNew = not os.path.exists(fileName) or os.path.getsize(fileName)==0
+        f = open(fileName, 'a')
+        if isNew:
+            f.write(delim.join(['trial', 't', 'x', 'y', 'left', 'middle', 'right'])+'\n')
+        if len(times):
+            rows = numpy.column_stack([times, positions, buttons])
+            fmt = delim.join([str(trial).replace('%', '%%'), '%.6f', '%.6g', '%.6g', '%i', '%i', '%i'])
+            numpy.savetxt(f, rows, fmt=fmt)
+        f.close()
 
     def setPos(self,newPos=(0,0)):
         """Sets the current postiion of the mouse (pygame only),
@@ -488,19 +877,20 @@ class Mouse:
         if usePygame: return mouse.get_pressed()
         else:  #False: #havePyglet: # like in getKeys - pump the events
             #for each (pyglet) window, dispatch its events before checking event buffer
-            wins = pyglet.window.get_platform().get_default_display().get_windows()
-            for win in wins: win.dispatch_events()#pump events on pyglet windows
+            _dispatchWindowEvents()
 
             #else:
             if not getTime: return mouseButtons
             else: return mouseButtons, mouseTimes
 
     def _pix2windowUnits(self, pos):
-        if self.win.units=='pix': return pos
-        elif self.win.units=='norm': return pos*2.0/self.win.size
-        elif self.win.units=='cm': return psychopy.misc.pix2cm(pos, self.win.monitor)
-        elif self.win.units=='deg': return psychopy.misc.pix2deg(pos, self.win.monitor)
-        elif self.win.units=='height': return pos/float(self.win.size[1])
+        return self._pix2units(pos, self.win.units)
+    def _pix2units(self, pos, units):
+        if units=='pix': return pos
+        elif units=='norm': return pos*2.0/self.win.size
+        elif units=='cm': return self.win.getUnitConverter().pix2cm(pos)
+        elif units=='deg': return self.win.getUnitConverter().pix2deg(pos)
+        elif units=='height': return pos/float(self.win.size[1])
     def _windowUnits2pix(self, pos):
         if self.win.units=='pix': return pos
         elif self.win.units=='norm': return pos*self.win.size/2.0
@@ -530,14 +920,12 @@ def clearEvents(eventType=None):
             If this is not None then only events of the given type are cleared
     """
     #pyglet
-    if not havePygame or not display.get_init():
+    if not _pygameDisplayInit():
 
         #for each (pyglet) window, dispatch its events before checking event buffer
-        wins = pyglet.window.get_platform().get_default_display().get_windows()
-        for win in wins: win.dispatch_events()#pump events on pyglet windows
+        _dispatchWindowEvents()
         if eventType=='mouse': return # pump pyglet mouse events but don't flush keyboard buffer
-        global _keyBuffer
-        _keyBuffer = []
+        _keyReader.clear()
         return
 
     #for pygame
@@ -546,8 +934,10 @@ def clearEvents(eventType=None):
                         locals.MOUSEBUTTONDOWN])
     elif eventType=='keyboard':
         junk = evt.get([locals.KEYDOWN, locals.KEYUP])
+        _keyReader.clear()
     elif eventType=='joystick':
         junk = evt.get([locals.JOYAXISMOTION, locals.JOYBALLMOTION,
               locals.JOYHATMOTION, locals.JOYBUTTONUP, locals.JOYBUTTONDOWN])
     else:
         junk = evt.get()
+        _keyReader.clear()
@@ -1,6 +1,7 @@
-import sys, glob, collections
+import sys, glob, collections, threading
 from itertools import imap,chain
-from psychopy import logging
+from psychopy import logging, core
+import numpy
 __all__=['forp','cedrus','minolta','pr', 'crs', 'ioLabs']
 
 
@@ -44,6 +45,148 @@ def getSerialPorts():
     # need to.
     return chain.from_iterable(imap(glob.iglob,ports))
 
+class SerialReader(object):
+    """Reads a serial device continuously in a background thread, decodes
+    what it sends and publishes the events to an
+    :class:`~psychopy.event.InputEventQueue`, so that they are timestamped
+    as they arrive rather than when the experiment next checks the port.
+    Used by :class:`~psychopy.hardware.cedrus.RB730` and
+    :class:`~psychopy.hardware.forp.ButtonBox`.
+
+    :Parameters:
+
+        port : an open `serial.Serial` (or anything with read(n),
+            inWaiting() and flushInput())
+
+        decoder : a function that is given a bytearray of the bytes that
+            haven't been decoded yet and returns a list of event values and
+            the number of bytes it used (the rest, e.g. part of a packet, are
+            given to it again with the next bytes)
+
+        eventType, source : the type and source of the events put in the queue
+
+        queue : the :class:`~psychopy.event.InputEventQueue` for the events
+            (by default a new one, see `self.queue`)
+
+        bufferSize : the number of raw bytes kept for `getRaw()` (older ones
+            are lost and counted in `nRawDropped`)
+
+    Each chunk of bytes is timestamped (core.getTime()) as soon as the read
+    returns, and all the events decoded from it get that time. If the thread
+    isn't running, `poll()` reads and decodes whatever is waiting.
+    """
+    def __init__(self, port, decoder, eventType='button', source='serial',
+                 queue=None, bufferSize=65536, readTimeout=0.01, autoStart=True):
+        self.port = port
+        self.decoder = decoder
+        self.eventType = eventType
+        self.source = source
+        if queue is None:
+            from psychopy import event#(event imports monitors, which imports hardware)
+            queue = event.InputEventQueue()
+        self.queue = queue
+        self.readTimeout = readTimeout
+        self.nBytes = 0
+        self.nEvents = 0
+        self.nRawDropped = 0
+        self._raw = numpy.zeros(bufferSize, 'u1')#ring buffer of what was read
+        self._rawRead = 0
+        self._pending = bytearray()#bytes that haven't been decoded yet
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = None
+        self._error = None
+        if autoStart:
+            self.start()
+    def start(self):
+        """Starts the reading thread (if it isn't running already)"""
+        if self.running:
+            return
+        #a read now returns as soon as a byte arrives, or after readTimeout
+        self.port.timeout = self.readTimeout
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._run, name='SerialReader(%s)' %self.source)
+        self._thread.daemon = True
+        self._thread.start()
+    def stop(self):
+        """Stops the reading thread (within readTimeout)"""
+        if self._thread is None:
+            return
+        self._stopEvent.set()
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            logging.error("SerialReader(%s) stopped after an error: %s" %(self.source, self._error))
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    def poll(self):
+        """Reads and decodes whatever is waiting, if the thread isn't doing so"""
+        if self.running:
+            return
+        nWaiting = self.port.inWaiting()
+        if nWaiting:
+            data = self.port.read(nWaiting)
+            self._addBytes(data, core.getTime())
+    def _run(self):
+        port = self.port
+        try:
+            while not self._stopEvent.is_set():
+                data = port.read(max(1, port.inWaiting()))
+                if data:
+                    self._addBytes(data, core.getTime())
+        except Exception, e:
+            self._error = e
+            logging.error("SerialReader(%s): %s" %(self.source, e))
+    def _addBytes(self, data, t):
+        with self._lock:
+            self._addRaw(data)
+            self.nBytes += len(data)
+            self._pending.extend(data)
+            values, nUsed = self.decoder(self._pending)
+            del self._pending[:nUsed]
+        put = self.queue.put
+        for value in values:
+            put(self.eventType, value, t, self.source)
+        self.nEvents += len(values)
+    def _addRaw(self, data):
+        #call with the lock held
+        size = len(self._raw)
+        new = numpy.frombuffer(data, 'u1')[-size:]
+        start = (self.nBytes+len(data)-len(new))%size
+        nFirst = min(len(new), size-start)
+        self._raw[start:start+nFirst] = new[:nFirst]
+        self._raw[:len(new)-nFirst] = new[nFirst:]
+    def getRaw(self, clear=True):
+        """Returns the bytes (as a str) that have arrived since the last call
+        (or all that are still in the buffer if clear=False)
+        """
+        self.poll()
+        with self._lock:
+            size = len(self._raw)
+            nWritten = self.nBytes
+            start = self._rawRead if clear else 0
+            if nWritten-start>size:
+                if clear:
+                    self.nRawDropped += nWritten-start-size
+                start = nWritten-size
+            raw = self._raw[numpy.arange(start, nWritten)%size].tostring()
+            if clear:
+                self._rawRead = nWritten
+        return raw
+    def flush(self):
+        """Discards the waiting and undecoded bytes (and raw bytes not yet
+        retrieved). Events already in the queue are kept.
+        """
+        with self._lock:
+            self.port.flushInput()
+            del self._pending[:]
+            self._rawRead = self.nBytes
+    def close(self):
+        """Stops the thread and closes the port"""
+        self.stop()
+        self.port.close()
+
 def getAllPhotometers():
     """Gets all available photometers. 
     The returned photometers may vary depending on which drivers are installed.
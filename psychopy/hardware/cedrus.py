@@ -13,58 +13,93 @@ pyxid package instead (bundled with Standalone PsychoPy)::
 # Distributed under the terms of the GNU General Public License (GPL).
 
 from psychopy import core, logging
+from psychopy.hardware import SerialReader
 import struct, sys
 
 try: import serial
 except: serial=False
 
+#the key (bits 5-7) and direction (bit 4) for each value of the XID info byte
+_XID_KEYS = [info>>5 for info in range(256)]
+_XID_DIRECTIONS = [('up','down')[(info>>4)&1] for info in range(256)]
+
+def _decodeXID(data):
+    """Decodes the XID key packets ("k"<info><rt>, where info is a byte and
+    rt a 4-byte int) in a bytearray, in one pass. Returns a list of
+    (key, direction, rt) and the number of bytes used (a packet that hasn't
+    fully arrived is left for next time).
+    """
+    keys = []
+    pos = 0
+    while True:
+        start = data.find('k', pos)
+        if start<0:
+            return keys, len(data)
+        if start+6>len(data):
+            return keys, start
+        info = data[start+1]
+        rt = struct.unpack_from('<i', data, start+2)[0]#integer in ms
+        keys.append((_XID_KEYS[info], _XID_DIRECTIONS[info], rt))
+        pos = start+6
+
 class RB730:
-    """Class to control/read a Cedrus RB-series response box"""
+    """Class to control/read a Cedrus RB-series response box
+
+    The port is read continuously by a background
+    :class:`~psychopy.hardware.SerialReader`, so key events are timestamped
+    (keyEvt.time, from core.getTime()) as they arrive and are kept until
+    getKeyEvents() is called. They also go to the `queue` (an
+    :class:`~psychopy.event.InputEventQueue`, e.g. event.inputEvents) as
+    'button' events with the value (key, direction, rt).
+    """
     class KeyEvent:
         """Info about a keypress from Cedrus keypad XID string"""
-        def __init__(self,XID):
+        def __init__(self,XID=None, key=None, direction=None, rt=None, time=None):
             """XID should contain a "k"<info><rt> where info is a byte and rt is 4 bytes (=int)"""
-            if len(XID)!=6:
-                #log.error("The XID string %s is %i bytes long and should be 6 bytes" %(str([XID]),len(XID)))
-                self.key=None
-            else:
-                info = struct.unpack('B',XID[1])[0]#a character and a ubyte of info
-                
-                #was the key going down or up?
-                if (info>>4)%2: #this gives only the 4th bit
-                    self.direction='down'
+            self.key=key
+            self.direction=direction
+            self.rt=rt
+            self.time=time#when it arrived (core.getTime())
+            if XID is not None:
+                keys, nUsed = _decodeXID(bytearray(XID))
+                if len(XID)!=6 or not keys:
+                    #log.error("The XID string %s is %i bytes long and should be 6 bytes" %(str([XID]),len(XID)))
+                    self.key=None
                 else:
-                    self.direction='up'
-                    
-                #what was the key?
-                self.key = info>>5#bits 5-7 give the button number
-                    
-                #what was RT?
-                self.rt = struct.unpack('i',XID[2:])[0] #integer in ms
-                    
-            
-    def __init__(self, port, baudrate=115200, mode='XID'):
-        
-        if not serial:
-            raise ImportError('The module serial is needed to connect to the Cedrus response pad. ' +\
-                "On most systems this can be installed with\n\t easy_install pyserial")
-                
+                    self.key, self.direction, self.rt = keys[0]
+
+    def __init__(self, port, baudrate=115200, mode='XID', queue=None, readInBackground=True):
+        """`port` can also be a serial.Serial that is already open (or
+        anything with the same read/write methods)
+        """
         self.model = 'RB703'
         #set name of port
         if type(port) in [int, float]:
             self.portNumber = port
             self.portString = 'COM%i' %self.portNumber
-        else:
+        elif isinstance(port, basestring):
             self.portString = port
             self.portNumber=None
+        else:#an open port
+            self.portString = getattr(port, 'port', None)
+            self.portNumber=None
         self.mode = mode #can be 'xid', 'rb', 'ascii'
         self.baudrate = baudrate
         #open the serial port
-        self.port = serial.Serial(self.portString, baudrate=baudrate, bytesize=8, parity='N', stopbits=1, timeout=0.0001)
-        if not self.port.isOpen():
-            self.port.open()
-        #self.buffer = ''#our own buffer (in addition to the serial port buffer)
+        if type(port) in [int, float] or isinstance(port, basestring):
+            if not serial:
+                raise ImportError('The module serial is needed to connect to the Cedrus response pad. ' +\
+                    "On most systems this can be installed with\n\t easy_install pyserial")
+            self.port = serial.Serial(self.portString, baudrate=baudrate, bytesize=8, parity='N', stopbits=1, timeout=0.0001)
+            if not self.port.isOpen():
+                self.port.open()
+        else:
+            self.port = port
+        self.reader = SerialReader(self.port, _decodeXID, source='RB730', queue=queue, autoStart=False)
+        self._keyReader = self.reader.queue.newReader(types=['button'])
         self.clearBuffer()
+        if readInBackground:
+            self.reader.start()
         
     def sendMessage(self, message):
         self.port.writelines(message)
@@ -75,7 +110,8 @@ class RB730:
         
     def clearBuffer(self):
         """Empty the input buffer of all characters. Call this to clear any keypresses that haven't yet been handled."""
-        self.port.flushInput()
+        self.reader.flush()
+        self._keyReader.clear()
         
     def getKeyEvents(self, allowedKeys=[1,2,3,4,5,6,7], downOnly=True):    
         """Return a list of keyEvents
@@ -84,41 +120,28 @@ class RB730:
                 keyEvt.key is the button pressed (or released) (an int)
                 keyEvt.rt [=float] is the time (in secs) since the rt clock was last reset (a float)
                 keyEvt.direction is the direction the button was goin ('up' or 'down')
+                keyEvt.time is when the event arrived (core.getTime())
                 
             allowedKeys will limit the set of keys that are returned (WARNING: info about other keys is discarded)
             downOnly limits the function to report only the downward stroke of the key
                 """
-        #get the raw string
-        nToGet = self.port.inWaiting()        
-        #self.buffer += self.port.read(nToGet)#extend our own buffer (then remove the bits we use)
-        inputStr = self.port.read(nToGet)#extend our own buffer (then remove the bits we use)
+        self.reader.poll()#if it isn't reading in the background
         keys =[]#initialise
-        
-        #loop through messages for keys
-        nKeys = inputStr.count('k')#find the "k"s
-        for keyN in range(nKeys):
-            start = inputStr.find('k')#find the next key
-            stop = start+6
-            #check we have that many characters(in case we read the buffer partway through output)
-            if len(inputStr)<stop:
-                inputStr+= self.port.read(stop-len(inputStr))
-            keyString = inputStr[start:stop]
-            keyEvt = self.KeyEvent(XID=keyString)
-            if keyEvt.key not in allowedKeys:
+        for evt in self._keyReader.getEvents():
+            if evt.source!=self.reader.source:
+                continue#from another device sharing the queue
+            key, direction, rt = evt.value
+            if key not in allowedKeys:
                 continue #ignore this keyEvt and move on
-            if (downOnly==True and keyEvt.direction=='up'):
+            if (downOnly==True and direction=='up'):
                 continue #ignore this keyEvt and move on
-            
             #we found a valid keyEvt
-            keys.append(keyEvt)
-            inputStr = inputStr.replace(keyString,'',1)#remove the (1st occurence of) string from the buffer
-            
+            keys.append(self.KeyEvent(key=key, direction=direction, rt=rt, time=evt.time))
         return keys
     
     def readMessage(self):
         """Read and return an unformatted string from the device (and delete this from the buffer)"""
-        nToGet = self.port.inWaiting()    
-        return self.port.read(nToGet)
+        return self.reader.getRaw()
     
     def measureRoundTrip(self):
         #round trip
@@ -165,4 +188,7 @@ class RB730:
         self.sendMessage('_d1')
         core.wait(0.1)
         return self.readMessage()
+    def close(self):
+        """Stop reading the device and close the port"""
+        self.reader.close()
         
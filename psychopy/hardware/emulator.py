@@ -35,10 +35,9 @@ class ResponseEmulator(threading.Thread):
     def run(self):
         self.running = True
         self.clock.reset()
-        last_onset = 0.000
         # wait until next event requested, and simulate a key press
         for onset, key in self.responses:
-            core.wait(float(onset) - last_onset)
+            core.waitUntil(float(onset), clock=self.clock)#no drift from the previous waits
             if type(key) == int:
                 #log.warning('ResponseEmulator: int converted to str')
                 key = str(key)[0]  # avoid cryptic error if int
@@ -46,7 +45,6 @@ class ResponseEmulator(threading.Thread):
                 event._onPygletKey(symbol=key, modifiers=None, emulated=True)
             else:
                 logging.error('ResponseEmulator: only keyboard events are supported')
-            last_onset = onset
             if self.stopflag: break
         self.running = False
         
@@ -104,10 +102,8 @@ class SyncGenerator(threading.Thread):
                 break
             # "emit" a sync pulse by placing a key in the buffer:
             event._onPygletKey(symbol=self.sync, modifiers=None, emulated=True)
-            # wait for start of next volume, doing our own hogCPU for tighter sync:
-            core.wait(self.timesleep - self.hogCPU, hogCPUperiod=0)
-            while self.clock.getTime() < vol * self.TR:
-                pass # hogs the CPU for tighter sync
+            # wait for start of next volume (an absolute time, so no drift accumulates):
+            core.waitUntil(vol * self.TR, clock=self.clock, hogCPUperiod=self.hogCPU)
         self.running = False
     def stop(self):
         self.stopflag = True
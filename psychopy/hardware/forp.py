@@ -11,8 +11,10 @@ If you're connecting via USB, just treat it like a standard keyboard.
 # Jeremy Gray and Dan Grupe developed the asKeys and baud parameters
 
 from psychopy import logging, event
-import sys
+from psychopy.hardware import SerialReader
+import sys, threading
 from collections import defaultdict
+import numpy
 
 try: import serial
 except: serial=False
@@ -29,6 +31,38 @@ BUTTON_MAP = [
     (0x04, BUTTON_GREEN),
     (0x08, BUTTON_RED),
     (0x10, BUTTON_TRIGGER)]
+#the buttons whose bits are set, for each byte value
+_BUTTONS = [tuple([button for bit, button in BUTTON_MAP if bit & code]) for code in range(256)]
+
+class _ForpDecoder(object):
+    """Turns the fORP's bytes (a bit set for each button that is down) into
+    the buttons that went from up to down, comparing each byte with the
+    previous one in one go with numpy.
+    """
+    def __init__(self):
+        self.status = 0#the buttons that were down in the last byte
+        self.heldBits = 0#the bits set in any byte since takeHeldBits()
+        self._lock = threading.Lock()
+    def __call__(self, data):
+        if not len(data):
+            return [], 0
+        codes = numpy.frombuffer(bytes(data), 'u1')
+        previous = numpy.empty_like(codes)
+        previous[0] = self.status
+        previous[1:] = codes[:-1]
+        pressed = codes & ~previous
+        presses = []
+        for code in pressed[pressed.nonzero()]:
+            presses.extend(_BUTTONS[code])
+        with self._lock:
+            self.status = int(codes[-1])
+            self.heldBits |= int(numpy.bitwise_or.reduce(codes))
+        return presses, len(data)
+    def takeHeldBits(self):
+        """Returns the bits that were set in any byte since the last call"""
+        with self._lock:
+            heldBits, self.heldBits = self.heldBits, 0
+        return heldBits
 
 
 class ButtonBox:
@@ -39,35 +73,51 @@ class ButtonBox:
     (e.g., to be able to use a RatingScale object during scanning).
     Alternatively connect the USB cable and use fORP to emulate a keyboard.
 
-    fORP sends characters at 800Hz, so you should check the buffer frequently.
+    fORP sends characters at 800Hz, so they are read continuously by a
+    background :class:`~psychopy.hardware.SerialReader` (unless
+    readInBackground=False, when you should check the buffer frequently).
+    This also means that each press is timestamped as it arrives: the presses
+    also go to the `queue` (an :class:`~psychopy.event.InputEventQueue`, e.g.
+    event.inputEvents) as 'button' events with the button number as value.
     Also note that the trigger event numpy the fORP is typically extremely short
     (occurs for a single 800Hz epoch).
     """
-    def __init__(self, serialPort=1, baudrate=19200):
+    def __init__(self, serialPort=1, baudrate=19200, queue=None, readInBackground=True):
         """
         :Parameters:
 
             `serialPort` :
-                should be a number (where 1=COM1, ...)
+                should be a number (where 1=COM1, ...), or a serial.Serial
+                that is already open
             `baud` :
                 the communication rate (baud), eg, 57600
+            `queue` :
+                the event.InputEventQueue for the presses (a new one by default)
         """
-        if not serial:
-            raise ImportError('The module serial is needed to connect to fORP. ' +\
-                "On most systems this can be installed with\n\t easy_install pyserial")
-
-        self.port = serial.Serial(serialPort-1, baudrate=baudrate, bytesize=8,
-                                  parity='N', stopbits=1, timeout=0.001)
-        if not self.port.isOpen():
-            self.port.open()
+        if type(serialPort) in [int, float]:
+            if not serial:
+                raise ImportError('The module serial is needed to connect to fORP. ' +\
+                    "On most systems this can be installed with\n\t easy_install pyserial")
+
+            self.port = serial.Serial(serialPort-1, baudrate=baudrate, bytesize=8,
+                                      parity='N', stopbits=1, timeout=0.001)
+            if not self.port.isOpen():
+                self.port.open()
+        else:
+            self.port = serialPort
 
         self.buttonStatus = defaultdict(bool) # Defaults to False
         self.rawEvts = []
         self.pressEvents = []
+        self._decoder = _ForpDecoder()
+        self.reader = SerialReader(self.port, self._decoder, source='fORP', queue=queue,
+                                   autoStart=readInBackground)
+        self._pressReader = self.reader.queue.newReader(types=['button'])
 
     def clearBuffer(self):
         """Empty the input buffer of all characters"""
-        self.port.flushInput()
+        self.reader.flush()
+        self._pressReader.clear()
 
     def clearStatus(self):
         """ Resets the pressed statuses, so getEvents will return pressed
@@ -75,6 +125,7 @@ class ButtonBox:
         """
         for k in self.buttonStatus.keys():
             self.buttonStatus[k] = False
+        self._decoder.status = 0
 
     def getEvents(self, returnRaw=False, asKeys=False, allowRepeats=False):
         """Returns a list of unique events (one event per button pressed)
@@ -99,23 +150,23 @@ class ButtonBox:
             This option might be useful if you think your participant may be
             holding the button down before you start checking for presses.
         """
-        nToGet = self.port.inWaiting()
-        evtStr = self.port.read(nToGet)
-        self.rawEvts = []
-        self.pressEvents = []
+        self.reader.poll()#if it isn't reading in the background
+        #the characters as ordinal int values
+        self.rawEvts = list(bytearray(self.reader.getRaw()))
+        presses = [evt for evt in self._pressReader.getEvents() if evt.source==self.reader.source]
+        self.pressEvents = [evt.value for evt in presses]
+        heldBits = self._decoder.takeHeldBits()
         if allowRepeats:
-            self.clearStatus()
-        #for each character convert to an ordinal int value (numpy the ascii chr)
-        for thisChr in evtStr:
-            pressCode = ord(thisChr)
-            self.rawEvts.append(pressCode)
-            decodedEvents = self._generateEvents(pressCode)
-            self.pressEvents += decodedEvents
-            if asKeys:
-                for code in decodedEvents:
-                    event._onPygletKey(symbol=code, modifiers=None)
-                    # better as: emulated='fORP_bbox_asKey', but need to adjust event._onPygletKey
-                    # and the symbol conversion pyglet.window.key.symbol_string(symbol).lower()
+            #also the buttons that were held down (already pressed before)
+            self.pressEvents += [button for button in _BUTTONS[heldBits]
+                                 if button not in self.pressEvents]
+        for button, pressed in self._decodePress(self._decoder.status):
+            self.buttonStatus[button] = pressed
+        if asKeys:
+            for evt in presses:
+                #as emulated keys, but with the time they arrived
+                event.inputEvents.put('key', unicode(evt.value), evt.time, 'fORP')
+                logging.data("fORP: %s" %evt.value)
         #return the abbreviated list if necessary
         if returnRaw:
             return self.rawEvts
@@ -151,8 +202,8 @@ class ButtonBox:
             A number with a bit set for every button currently pressed. Will
             be between 0 and 31."""
 
-        return [(mapping[1], bool(mapping[0] & pressCode))
-            for mapping in BUTTON_MAP]
+        pressed = _BUTTONS[pressCode]
+        return [(button, button in pressed) for bit, button in BUTTON_MAP]
 
 
     def getUniqueEvents(self, fullEvts=False):
@@ -163,3 +214,7 @@ class ButtonBox:
             return set(self.rawEvts)
         return set(self.pressEvents)
 
+    def close(self):
+        """Stop reading the device and close the port"""
+        self.reader.close()
+
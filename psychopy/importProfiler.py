@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Reports how long it takes to import each module that gets loaded by
+importing (parts of) PsychoPy. From a terminal::
+
+    python -m psychopy.importProfiler psychopy.visual psychopy.data
+
+Each of the named modules (default psychopy.visual) is imported in a fresh
+python process, so the times are for a first import. The table shows, for
+every module loaded along the way, the time spent running that module itself
+and the time including the modules that it imported (like python3's
+`-X importtime`).
+"""
+# Part of the PsychoPy library
+# Copyright (C) 2012 Jonathan Peirce
+# Distributed under the terms of the GNU General Public License (GPL).
+
+#NB this file is run directly (not as part of the psychopy package) in the
+#process being measured, so it must not import anything from psychopy
+import sys, os, imp, time
+
+class _TimedImporter(object):
+    """A sys.meta_path importer that finds and loads modules in the normal
+    way (with the imp module) and keeps a record of how long each one took
+    """
+    def __init__(self):
+        self.records = []#(depth, name, selfTime, totalTime) in order of completion
+        self._stack = []#time spent in child imports, for each import underway
+    def find_module(self, fullname, path=None):
+        try:
+            found = imp.find_module(fullname.rpartition('.')[2], path)
+        except ImportError:
+            return None#let the usual machinery deal with it (e.g. zipped eggs)
+        return _TimedLoader(self, found)
+    def _load(self, fullname, found):
+        fileObj, pathName, description = found
+        self._stack.append(0.0)
+        t0 = time.time()
+        try:
+            return imp.load_module(fullname, fileObj, pathName, description)
+        finally:
+            if fileObj:
+                fileObj.close()
+            total = time.time()-t0
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += total
+            self.records.append((len(self._stack), fullname, total-children, total))
+
+class _TimedLoader(object):
+    def __init__(self, importer, found):
+        self.importer = importer
+        self.found = found
+    def load_module(self, fullname):
+        if fullname in sys.modules:#e.g. a reload()
+            return sys.modules[fullname]
+        return self.importer._load(fullname, self.found)
+
+def timeImports(moduleName):
+    """Imports `moduleName` (in this process) and returns a list of
+    (depth, name, selfTime, totalTime) for every module that was loaded as a
+    result, in the order they finished loading.
+    """
+    importer = _TimedImporter()
+    sys.meta_path.insert(0, importer)
+    try:
+        __import__(moduleName)
+    finally:
+        sys.meta_path.remove(importer)
+    return importer.records
+
+def formatImportTimes(records, minTime=0.0):
+    """Formats the output of :func:`timeImports` as a table (in ms), leaving
+    out modules that took less than `minTime` seconds in total
+    """
+    lines = ['%10s %10s  %s' %('self(ms)', 'total(ms)', 'module')]
+    for depth, name, selfTime, totalTime in records:
+        if totalTime>=minTime:
+            lines.append('%10.1f %10.1f  %s%s' %(selfTime*1000, totalTime*1000, '  '*depth, name))
+    return '\n'.join(lines)
+
+def profileImports(moduleNames=('psychopy.visual',), minTime=0.001):
+    """Imports each of `moduleNames` in a new python process and prints the
+    time taken by each module that got loaded (see
+    :func:`formatImportTimes`). Modules taking less than `minTime` secs are
+    omitted from the table.
+    """
+    import subprocess
+    thisFile = os.path.splitext(os.path.abspath(__file__))[0]+'.py'
+    packageDir = os.path.dirname(os.path.dirname(thisFile))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([packageDir]+
+        [p for p in env.get('PYTHONPATH','').split(os.pathsep) if p])
+    for moduleName in moduleNames:
+        print 'Importing %s:' %moduleName
+        sys.stdout.flush()
+        subprocess.call([sys.executable, thisFile, '--child', str(minTime), moduleName], env=env)
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    if args[:1]==['--child']:
+        #don't let psychopy's own modules (e.g. logging) hide the standard ones
+        if os.path.abspath(sys.path[0])==os.path.dirname(os.path.abspath(__file__)):
+            del sys.path[0]
+        t0 = time.time()
+        records = timeImports(args[2])
+        print formatImportTimes(records, minTime=float(args[1]))
+        print '%10s %10.1f  (total)' %('', (time.time()-t0)*1000)
+    else:
+        profileImports(args or ['psychopy.visual'])
@@ -0,0 +1,76 @@
+"""Deferred importing of optional (and slow to import) modules, so that
+`import psychopy.visual` etc. only pay for the libraries that actually get used
+"""
+# Part of the PsychoPy library
+# Copyright (C) 2012 Jonathan Peirce
+# Distributed under the terms of the GNU General Public License (GPL).
+
+import sys, imp
+
+class LazyModule(object):
+    """Stands in for a module that is only imported when one of its
+    attributes is first used::
+
+        pygame = LazyModule('pygame')
+        ...
+        pygame.init()#pygame is actually imported here
+
+    If the module can't be imported then the ImportError is raised at
+    that point. Use :func:`isAvailable` to check first.
+    """
+    def __init__(self, name):
+        self.__dict__['_lazyName'] = name
+        self.__dict__['_lazyModule'] = None
+        self.__dict__['_lazyFailed'] = False
+    def __getattr__(self, attr):
+        return getattr(_load(self), attr)
+    def __setattr__(self, attr, value):
+        setattr(_load(self), attr, value)
+    def __repr__(self):
+        if self._lazyModule is None:
+            return "<lazy module '%s' (not yet imported)>" %self._lazyName
+        return repr(self._lazyModule)
+
+def _load(lazyModule):
+    module = lazyModule._lazyModule
+    if module is None:
+        name = lazyModule._lazyName
+        __import__(name)
+        module = lazyModule.__dict__['_lazyModule'] = sys.modules[name]
+    return module
+
+def isAvailable(lazyModule):
+    """Imports the module behind a :class:`LazyModule` (if that hasn't happened
+    yet) and returns True, or False if it can't be imported (a failed import
+    is only attempted once)
+    """
+    if lazyModule._lazyFailed:
+        return False
+    try:
+        _load(lazyModule)
+    except ImportError:
+        lazyModule.__dict__['_lazyFailed'] = True
+        return False
+    return True
+
+def isLoaded(lazyModule):
+    """True if the module behind a :class:`LazyModule` has already been imported
+    (by this or any other code)
+    """
+    return lazyModule._lazyModule is not None or \
+        sys.modules.get(lazyModule._lazyName) is not None
+
+def isInstalled(name):
+    """True if a module called `name` (e.g. 'pygame' or 'matplotlib.nxutils') can
+    be found, without actually importing it (or its parent packages)
+    """
+    path = None
+    for part in name.split('.'):
+        try:
+            fileObj, pathName, description = imp.find_module(part, path)
+        except ImportError:
+            return False
+        if fileObj:
+            fileObj.close()
+        path = [pathName]
+    return True
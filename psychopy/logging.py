@@ -25,11 +25,13 @@ messages, (which PsychoPy doesn't use) using the commands::
 # Distributed under the terms of the GNU General Public License (GPL).
 
 #Much of the code below is based conceptually, if not syntactically, on the
-#python logging module but it's simpler (no threading) and maintaining a stack
-#of log entries for later writing (don't want files written while drawing)
+#python logging module but it's simpler and maintaining a stack
+#of log entries for later writing (don't want files written while drawing).
+#Optionally the writing can be done by a background thread (see
+#startBackgroundWriter) so that it never happens in the drawing thread at all
 
 from os import path
-import sys, time, codecs, weakref
+import sys, time, codecs, weakref, threading, collections, atexit
 
 _packagePath = path.split(__file__)[0]
 
@@ -172,22 +174,54 @@ class LogFile:
             self.stream.flush()
         except:
             pass
+class _LogWriterThread(threading.Thread):
+    """Writes the pending entries of a _Logger to its targets from a separate
+    thread, waking up every `interval` secs or when the logger is flushed
+    """
+    def __init__(self, logger, interval=0.1):
+        threading.Thread.__init__(self)
+        self.daemon=True
+        self.logger=logger
+        self.interval=interval
+        self._wakeEvent=threading.Event()
+        self._finishRequested=False
+    def run(self):
+        while not self._finishRequested:
+            self._wakeEvent.wait(self.interval)
+            self._wakeEvent.clear()
+            self.logger._writeEntries()
+        self.logger._writeEntries()#anything that arrived while finishing
+    def wake(self):
+        """Write the pending entries as soon as possible"""
+        self._wakeEvent.set()
+    def finish(self):
+        """Write the remaining entries and wait for the thread to end"""
+        self._finishRequested=True
+        self._wakeEvent.set()
+        self.join()
+
 class _Logger:
     """Maintains a set of log targets (text streams such as files of stdout)
 
     self.targets is a list of dicts {'stream':stream, 'level':level}
 
     """
-    def __init__(self, format="%(t).4f\t%(levelname)s\t%(message)s"):
+    def __init__(self, format="%(t).4f\t%(levelname)s\t%(message)s", maxFlushed=5000):
         """The string-formatted elements %(xxxx)f can be used, where
         each xxxx is an attribute of the LogEntry.
         e.g. t, t_ms, level, levelname, message
+
+        Only the most recent `maxFlushed` entries are kept in self.flushed
+        after they have been written (None keeps all of them)
         """
         self.targets=[]
-        self.flushed=[]
-        self.toFlush=[]
+        self.flushed=collections.deque(maxlen=maxFlushed)
+        self.toFlush=collections.deque()#appending/popping is thread-safe
         self.format=format
         self.lowestTarget=50
+        self._writer=None
+        self._writeLock=threading.Lock()
+        self._atexitRegistered=False
     def __del__(self):
         self.flush()
         #try:
@@ -226,21 +260,62 @@ class _Logger:
         self.toFlush.append(_LogEntry(t=t, level=level, message=message, obj=obj))
     def flush(self):
         """Process all current messages to each target
+
+        If a background writer is running (see :func:`startBackgroundWriter`)
+        this simply wakes it up and returns immediately
         """
-        #loop through targets then entries in toFlush
-        #so that stream.flush can be called just once
-        formatted={}#keep a dict of formatted messages - so only do the formatting once
-        for target in self.targets:
-            for thisEntry in self.toFlush:
-                if thisEntry.level>=target.level:
-                    if not formatted.has_key(thisEntry):
-                        #convert the entry into a formatted string
-                        formatted[thisEntry]= self.format %thisEntry.__dict__
-                    target.write(formatted[thisEntry]+'\n')
-            target.stream.flush()
-        #finished processing entries - move them to self.flushed
-        self.flushed.extend(self.toFlush)
-        self.toFlush=[]#a new empty list
+        if self._writer is not None:
+            self._writer.wake()
+        else:
+            self._writeEntries()
+    def _writeEntries(self):
+        """Format the pending entries (once each) and write them to each
+        target, with a single stream.flush() per target
+        """
+        self._writeLock.acquire()
+        try:
+            entries=[]
+            while self.toFlush:
+                entries.append(self.toFlush.popleft())
+            if not entries:
+                return
+            formatted=[self.format %thisEntry.__dict__ + '\n' for thisEntry in entries]
+            for target in list(self.targets):#targets could be added by another thread
+                nWritten=0
+                for thisEntry, line in zip(entries, formatted):
+                    if thisEntry.level>=target.level:
+                        target.stream.write(line)
+                        nWritten+=1
+                if nWritten:
+                    target.stream.flush()
+            #finished processing entries - move them to self.flushed
+            self.flushed.extend(entries)
+        finally:
+            self._writeLock.release()
+    def setMaxFlushed(self, maxFlushed):
+        """Set how many of the entries that have already been written are
+        retained in self.flushed (None to keep all of them)
+        """
+        self.flushed=collections.deque(self.flushed, maxlen=maxFlushed)
+    def startBackgroundWriter(self, interval=0.1):
+        """Write entries from a background thread rather than in flush()
+        """
+        if self._writer is not None:
+            return
+        self._writer=_LogWriterThread(self, interval=interval)
+        self._writer.start()
+        if not self._atexitRegistered:#make sure nothing is lost when python exits
+            atexit.register(self.stopBackgroundWriter)
+            self._atexitRegistered=True
+    def stopBackgroundWriter(self):
+        """Write any remaining entries and stop the background thread (if
+        there is one). Subsequent calls to flush() write directly again.
+        """
+        writer=self._writer
+        self._writer=None
+        if writer is not None:
+            writer.finish()
+        self._writeEntries()
 
 root = _Logger()
 console = LogFile()
@@ -250,6 +325,24 @@ def flush(logger=root):
     """
     logger.flush()
 
+def startBackgroundWriter(interval=0.1, logger=root):
+    """Write log entries to their targets from a background thread, so that no
+    file access happens in the main (drawing) thread. Entries are written
+    every `interval` secs and when :func:`flush` is called (which then returns
+    immediately). Remaining entries are written when python exits.
+
+    usage::
+
+        logging.startBackgroundWriter()
+    """
+    logger.startBackgroundWriter(interval=interval)
+
+def stopBackgroundWriter(logger=root):
+    """Write any remaining log entries and go back to writing them only when
+    :func:`flush` is called
+    """
+    logger.stopBackgroundWriter()
+
 def critical(msg, t=None, obj=None):
     """log.critical(message)
     Send the message to any receiver of logging info (e.g. a LogFile) of level `log.CRITICAL` or higher
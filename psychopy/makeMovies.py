@@ -10,7 +10,7 @@ building an optimised gif palette (makeRGBhistogram, makePalette, rgb2palette ar
 very heavily based on his code).
 """
 from psychopy import logging
-import string, time, tempfile, os, glob
+import string, time, tempfile, os, glob, threading, Queue
 import Image, ImageChops
 from GifImagePlugin import getheader, getdata #part of PIL
 try:
@@ -34,91 +34,138 @@ def makeAnimatedGIF(filename, images):
     """Convert list of image frames to a GIF animation file
     using simple delta coding"""
 
-    frames = 0
-    previous=None
-    fp = open(filename, 'wb')
+    optimPalette=None
     if images[0].mode in ['RGB','RGBA']:
         #first make an optimised palette
         optimPalette=makePalette(images, verbose=True)
 
+    writer = AnimatedGIFWriter(filename, palette=optimPalette)
     for n, im in enumerate(images):
         print 'converting frame %i of %i to GIF' %(n+1,len(images))
-        if im.mode=='RGB':
-            im = rgb2palette(im, palette=optimPalette, verbose=False)
-        if not previous:
-            # global header
-            for s in getheader(im) + getdata(im):
-                fp.write(s)
-        else:
-            # delta frame
-            delta = ImageChops.subtract_modulo(im, previous)
-            bbox = delta.getbbox()
-            # compress difference
-            if bbox:
-                for s in getdata(im.crop(bbox), offset = bbox[:2]):
-                    fp.write(s)
+        writer.addFrame(im)
+    writer.close()
+    return writer.nFrames
+
+class AnimatedGIFWriter(object):
+    """Writes an animated GIF a frame at a time (using simple delta coding),
+    so the frames don't all need to be kept in memory.
+
+    If a palette is given all frames share it, and colors that aren't in the
+    palette are drawn with the nearest one. Otherwise the part of each frame
+    that changed gets its own palette (a local color table, made with
+    :func:`makePalette`, or PIL's adaptive palette if it has more than 256
+    colors), so a blank first frame doesn't limit the colors of later ones.
+    """
+    def __init__(self, filename, palette=None):
+        self.filename = filename
+        self.palette = palette
+        self.nFrames = 0
+        self._previous = None
+        self._file = open(filename, 'wb')
+    def addFrame(self, frame):
+        """Add a frame (a PIL image or a numpy array [height,width,3] of uint8)
+        """
+        if isinstance(frame, numpy.ndarray):
+            frame = Image.fromarray(numpy.asarray(frame, numpy.uint8))
+        if frame.mode!='P' and frame.mode!='RGB':
+            frame = frame.convert('RGB')
+        #the region that changed since the previous frame
+        bbox = None
+        if self._previous is not None:
+            if frame.mode=='P':
+                bbox = ImageChops.subtract_modulo(frame, self._previous).getbbox()
             else:
-                for s in getdata(im):
-                    fp.write(s)
-
-        previous = im.copy()
-        frames = frames + 1
-    fp.write(";")
-    fp.close()
-    return frames
-
+                bbox = ImageChops.difference(frame, self._previous).getbbox()
+        if bbox:
+            region, offset = frame.crop(bbox), bbox[:2]
+        else:
+            region, offset = frame, (0, 0)
+        localPalette = False
+        if region.mode!='P':
+            region = rgb2palette(region, palette=self.palette)#a palette of its own if None
+            localPalette = self.palette==None and self._previous is not None
+        fp = self._file
+        if self._previous is None:
+            # global header (with the palette of the first frame)
+            for s in getheader(region):
+                fp.write(s)
+        data = getdata(region, offset=offset)
+        if localPalette:
+            #flag a local color table (of 256 entries) in the image descriptor,
+            #which goes before the LZW code size
+            fp.write(data[0][:9] + chr(128 + 7))
+            fp.write(region.im.getpalette("RGB")[:768])
+            data = [data[0][10:]] + data[1:]
+        for s in data:
+            fp.write(s)
+        self._previous = frame.copy()
+        self.nFrames += 1
+    def close(self):
+        """Finish the file"""
+        if self._file is not None:
+            self._file.write(";")
+            self._file.close()
+            self._file = None
+
+def _imageArray(image):
+    """An image (PIL or numpy) as an array [height, width, nChannels] of uint8"""
+    pixels = numpy.asarray(image, numpy.uint8)
+    if pixels.ndim==2:#luminance
+        pixels = pixels[:,:,numpy.newaxis].repeat(3, axis=2)
+    return pixels
+
+def _packColors(pixels):
+    """Packs an array [..., nChannels] of uint8 colors into single uint32
+    values (in the same order as sorting the color tuples)"""
+    pixels = numpy.asarray(pixels, numpy.uint32)
+    nChannels = pixels.shape[-1]
+    keys = numpy.zeros(pixels.shape[:-1], numpy.uint32)
+    for n in range(nChannels):
+        keys |= pixels[...,n] << (8*(nChannels-1-n))
+    return keys
+
+def _unpackColors(keys, nChannels=3):
+    """The inverse of _packColors, returns an array [nColors, nChannels]"""
+    keys = numpy.asarray(keys, numpy.uint32)
+    return numpy.column_stack([(keys >> (8*(nChannels-1-n))) & 255
+        for n in range(nChannels)]).astype(int)
+
+def _adaptivePalette(image):
+    """PIL's adaptive 256-color palette for an image, as a list of 768 ints"""
+    return image.convert('RGB').convert('P', palette=Image.ADAPTIVE).getpalette()[:768]
 
 def RgbHistogram (images, verbose=False):
     """build a histogram of the colors in the image(s)
-    with which we can build an optimized color palette"""
-    hist = None
+    with which we can build an optimized color palette.
 
+    Returns a list of (count, color) with the most common first, or None if
+    there are more than 256 colors"""
     #make a list if given only one image
-    if type(images)== type([]):
-        nImages = len(images)
-    else:
-        nImages=1
+    if type(images)!= type([]):
         images= [images]
 
-    # Form a histogram dictionary whose keys are the repr(color)
     if verbose:    print 'optimising palette ...'
-    datalist=[]
+    colors = numpy.zeros(0, numpy.uint32)
+    counts = numpy.zeros(0, int)
     for imgRgb in images:
-        datalist.extend(imgRgb.getdata())
-
-    dicthist = {}
-    xsize, ysize = imgRgb.size
-    numcolors = 0
-    for i in xrange (xsize * ysize * nImages):
-        color = datalist [i]
-        key = repr (color)
-
-        if dicthist.has_key (key):  # color already exists
-            dicthist [key] += 1     # increment the count
-        else:                       # make a new key
-            dicthist [key] = 1      # instantiate a new entry and init the count
-            numcolors += 1
-
-            if numcolors > 256:
-                if verbose:    print '               ... too many colors'
-                return None         # Error flag:  use PIL default color palette/dithering
+        pixels = _imageArray(imgRgb)
+        nChannels = pixels.shape[-1]
+        theseColors, inverse = numpy.unique(_packColors(pixels), return_inverse=True)
+        theseCounts = numpy.bincount(inverse)#(return_counts needs numpy 1.9)
+        #combine with the colors of the previous images
+        colors, indices = numpy.unique(numpy.concatenate([colors, theseColors]), return_inverse=True)
+        counts = numpy.bincount(indices, weights=numpy.concatenate([counts, theseCounts])).astype(int)
+        if len(colors) > 256:
+            if verbose:    print '               ... too many colors'
+            return None         # Error flag:  use PIL default color palette/dithering
     if verbose:    print '               ... OK'
 
-    # reform the dictionary into a sorted histogram of the form: (count, (r, g, b))
-    hist = []
-    for key in dicthist.iterkeys():
-        count = dicthist [key]
-        color = eval (key)
-        hist.append ( (count, color) )
-    #end for
-
-    hist.sort()
-    hist.reverse()           # make largest counts first
-
-    return hist
+    # a sorted histogram of the form: (count, (r, g, b)), largest counts first
+    order = numpy.lexsort((colors, counts))[::-1]
+    colorTuples = _unpackColors(colors[order], nChannels)
+    return [(int(counts[i]), tuple(color)) for i, color in zip(order, colorTuples.tolist())]
 
 #end def RgbHistogram
-
 def Getalphaindex (imgP, maskinv):
 
     # Find the least used color (palette entry, actually)
@@ -174,15 +221,11 @@ def makePalette(images, verbose=False):
 def rgb2palette (imgRgb, palette=None, verbose=False):     # image could be a "RGBA"
     """
     Converts an RGB image to a palettised version (for saving as gif).
-    """
-    #verbose = False
-
-    imgP = None
-    datalist = None
 
+    Each pixel gets the palette entry of its color, or of the nearest color
+    in the palette. If no palette is given one is made from the image.
+    """
     size = imgRgb.size
-    xsize = size [0]
-    ysize = size [1]
 
     hasalpha = False
     if imgRgb.mode == 'RGBA':
@@ -200,32 +243,14 @@ def rgb2palette (imgRgb, palette=None, verbose=False):     # image could be a "R
     # any "excess" colors with be transformed later to the closest palette match
     if palette==None:
         palette=makePalette(imgRgb)
-
-    numPalette= numpy.reshape(numpy.asarray(palette), [256,3])
-    listPalette = numPalette.tolist()
-    imgP = Image.new ('P', size)            # Create a brand new paletted image
-    imgP.putpalette (palette)               # Install the palette
+        if palette==None:#too many colors
+            palette=_adaptivePalette(imgRgb)
 
     # Rewrite the entire image using new palette's indices.
     if verbose:    print 'Defining the new image using the newly created palette ...'
-
-    # Each pixel gets a palette color index
-    if datalist == None:
-        datalist = list (imgRgb.getdata())      # xsize*ysize list of color 3-tuples
-    #end if
-
-    pxlctr = 0
-    colctr = 0
-    for yord in xrange (ysize):
-        for xord in xrange (xsize):
-            pxlcolor = list(datalist [yord*xsize + xord])     # org image color tuple
-
-            if pxlcolor in listPalette:
-                index = listPalette.index(list(pxlcolor))
-            else: index=0
-            #paletteindex = colorsAndIndices [index] [1]     # a simple lookup
-
-            imgP.putpixel ((xord, yord), index)
+    indices = _paletteIndices(_imageArray(imgRgb)[:,:,:3], palette)
+    imgP = Image.fromstring('P', size, indices.tostring())
+    imgP.putpalette (palette)               # Install the palette
 
     if hasalpha:
         indexleastused, leastcount = Getalphaindex (imgP, maskinv)
@@ -241,6 +266,28 @@ def rgb2palette (imgRgb, palette=None, verbose=False):     # image could be a "R
 
 #end def Rgb2p
 
+def _paletteIndices(pixels, palette, chunkSize=4096):
+    """The index of the palette entry for each pixel of an array
+    [height, width, 3] of uint8, as an array [height, width] of uint8. Colors
+    that aren't in the palette get the nearest entry (in RGB space).
+    """
+    palette = numpy.asarray(palette, int).reshape([-1,3])[:256]
+    colors, inverse = numpy.unique(_packColors(pixels), return_inverse=True)
+    #colors that are in the palette (use the first entry if there are repeats)
+    paletteColors, firstEntry = numpy.unique(_packColors(palette), return_index=True)
+    pos = numpy.searchsorted(paletteColors, colors).clip(0, len(paletteColors)-1)
+    found = paletteColors[pos]==colors
+    indices = numpy.zeros(len(colors), numpy.uint8)
+    indices[found] = firstEntry[pos[found]]
+    #the nearest palette entry for the rest (in chunks to limit the memory used)
+    missing = numpy.flatnonzero(~found)
+    for start in range(0, len(missing), chunkSize):
+        chunk = missing[start:start+chunkSize]
+        rgb = _unpackColors(colors[chunk])
+        dist = ((rgb[:,numpy.newaxis,:]-palette[numpy.newaxis,:,:])**2).sum(axis=2)
+        indices[chunk] = dist.argmin(axis=1)
+    return indices[inverse].reshape(pixels.shape[:2])
+
 def makeMPEG(filename, images, codec='mpeg1video', codecParams = None, verbose=False):
     if not havePyMedia:
         logging.error('pymedia (www.pymedia.org) needed to make mpeg movies')
@@ -249,6 +296,15 @@ def makeMPEG(filename, images, codec='mpeg1video', codecParams = None, verbose=F
     fw= open( filename, 'wb' )
     t= time.time()
 
+    encoder = _makeMPEGEncoder(images[0].size, codec=codec, codecParams=codecParams)
+    for im in images:
+        _writeMPEGFrame(fw, encoder, im)
+    else:
+        logging.info('%d frames written in %.2f secs' % ( len(images), time.time()- t))
+        i= 0
+    fw.close()
+
+def _makeMPEGEncoder(size, codec='mpeg1video', codecParams=None):
     #set bitrate
     if codec== 'mpeg1video':
         bitrate= 2700000
@@ -262,30 +318,181 @@ def makeMPEG(filename, images, codec='mpeg1video', codecParams = None, verbose=F
             'gop_size': 12,
             'frame_rate_base': 125,
             'max_b_frames': 0,
-            'width': images[0].size[0],
-            'height': images[0].size[1],
+            'width': size[0],
+            'height': size[1],
             'frame_rate': 3125,
             'deinterlace': 0,
             'bitrate': bitrate,
             'id': vcodec.getCodecID( codec )
             }
         logging.info('Setting codec to ' + str(codecParams))
-    encoder= vcodec.Encoder( codecParams )
+    return vcodec.Encoder( codecParams )
+
+def _writeMPEGFrame(fw, encoder, im):
+    # Create VFrame
+    imStr = im.tostring()
+    bmpFrame= vcodec.VFrame( vcodec.formats.PIX_FMT_RGB24, im.size, (imStr,None,None))
+    yuvFrame= bmpFrame.convert( vcodec.formats.PIX_FMT_YUV420P, im.size )
+    d = encoder.encode( yuvFrame )
+    try:
+        fw.write( d.data )#this is what works!
+    except:
+        fw.write( d )#this is what pymedia demo recommends
+
+class MovieWriter(object):
+    """Writes frames (numpy arrays) to a movie or a series of image files
+    in a background thread, as they are added, so that long recordings
+    don't have to be kept in memory. Usually created for you by
+    `win.startMovieRecording()` (see :class:`psychopy.visual.Window`).
+
+    Each frame is copied into one of a fixed pool of `queueSize` buffers,
+    which the writing thread hands back once the frame is written. If the
+    writer falls behind and no buffer is free, addFrame() waits at most
+    `maxWait` secs and then drops the frame (and counts it in `nDropped`)
+    rather than holding up the drawing.
+
+    The file type is set by the extension of `fileName`:
+
+        - an image type understood by PIL (png, tif, jpg, bmp...) writes
+          fileName00001.png etc. (5 digits)
+        - .mpg/.mpeg writes an mpeg movie (requires pymedia)
+        - .mov writes a Quicktime movie (OS X only, see :class:`QuicktimeMovie`;
+          the movie itself is saved by close())
+        - .gif writes an animated GIF, with a palette for each frame (see
+          :class:`AnimatedGIFWriter`)
+    """
+    def __init__(self, fileName, size, fps=30, mpgCodec='mpeg1video',
+            queueSize=60, maxWait=0.002):
+        """
+        :Parameters:
 
-    for im in images:
-        # Create VFrame
-        imStr = im.tostring()
-        bmpFrame= vcodec.VFrame( vcodec.formats.PIX_FMT_RGB24, im.size, (imStr,None,None))
-        yuvFrame= bmpFrame.convert( vcodec.formats.PIX_FMT_YUV420P, im.size )
-        d = encoder.encode( yuvFrame )
+            size: (width, height) of the frames in pixels
+            fps: frames per second (Quicktime movies only)
+            queueSize: the number of frames that can be waiting to be written
+            maxWait: the longest (in secs) that addFrame() waits for a free
+                buffer before dropping the frame
+        """
+        self.fileName = fileName
+        self.size = int(size[0]), int(size[1])
+        self.maxWait = maxWait
+        fileRoot, self._fileExt = os.path.splitext(fileName)
+        ext = self._fileExt.lower()
+        self._mpegFile = self._qtMovie = self._gifWriter = None
+        if ext=='.gif':
+            self._gifWriter = AnimatedGIFWriter(fileName)
+        elif ext in ['.mpg', '.mpeg']:
+            if not havePyMedia:
+                raise ImportError('pymedia (www.pymedia.org) needed to make mpeg movies')
+            self._mpegEncoder = _makeMPEGEncoder(self.size, codec=mpgCodec)
+            self._mpegFile = open(fileName, 'wb')
+        elif ext=='.mov':
+            self._qtMovie = QuicktimeMovie(fileName, fps=fps)
+        else:
+            self._frameNameFormat = fileRoot+'%05d'+self._fileExt
+        #statistics
+        self.nAdded = 0#frames given to addFrame (including dropped ones)
+        self.nWritten = 0
+        self.nDropped = 0
+        self.maxQueued = 0#the most frames that were waiting at once
+        self.totalWait = 0.0#time spent in addFrame waiting for a free buffer
+        self.longestWait = 0.0
+        self._error = None
+        #the buffers, and queues of indices into them
+        self._buffers = numpy.zeros([queueSize, self.size[1], self.size[0], 3], numpy.uint8)
+        self._free = Queue.Queue()
+        for index in range(queueSize):
+            self._free.put(index)
+        self._toWrite = Queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='MovieWriter')
+        self._thread.daemon = True
+        self._thread.start()
+    def addFrame(self, frame, *args):
+        """Add a frame, an array [height, width, 3] of uint8 (top row first),
+        as from `win.getFrameArray()`. Returns False if the frame had to be
+        dropped (extra args are ignored, so this can be used as the callback
+        of `win.startFrameCapture()`)
+        """
+        if args:#called as callback(frameN, frame)
+            frame = args[0]
+        if self._error is not None:
+            raise self._error
+        self.nAdded += 1
         try:
-            fw.write( d.data )#this is what works!
-        except:
-            fw.write( d )#this is what pymedia demo recommends
-    else:
-        logging.info('%d frames written in %.2f secs' % ( len(images), time.time()- t))
-        i= 0
-    fw.close()
+            index = self._free.get_nowait()
+        except Queue.Empty:
+            t0 = time.time()
+            try:
+                if self.maxWait>0:
+                    index = self._free.get(timeout=self.maxWait)
+                else:
+                    index = None
+            except Queue.Empty:
+                index = None
+            wait = time.time()-t0
+            self.totalWait += wait
+            if wait>self.longestWait:
+                self.longestWait = wait
+            if index is None:
+                self.nDropped += 1
+                return False
+        self._buffers[index] = frame
+        self._toWrite.put(index)
+        nQueued = self._toWrite.qsize()
+        if nQueued>self.maxQueued:
+            self.maxQueued = nQueued
+        return True
+    def _run(self):
+        nFrame = 0
+        while True:
+            index = self._toWrite.get()
+            if index is None:
+                break
+            if self._error is None:
+                try:
+                    nFrame += 1
+                    self._writeFrame(self._buffers[index], nFrame)
+                    self.nWritten += 1
+                except Exception, err:
+                    logging.error('MovieWriter failed to write %s: %s' %(self.fileName, err))
+                    self._error = err
+            self._free.put(index)
+    def _writeFrame(self, frame, nFrame):
+        if self._gifWriter is not None:
+            self._gifWriter.addFrame(frame)
+            return
+        im = Image.fromarray(frame)
+        if self._mpegFile is not None:
+            _writeMPEGFrame(self._mpegFile, self._mpegEncoder, im)
+        elif self._qtMovie is not None:
+            self._qtMovie.addFrame(im)
+        else:
+            im.save(self._frameNameFormat %nFrame)
+    def getStats(self):
+        """Returns a dict of the frames added, written and dropped, the most
+        frames that were queued at once and the total and longest time that
+        addFrame() spent waiting for a free buffer (in secs)
+        """
+        return {'nAdded':self.nAdded, 'nWritten':self.nWritten,
+            'nDropped':self.nDropped, 'maxQueued':self.maxQueued,
+            'totalWait':self.totalWait, 'longestWait':self.longestWait}
+    def close(self):
+        """Waits for the remaining frames to be written and closes the file
+        """
+        if self._thread is None:
+            return
+        self._toWrite.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._mpegFile is not None:
+            self._mpegFile.close()
+        elif self._gifWriter is not None:
+            self._gifWriter.close()
+        elif self._qtMovie is not None and self._error is None:
+            self._qtMovie.save()
+        logging.info('MovieWriter wrote %i frames to %s (%i dropped)'
+            %(self.nWritten, self.fileName, self.nDropped))
+        if self._error is not None:
+            raise self._error
 
 
 qtCodecQuality= {
@@ -10,7 +10,9 @@ from psychopy import logging
 import monitors
 
 import os, shutil, glob
-import Image, cPickle
+import cPickle
+from psychopy.lazyImport import LazyModule
+Image = LazyModule('Image')
 #from random import shuffle #this is core python dist
 
 def toFile(filename, data):
@@ -316,78 +318,173 @@ def cart2sph(z, y, x):
 
 
 #---unit conversions
+class UnitConverter(object):
+    """Converts sizes and positions between the units of a
+    :class:`~psychopy.monitors.Monitor` ('deg', 'cm' and 'pix').
+
+    The scale factors are computed from the monitor's width, size in pixels and
+    distance once and then cached. They are recomputed automatically if the
+    monitor calibration changes (e.g. after `setWidth()`, `setDistance()`,
+    `setSizePix()` or `setCurrent()`).
+
+    :Parameters:
+
+        monitor : a :class:`~psychopy.monitors.Monitor`
+
+        correctFlat : True or **False**
+            By default degrees are converted linearly (the small-angle
+            approximation used throughout PsychoPy). If True the conversion
+            accounts for the screen being flat: each value is treated as an
+            eccentricity from the centre of the screen, so that
+            cm = distance*tan(degrees). This is exact for positions but only
+            approximate for sizes of stimuli away from the centre.
+
+    Every conversion method accepts scalars or numpy arrays and takes an
+    optional `out` array (as for numpy ufuncs) so that arrays can be converted
+    in place, e.g. ``conv.deg2pix(xys, out=xys)``.
+
+    A Window keeps one of these for its monitor (see
+    :meth:`~psychopy.visual.Window.getUnitConverter`) and the functions
+    :func:`deg2pix`, :func:`pix2deg` etc. use one per monitor.
+    """
+    def __init__(self, monitor, correctFlat=False):
+        self.monitor=monitor
+        self.correctFlat=correctFlat
+        self._calib=None#the calib dict the cached values came from
+        self._calibVersion=None
+    def _update(self):
+        """Fetch the scale factors from the monitor if its calibration has changed"""
+        monitor=self.monitor
+        calib = getattr(monitor, 'currentCalib', None)
+        version = getattr(monitor, '_calibVersion', None)
+        if calib is not None and calib is self._calib and version==self._calibVersion:
+            return
+        if not isinstance(monitor, monitors.Monitor):
+            raise ValueError("UnitConverter requires a monitors.Monitor object but received %s" %str(type(monitor)))
+        scrWidthCm = monitor.getWidth()
+        scrSizePix = monitor.getSizePix()
+        dist = monitor.getDistance()
+        if scrWidthCm==None or scrSizePix==None:
+            self._cmPerPix=None
+        else:
+            self._cmPerPix=float(scrWidthCm)/scrSizePix[0]
+        self._dist=dist
+        if dist==None:
+            self._cmPerDeg=None
+        else:
+            self._cmPerDeg=dist*0.017455
+        self._calib=calib
+        self._calibVersion=version
+    def _getCmPerPix(self):
+        self._update()
+        if self._cmPerPix==None:
+            if self.monitor.getSizePix()==None:
+                raise ValueError("Monitor %s has no known size in pixels (SEE MONITOR CENTER)" %self.monitor.name)
+            raise ValueError("Monitor %s has no known width in cm (SEE MONITOR CENTER)" %self.monitor.name)
+        return self._cmPerPix
+    def _getDist(self):
+        self._update()
+        if self._dist==None:
+            raise ValueError("Monitor %s has no known distance (SEE MONITOR CENTER)" %self.monitor.name)
+        return self._dist
+    def _degFactor(self):
+        """Returns the cm per deg, or None if the conversion is non-linear"""
+        self._getDist()#check we have one
+        if self.correctFlat:
+            return None
+        return self._cmPerDeg
+    def deg2cm(self, degrees, out=None):
+        """Convert degrees to cm"""
+        cmPerDeg = self._degFactor()
+        if cmPerDeg==None:
+            cm = numpy.tan(numpy.radians(degrees, out=out), out=out)
+            return numpy.multiply(cm, self._dist, out=out)
+        return _scale(degrees, cmPerDeg, out)
+    def cm2deg(self, cm, out=None):
+        """Convert cm to degrees"""
+        cmPerDeg = self._degFactor()
+        if cmPerDeg==None:
+            rad = numpy.arctan(numpy.divide(cm, self._dist, out=out), out=out)
+            return numpy.degrees(rad, out=out)
+        return _scale(cm, 1.0/cmPerDeg, out)
+    def pix2cm(self, pixels, out=None):
+        """Convert pixels to cm"""
+        return _scale(pixels, self._getCmPerPix(), out)
+    def cm2pix(self, cm, out=None):
+        """Convert cm to pixels"""
+        return _scale(cm, 1.0/self._getCmPerPix(), out)
+    def deg2pix(self, degrees, out=None):
+        """Convert degrees to pixels"""
+        cmPerPix = self._getCmPerPix()
+        cmPerDeg = self._degFactor()
+        if cmPerDeg==None:
+            return numpy.divide(self.deg2cm(degrees, out), cmPerPix, out=out)
+        return _scale(degrees, cmPerDeg/cmPerPix, out)
+    def pix2deg(self, pixels, out=None):
+        """Convert pixels to degrees"""
+        cmPerPix = self._getCmPerPix()
+        cmPerDeg = self._degFactor()
+        if cmPerDeg==None:
+            return self.cm2deg(self.pix2cm(pixels, out), out)
+        return _scale(pixels, cmPerPix/cmPerDeg, out)
+    def toPix(self, values, units, out=None):
+        """Convert values in the given units to pixels. Values in 'norm',
+        'height' and 'pix' units are returned unchanged (these are handled by
+        the Window's projection rather than the monitor).
+
+        If `out` is the array that was returned by the previous call for the
+        same stimulus it will be reused when possible, so typical usage is::
+
+            self._xysRendered = conv.toPix(self.xys, self.units, out=self._xysRendered)
+
+        (a new array is created if `out` is None, is `values` itself, or its
+        shape doesn't match).
+        """
+        if units in ['norm', 'pix', 'height']:
+            return values
+        if not (isinstance(out, numpy.ndarray) and isinstance(values, numpy.ndarray)) \
+                or out is values or out.shape!=values.shape or out.dtype.kind!='f':
+            out=None
+        if units in ['deg', 'degs']:
+            return self.deg2pix(values, out)
+        elif units=='cm':
+            return self.cm2pix(values, out)
+        else:
+            raise ValueError("Unknown units: %s" %units)
+
+def _scale(values, factor, out=None):
+    """Multiply values by a scalar factor, optionally in place"""
+    if out is None:
+        return values*factor
+    return numpy.multiply(values, factor, out=out)
+
+def _getConverter(monitor, funcName):
+    """Returns the (linear) UnitConverter cached on a monitor"""
+    conv = getattr(monitor, '_unitConverter', None)
+    if conv is None:
+        if not isinstance(monitor, monitors.Monitor):
+            raise ValueError("%s requires a monitors.Monitor object as the second argument but received %s" %(funcName, str(type(monitor))))
+        conv = monitor._unitConverter = UnitConverter(monitor)
+    return conv
+
 def pix2deg(pixels, monitor):
     """Convert size in pixels to size in degrees for a given Monitor object"""
-    #get monitor params and raise error if necess
-    scrWidthCm = monitor.getWidth()
-    scrSizePix = monitor.getSizePix()
-    if scrSizePix==None:
-        raise ValueError("Monitor %s has no known size in pixels (SEE MONITOR CENTER)" %monitor.name)
-    if scrWidthCm==None:
-        raise ValueError("Monitor %s has no known width in cm (SEE MONITOR CENTER)" %monitor.name)
-    cmSize=pixels*float(scrWidthCm)/scrSizePix[0]
-    return cm2deg(cmSize, monitor)
+    return _getConverter(monitor, 'pix2deg').pix2deg(pixels)
 def deg2pix(degrees, monitor):
     """Convert size in degrees to size in pixels for a given Monitor object"""
-    #get monitor params and raise error if necess
-    scrWidthCm = monitor.getWidth()
-    scrSizePix = monitor.getSizePix()
-    if scrSizePix==None:
-        raise ValueError("Monitor %s has no known size in pixels (SEE MONITOR CENTER)" %monitor.name)
-    if scrWidthCm==None:
-        raise ValueError("Monitor %s has no known width in cm (SEE MONITOR CENTER)" %monitor.name)
-
-    cmSize = deg2cm(degrees, monitor)
-    return cmSize*scrSizePix[0]/float(scrWidthCm)
+    return _getConverter(monitor, 'deg2pix').deg2pix(degrees)
 def deg2cm(degrees, monitor):
     """Convert size in degrees to size in pixels for a given Monitor object"""
-    #check we have a monitor
-    if not isinstance(monitor, monitors.Monitor):
-        raise ValueError("deg2cm requires a monitors.Monitor object as the second argument but received %s" %str(type(monitor)))
-    #get monitor dimensions
-    dist = monitor.getDistance()
-    #check they all exist
-    if dist==None:
-        raise ValueError("Monitor %s has no known distance (SEE MONITOR CENTER)" %monitor.name)
-    return degrees*dist*0.017455
+    return _getConverter(monitor, 'deg2cm').deg2cm(degrees)
 def cm2deg(cm, monitor):
     """Convert size in cm to size in degrees for a given Monitor object"""
-    #check we have a monitor
-    if not isinstance(monitor, monitors.Monitor):
-        raise ValueError("cm2deg requires a monitors.Monitor object as the second argument but received %s" %str(type(monitor)))
-    #get monitor dimensions
-    dist = monitor.getDistance()
-    #check they all exist
-    if dist==None:
-        raise ValueError("Monitor %s has no known distance (SEE MONITOR CENTER)" %monitor.name)
-    return cm/(dist*0.017455)
+    return _getConverter(monitor, 'cm2deg').cm2deg(cm)
 def pix2cm(pixels, monitor):
     """Convert size in pixels to size in cm for a given Monitor object"""
-    #check we have a monitor
-    if not isinstance(monitor, monitors.Monitor):
-        raise ValueError("cm2pix requires a monitors.Monitor object as the second argument but received %s" %str(type(monitor)))
-    #get monitor params and raise error if necess
-    scrWidthCm = monitor.getWidth()
-    scrSizePix = monitor.getSizePix()
-    if scrSizePix==None:
-        raise ValueError("Monitor %s has no known size in pixels (SEE MONITOR CENTER)" %monitor.name)
-    if scrWidthCm==None:
-        raise ValueError("Monitor %s has no known width in cm (SEE MONITOR CENTER)" %monitor.name)
-    return pixels*float(scrWidthCm)/scrSizePix[0]
+    return _getConverter(monitor, 'pix2cm').pix2cm(pixels)
 def cm2pix(cm, monitor):
     """Convert size in degrees to size in pixels for a given Monitor object"""
-    #check we have a monitor
-    if not isinstance(monitor, monitors.Monitor):
-        raise ValueError("cm2pix requires a monitors.Monitor object as the second argument but received %s" %str(type(monitor)))
-    #get monitor params and raise error if necess
-    scrWidthCm = monitor.getWidth()
-    scrSizePix = monitor.getSizePix()
-    if scrSizePix==None:
-        raise ValueError("Monitor %s has no known size in pixels (SEE MONITOR CENTER)" %monitor.name)
-    if scrWidthCm==None:
-        raise ValueError("Monitor %s has no known width in cm (SEE MONITOR CENTER)" %monitor.name)
-
-    return cm*scrSizePix[0]/float(scrWidthCm)
+    return _getConverter(monitor, 'cm2pix').cm2pix(cm)
 
 #---color conversions---#000000#FFFFFF------------------------------------------
 
@@ -17,8 +17,9 @@ import string, os, time, glob, cPickle, sys
 from copy import deepcopy, copy
 
 import numpy
-import scipy.optimize as optim
-from scipy import interpolate
+from psychopy.lazyImport import LazyModule
+optim = LazyModule('scipy.optimize')#these are slow to import and rarely needed
+interpolate = LazyModule('scipy.interpolate')
 
 DEBUG= False
 
@@ -163,6 +164,7 @@ class Monitor:
         self.calibNames = []
         self._gammaInterpolator=None
         self._gammaInterpolator2=None
+        self._calibVersion=0#incremented when size/distance changes (see misc.UnitConverter)
         self._loadAll()
         if len(self.calibNames)>0:
             self.setCurrent(-1) #will fetch previous vals if monitor exists
@@ -194,12 +196,15 @@ class Monitor:
 #functions to set params of current calibration
     def setSizePix(self, pixels):
         self.currentCalib['sizePix']=pixels
+        self._calibVersion+=1
     def setWidth(self, width):
         """Of the viewable screen (cm)"""
         self.currentCalib['width']=width
+        self._calibVersion+=1
     def setDistance(self, distance):
         """To the screen (cm)"""
         self.currentCalib['distance']=distance
+        self._calibVersion+=1
     def setCalibDate(self, date=None):
         """Sets the calibration to a given date/time or to the current
         date/time if none given. (Also returns the date as set)"""
@@ -452,6 +457,7 @@ class Monitor:
             return False
 
         self.currentCalib = self.calibs[self.currentCalibName]      #do the import
+        self._calibVersion+=1
         logging.info("Loaded calibration from:%s" %self.currentCalibName)
 
         return self.currentCalibName
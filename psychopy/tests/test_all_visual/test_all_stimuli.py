@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-import sys, os, copy
+import sys, os, copy, shutil, tempfile
 from psychopy import visual, misc, monitors, filters, preferences
 from psychopy.tests import utils
 import numpy
@@ -108,6 +108,23 @@ class _baseVisualTest:
         #compare with a LIBERAL criterion (fonts do differ)
         utils.compareScreenshot('text2_%s.png' %(self.contextName), win, crit=20)
 
+    def test_text_rsvp(self):
+        win = self.win
+        if win.winType!='pyglet':
+            pytest.skip("glyph layouts are only used with pyglet fonts")
+        stim = visual.TextStim(win, text='first', height=0.2*self.scaleFactor)
+        stim.draw()
+        firstLayout = stim._textLayout
+        for word in ['second', 'third', 'first']:
+            stim.setText(word)
+            stim.draw()
+            win.flip()
+        assert stim._textLayout is firstLayout #recent texts aren't laid out again
+        assert stim.width==stim._wrapWidthPix and stim.height>0
+        stim.setText('')
+        stim.draw()
+        assert stim.height==0
+
     def test_mov(self):
         win = self.win
         if self.win.winType=='pygame':
@@ -141,6 +158,30 @@ class _baseVisualTest:
         shape.setOpacity(0.8)
         shape.draw()
         utils.compareScreenshot('shape2_%s.png' %(self.contextName), win, crit=12.0)
+    def test_grating_set_phase(self):
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("phase and sf are only uniforms with shaders")
+        def makeGratings(phase, sf):
+            drifting = visual.GratingStim(win, pos=[-0.5*self.scaleFactor, 0],
+                size=0.8*self.scaleFactor, sf=sf/self.scaleFactor, phase=phase)
+            other = visual.GratingStim(win, pos=[0.5*self.scaleFactor, 0],
+                size=0.8*self.scaleFactor, sf=2.0/self.scaleFactor, phase=0.6, mask='gauss')
+            return drifting, other
+        drifting, other = makeGratings(0.0, 3.0)
+        drifting.draw()
+        drifting.setPhase(0.25)
+        drifting.setSF(4.0/self.scaleFactor)
+        assert not drifting.needUpdate #the display list isn't rebuilt
+        win.flip()
+        drifting.draw()
+        other.draw()
+        changed = win.getFrameArray(buffer='back')
+        win.flip()
+        for stim in makeGratings(0.25, 4.0):
+            stim.draw()
+        assert numpy.all(win.getFrameArray(buffer='back')==changed)
+        win.flip()
     def test_radial(self):
         win = self.win
         #using init
@@ -166,6 +207,24 @@ class _baseVisualTest:
         image = visual.SimpleImageStim(win, image=fileName, flipHoriz=True, flipVert=True)
         image.draw()
         utils.compareScreenshot('simpleimage1_%s.png' %(self.contextName), win, crit=5.0) # Should be exact replication
+    def test_image_preload(self):
+        win = self.win
+        fileName = os.path.join(utils.TESTS_DATA_PATH, 'testimage.jpg')
+        image = visual.ImageStim(win, image=None)
+        image.preloadImages([fileName])
+        cache = win.getImageCache()
+        assert cache.wait(timeout=10)
+        image.preloadImages([fileName], upload=True)
+        image.setImage(fileName)
+        assert cache.nHits>=1
+        image.draw()
+        if win._haveShaders:#the texture was made by preloadImages()
+            other = visual.ImageStim(win, image=fileName)
+            assert other.texID.value==image.texID.value
+        simple = visual.SimpleImageStim(win, image=fileName)
+        simple.preloadImages([fileName])
+        simple.setImage(fileName)
+        simple.draw()
     def test_dots(self):
         #NB we can't use screenshots here - just check that no errors are raised
         win = self.win
@@ -197,6 +256,21 @@ class _baseVisualTest:
             "dots._signalDots failed to change after dots.setCoherence()"
         assert not numpy.alltrue(prevPosRend==dots._fieldPosRendered), \
             "dots._fieldPosRendered failed to change after dots.setPos()"
+    def test_dots_modes(self):
+        #all combinations of signal/noise should keep dots inside the field
+        win = self.win
+        fieldSize = 1*self.scaleFactor
+        for signalDots in ['same','different']:
+            for noiseDots in ['direction','position','walk']:
+                dots =visual.DotStim(win, nDots=200, fieldShape='circle', fieldSize=fieldSize,
+                    dotLife=5, signalDots=signalDots, noiseDots=noiseDots,
+                    speed=0.05*self.scaleFactor, coherence=0.5)
+                for frameN in range(10):
+                    dots.draw()
+                radii = numpy.hypot(dots._dotsXY[:,0], dots._dotsXY[:,1])
+                assert radii.max() <= fieldSize/2.0
+                assert numpy.allclose(dots._dotsVel[:,0], numpy.cos(dots._dotsDir))
+                win.flip()
     def test_element_array(self):
         win = self.win
         if not win._haveShaders:
@@ -214,6 +288,42 @@ class _baseVisualTest:
         spiral.draw()
         utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win)
         win.flip()
+    def test_shader_registry(self):
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("shaders aren't available")
+        prog = win.registerShader('testTint', visual._shaders.vertSimple, """
+            uniform vec4 tint;
+            void main() {
+                gl_FragColor = tint;
+            }
+            """)
+        assert not prog.isCompiled() #only compiled when first used
+        assert win.getShader('testTint') is prog
+        assert prog.handle>0 and prog.isCompiled()
+        assert 'tint' in prog.uniforms
+        #the built-in programs
+        maskProg = win.getShader('signedTexMask')
+        assert win._progSignedTexMask==maskProg.handle
+        assert set(['texture', 'mask']).issubset(maskProg.uniforms)
+    def test_element_array_vbo(self):
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("ElementArray requires shaders, which aren't available")
+        #same as test_element_array but from vertex buffer objects
+        thetas = numpy.arange(0,360,10)
+        N=len(thetas)
+        radii = numpy.linspace(0,1.0,N)*self.scaleFactor
+        x, y = misc.pol2cart(theta=thetas, radius=radii)
+        xys = numpy.array([x,y]).transpose()
+        spiral = visual.ElementArrayStim(win, nElements=N,sizes=0.5*self.scaleFactor,
+            sfs=3.0, xys=xys, oris=0, useVBO=True)
+        spiral.draw()
+        win.flip()
+        spiral.setOris(thetas)#only the vertices need uploading again
+        spiral.draw()
+        utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win)
+        win.flip()
     def test_aperture(self):
         win = self.win
         if not win.allowStencil:
@@ -246,6 +356,122 @@ class _baseVisualTest:
         assert (1000/150.0 < msPFavg < 1000/40.0), \
             "Your frame period is %.1fms which suggests you aren't syncing to the frame" %msPFavg
 
+    def test_shared_textures(self):
+        win = self.win
+        gabors = [visual.GratingStim(win, tex='sin', mask='gauss') for n in range(3)]
+        if not win._haveShaders:
+            assert gabors[0].texID.value!=gabors[1].texID.value
+            return
+        #identical textures come from the window's cache
+        assert gabors[0].texID.value==gabors[1].texID.value==gabors[2].texID.value
+        assert gabors[0].maskID.value==gabors[2].maskID.value
+        gabors[1].setTex('sqr')
+        assert gabors[1].texID.value!=gabors[0].texID.value
+        gabors[0].clearTextures()
+        gabors[2].draw()#still has its texture
+        gabors[2].clearTextures()
+        gabors[1].clearTextures()
+        assert gabors[2].texID.value==0
+
+    def test_frame_timing(self):
+        win = self.win
+        stim = visual.ShapeStim(win, name='shape')
+        stim.setAutoDraw(True)
+        win.setRecordFrameTiming(True, bufferSize=20)
+        for frameN in range(30):
+            win.flip()
+        win.setRecordFrameTiming(False)
+        stim.setAutoDraw(False)
+        timing = win.frameTiming
+        assert timing.nFrames==30
+        assert len(timing.getFlipTimes())==20
+        assert numpy.all(timing.getIntervals()>0)
+        assert timing.getStimTimes()['shape']['n']==30
+        assert timing.getPhaseTimes('swap').shape==(20,)
+        summary = timing.summary()
+        assert summary['interval50']<=summary['interval99']
+
+    def test_batch_draw(self):
+        win = self.win
+        shapes = [visual.Circle(win, radius=0.1*self.scaleFactor, edges=16,
+                        pos=numpy.array([x,0.3])*self.scaleFactor, ori=20*x,
+                        fillColor='red', lineColor=None, interpolate=False)
+                  for x in [-0.6, -0.2, 0.2, 0.6]]
+        #a fill with an outline is drawn on its own, in order
+        shapes.append(visual.Circle(win, radius=0.2*self.scaleFactor, edges=16,
+                        pos=numpy.array([0.4,0.2])*self.scaleFactor,
+                        fillColor='blue', lineColor='white', interpolate=False))
+        shapes.extend([visual.Line(win, start=(-0.5*self.scaleFactor, y*self.scaleFactor),
+                        end=(0.5*self.scaleFactor, y*self.scaleFactor), interpolate=False)
+                       for y in [-0.4, -0.5]])
+        grouped = visual._batchStimuli(win, shapes)
+        assert len(grouped)==3 and len(grouped[0].stimuli)==4
+        assert grouped[1] is shapes[4] and len(grouped[2].stimuli)==2
+        def compare():
+            for shape in shapes:
+                shape.draw()
+            separate = numpy.asarray(win._getFrame(buffer='back'))
+            win.flip()
+            for thisStim in grouped:
+                thisStim.draw()
+            batched = numpy.asarray(win._getFrame(buffer='back'))
+            win.flip()
+            assert numpy.mean(separate!=batched)<0.01
+        compare()
+        assert grouped[0]._xy.dtype==numpy.float32
+        #only changed shapes are updated, in the same arrays
+        xy = grouped[0]._xy
+        shapes[1].setPos([0,-0.1*self.scaleFactor], '+')
+        shapes[2].setFillColor('green')
+        compare()
+        assert grouped[0]._xy is xy
+        #and from the autoDraw list, keeping the batches between flips
+        for shape in shapes:
+            shape.setAutoDraw(True)
+        win.setBatchDraw(True)
+        win.flip()
+        batches = win._batchedToDraw[1]
+        win.flip()
+        assert win._batchedToDraw[1] is batches
+        shapes[0].setLineColor('white')#can't be batched now
+        win.flip()
+        assert shapes[0] in win._getBatchedToDraw()
+        win.setBatchDraw(False)
+        for shape in shapes:
+            shape.setAutoDraw(False)
+        win.flip()
+    def test_frame_capture(self):
+        win = self.win
+        w, h = win.size
+        stim = visual.ShapeStim(win, units='norm', vertices=[[-2,-2],[-2,0],[2,0],[2,-2]],
+            fillColor='white', lineColor=None)
+        capture = win.startFrameCapture(nFrames=5)
+        for frameN in range(8):
+            if frameN%2: stim.draw()
+            win.flip()
+        assert win.stopFrameCapture() is capture
+        frames = capture.getFrames()
+        assert frames.shape==(5, h, w, 3)
+        #odd frames have the lower half white (first row of the array is the top)
+        assert frames[1,-1].min()==255 and frames[1,0].max()<255
+        assert frames[0,-1].max()<255
+        #the same as reading the frame directly
+        stim.draw()
+        win.flip()
+        assert numpy.all(win.getFrameArray(buffer='front')[-1]==255)
+    def test_movie_recording(self):
+        win = self.win
+        tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-movie')
+        try:
+            win.startMovieRecording(os.path.join(tmpDir, 'frame.png'), maxWait=1.0)
+            for frameN in range(5):
+                win.flip()
+            writer = win.stopMovieRecording()
+            assert writer.nWritten+writer.nDropped==5
+            assert len(os.listdir(tmpDir))==writer.nWritten
+        finally:
+            shutil.rmtree(tmpDir)
+
 #create different subclasses for each context/backend
 class TestPygletNorm(_baseVisualTest):
     @classmethod
@@ -259,6 +485,12 @@ class TestPygletHeight(_baseVisualTest):
         self.win = visual.Window([128,64], winType='pyglet', pos=[50,50], allowStencil=False)
         self.contextName='height'
         self.scaleFactor=1#applied to size/pos values
+class TestPygletOffscreen(_baseVisualTest):
+    @classmethod
+    def setup_class(self):
+        self.win = visual.Window([128,128], winType='pyglet', offscreen=True, allowStencil=True)
+        self.contextName='norm'
+        self.scaleFactor=1#applied to size/pos values
 class TestPygletNormNoShaders(_baseVisualTest):
     @classmethod
     def setup_class(self):
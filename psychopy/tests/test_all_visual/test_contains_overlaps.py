@@ -2,6 +2,7 @@
 from psychopy import visual, monitors, core
 from numpy import sqrt, cos, sin, radians, array
 from numpy.linalg import norm
+import numpy
 
 params = [
     {'units':'pix',   'scaleFactor':500.0},
@@ -96,6 +97,32 @@ def test_contains():
     
 def test_overlaps():
     contains_overlaps('overlaps')
+
+def test_points_in_polygon():
+    square = [(-1,-1),(-1,1),(1,1),(1,-1)]
+    xs = numpy.array([0, 0.9, 1.1, -2, 0])
+    ys = numpy.array([0, -0.9, 0, 0, 0.99])
+    assert list(visual.pointInPolygon(xs, ys, square))==[True, True, False, False, True]
+    assert visual.pointInPolygon(0, 0, square) is True
+
+def test_crossed_swords():
+    sword1 = [(-1,-0.1),(1,-0.1),(1,0.1),(-1,0.1)]
+    sword2 = [(-0.1,-1),(0.1,-1),(0.1,1),(-0.1,1)]
+    assert visual.polygonsOverlap(sword1, sword2)#no vertex inside the other
+    assert not visual.polygonsOverlap(sword1, array(sword2)+(5,0))
+
+def test_stimulus_index():
+    win = visual.Window([256,256], monitor=mon, winType='pyglet', units='pix')
+    rng = numpy.random.RandomState(0)
+    stims = [visual.Circle(win, radius=rng.uniform(5,20), pos=rng.uniform(-100,100,2),
+                           ori=rng.uniform(0,90)) for n in range(100)]
+    index = visual.StimulusIndex(stims)
+    for point in rng.uniform(-110,110,[200,2]):
+        assert index.contains(point)==[stim for stim in stims if stim.contains(point)]
+    stims[0].setPos((200,200))
+    index.update()
+    assert index.contains((200,200))==[stims[0]]
+    win.close()
     
 if __name__=='__main__':
     test_contains_overlaps('contains')
@@ -0,0 +1,55 @@
+from psychopy import visual
+import numpy, Image
+import pytest, shutil, tempfile, os
+
+def _makeImages(tmpDir, n, size=(48,32)):
+    fileNames = []
+    for imageN in range(n):
+        im = numpy.zeros([size[1], size[0], 3], numpy.uint8)
+        im[0,:,0] = 10*imageN#top row
+        fileName = os.path.join(tmpDir, 'image%i.png' %imageN)
+        Image.fromarray(im).save(fileName)
+        fileNames.append(fileName)
+    return fileNames
+
+def test_image_cache_preload():
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-images')
+    cache = visual.ImageCache(nThreads=2)
+    try:
+        fileNames = _makeImages(tmpDir, 4)
+        cache.preload(fileNames, 'pixels')
+        assert cache.wait(timeout=10)
+        assert len(cache)==4
+        imArray, size = cache.decode(fileNames[2], 'pixels')
+        assert cache.nHits==1 and cache.nMisses==0
+        assert size==(48,32) and imArray.shape==(32,48,3)
+        assert numpy.all(imArray==visual._decodeImageFile(fileNames[2], 'pixels')[0])
+        assert abs(imArray[-1,0,0]-20/255.0)<1e-6#flipped, so the top row is last
+        #textures are decoded separately (and resized to a power of two)
+        intensity, wasLum, origSize = cache.decode(fileNames[2], ('RGBA', False))
+        assert cache.nMisses==1
+        assert intensity.shape==(64,64,4) and origSize==(48,32) and not wasLum
+    finally:
+        cache.close()
+        shutil.rmtree(tmpDir)
+
+def test_image_cache_budget():
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-images')
+    imageBytes = 32*48*3*4#float32
+    cache = visual.ImageCache(maxBytes=2*imageBytes, nThreads=1)
+    try:
+        fileNames = _makeImages(tmpDir, 4)
+        cache.preload(fileNames, 'pixels')
+        assert cache.wait(timeout=10)
+        assert len(cache)==2 and cache.nBytes==2*imageBytes
+        cache.decode(fileNames[-1], 'pixels')#kept
+        cache.decode(fileNames[0], 'pixels')#dropped, so decoded again
+        assert cache.nHits==1 and cache.nMisses==1
+        assert len(cache)==2
+        cache.clear()
+        assert len(cache)==0 and cache.nBytes==0
+        with pytest.raises(OSError):
+            cache.decode(os.path.join(tmpDir, 'missing.png'), 'pixels')
+    finally:
+        cache.close()
+        shutil.rmtree(tmpDir)
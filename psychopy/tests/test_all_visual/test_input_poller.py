@@ -0,0 +1,38 @@
+from psychopy import visual, event, core
+import threading
+
+class _Keyboard(object):
+    #an input device of the window, noting which threads poll it
+    def __init__(self):
+        self.threads = set()
+    def _dispatch_events(self):
+        self.threads.add(threading.current_thread())
+        event._onPygletKey(symbol='a', modifiers=None, emulated=True)
+
+def test_input_poller_window():
+    win = visual.Window([64,64], allowGUI=False, waitBlanking=True)
+    keyboard = _Keyboard()
+    win._eventDispatchers.append(keyboard)
+    #note the threads that dispatch the pyglet window's own events
+    winThreads = set()
+    dispatchWindow = win.winHandle.dispatch_events
+    def dispatch_events():
+        winThreads.add(threading.current_thread())
+        dispatchWindow()
+    win.winHandle.dispatch_events = dispatch_events
+    try:
+        event.clearEvents()
+        poller = event.startInputPolling(pollRate=1000, win=win)
+        for frameN in range(10):
+            win.flip()
+        event.getKeys()
+        core.wait(0.05)
+        event.stopInputPolling()
+        assert not poller.running and poller.nPolls>20
+        assert poller.maxInterval<1/60.0#not held up while the flips wait
+        #the device was polled by both threads, the window only by this one
+        assert len(keyboard.threads)==2
+        assert winThreads==set([threading.current_thread()])
+    finally:
+        event.stopInputPolling()
+        win.close()
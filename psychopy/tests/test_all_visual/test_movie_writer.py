@@ -0,0 +1,93 @@
+from psychopy import makeMovies
+import numpy, Image
+import pytest, shutil, tempfile, os
+
+def test_movie_writer_images():
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-movie')
+    try:
+        writer = makeMovies.MovieWriter(os.path.join(tmpDir, 'frame.png'),
+            size=(32,16), queueSize=4, maxWait=1.0)
+        for frameN in range(10):
+            frame = numpy.zeros([16,32,3], numpy.uint8)
+            frame[0,:,0] = frameN#top row
+            assert writer.addFrame(frame)
+        writer.close()
+        stats = writer.getStats()
+        assert stats['nWritten']==10 and stats['nDropped']==0
+        assert stats['maxQueued']<=4
+        im = numpy.asarray(Image.open(os.path.join(tmpDir, 'frame00010.png')))
+        assert im.shape==(16,32,3)
+        assert im[0,0,0]==9 and im[1,0,0]==0
+    finally:
+        shutil.rmtree(tmpDir)
+
+def test_movie_writer_drops():
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-movie')
+    try:
+        writer = makeMovies.MovieWriter(os.path.join(tmpDir, 'frame.png'),
+            size=(64,64), queueSize=1, maxWait=0)
+        frame = numpy.zeros([64,64,3], numpy.uint8)
+        results = [writer.addFrame(frame) for n in range(100)]
+        writer.close()
+        stats = writer.getStats()
+        assert stats['nAdded']==100
+        assert stats['nWritten']+stats['nDropped']==100
+        assert stats['nDropped']==results.count(False)
+        assert len(os.listdir(tmpDir))==stats['nWritten']
+    finally:
+        shutil.rmtree(tmpDir)
+
+def test_movie_writer_gif():
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-movie')
+    try:
+        fileName = os.path.join(tmpDir, 'movie.gif')
+        writer = makeMovies.MovieWriter(fileName, size=(32,32), maxWait=1.0)
+        for frameN in range(5):
+            frame = numpy.zeros([32,32,3], numpy.uint8)
+            frame[:, frameN*4:frameN*4+4] = 255
+            writer.addFrame(frame)
+        writer.close()
+        assert writer.nWritten==5
+        im = Image.open(fileName)
+        for frameN in range(1,5):
+            im.seek(frameN)#has all the frames
+    finally:
+        shutil.rmtree(tmpDir)
+
+def test_gif_local_palettes():
+    #a blank first frame mustn't limit the colors of later ones
+    tmpDir = tempfile.mkdtemp(prefix='psychopy-tests-movie')
+    try:
+        fileName = os.path.join(tmpDir, 'movie.gif')
+        frames = [numpy.zeros([20,30,3], numpy.uint8)+128]
+        for n, rgb in enumerate([(255,0,0), (0,200,30), (10,20,250)]):
+            frame = frames[-1].copy()
+            frame[5:10, n*5:n*5+5] = rgb
+            frames.append(frame)
+        writer = makeMovies.AnimatedGIFWriter(fileName)
+        for frame in frames:
+            writer.addFrame(frame)
+        writer.close()
+        im = Image.open(fileName)
+        for n, frame in enumerate(frames):
+            im.seek(n)
+            x0, y0, x1, y1 = im.tile[0][1]#just the region that changed
+            assert (numpy.asarray(im.convert('RGB'))[y0:y1, x0:x1]==frame[y0:y1, x0:x1]).all()
+    finally:
+        shutil.rmtree(tmpDir)
+
+def test_palette():
+    frames = [Image.fromarray(numpy.array([[[0,0,0],[255,0,0]],[[255,0,0],[0,0,250]]], numpy.uint8))]*2
+    hist = makeMovies.RgbHistogram(frames)
+    assert hist==[(4, (255,0,0)), (2, (0,0,250)), (2, (0,0,0))]
+    palette = makeMovies.makePalette(frames)
+    assert palette[:9]==[255,0,0, 0,0,250, 0,0,0]
+    imgP = makeMovies.rgb2palette(frames[0], palette=palette)
+    assert list(imgP.getdata())==[2,0,0,1]
+    #colors that aren't in the palette get the nearest entry
+    near = Image.fromarray(numpy.array([[[250,10,0],[0,0,240]]], numpy.uint8))
+    assert list(makeMovies.rgb2palette(near, palette=palette).getdata())==[0,1]
+    #too many colors for a palette
+    noise = Image.fromarray((numpy.random.random([32,32,3])*255).astype(numpy.uint8))
+    assert makeMovies.RgbHistogram(noise) is None
+    assert makeMovies.rgb2palette(noise).mode=='P'
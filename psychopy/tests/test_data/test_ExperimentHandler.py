@@ -61,5 +61,37 @@ def test_ExperimentHandler():
         print e
     print 'done'
 
+class TestExperimentHandlerStream:
+    def setup_class(self):
+        self.tmpDir = mkdtemp(prefix='psychopy-tests-testExpStream')
+    def teardown_class(self):
+        shutil.rmtree(self.tmpDir)
+    def test_stream(self):
+        fileName = os.path.join(self.tmpDir, 'testExpStream')
+        exp = data.ExperimentHandler(name='testExp',
+                        extraInfo={'participant':'jwp'},
+                        savePickle=False,
+                        dataFileName=fileName,
+                        streamWideText=True)
+        conds = data.createFactorialTrialList({'faceExpression':['happy','sad'],'presTime':[0.2,0.3]})
+        trials = data.TrialHandler(trialList=conds, nReps=2, name='trials', method='sequential')
+        exp.addLoop(trials)
+        for trialN, trial in enumerate(trials):
+            exp.addData('resp.rt', 0.5)
+            if trialN>=4:#a new column part way through
+                exp.addData('resp.key', 'left')
+            exp.nextEntry()
+            #each entry is already in the file
+            assert len(open(fileName+'.csv').readlines())==trialN+2
+        assert exp.entries==[]
+        assert os.path.exists(fileName+'.csv.header')
+        exp.saveAsWideText(fileName+'.csv')
+        assert not os.path.exists(fileName+'.csv.header')
+        lines = open(fileName+'.csv').readlines()
+        header = lines[0].strip().split(',')
+        assert header[-2:]==['resp.key','']
+        assert len(lines)==9
+        assert lines[-1].strip().endswith('left,')
+
 if __name__=='__main__':
     test_ExperimentHandler()
@@ -5,6 +5,7 @@ import shutil
 from pytest import raises
 from tempfile import mkdtemp
 from numpy.random import random
+import numpy
 
 from psychopy import data, misc
 from psychopy.tests import utils
@@ -106,6 +107,7 @@ class TestTrialHandler:
             conditions.append({'trialType':trialType})
             #create trials
         trials= data.TrialHandler(trialList=conditions, seed=100, nReps=3, method='fullRandom')
+        numpy.random.seed(100)#trials have their own generator, this is for the fake data
         #simulate trials
         for thisTrial in trials:
             resp = 'resp'+str(thisTrial['trialType'])
@@ -126,6 +128,7 @@ class TestTrialHandler:
             conditions.append({'trialType':trialType})
             #create trials
         trials= data.TrialHandler(trialList=conditions, seed=100, nReps=3, method='random')
+        numpy.random.seed(100)#trials have their own generator, this is for the fake data
         #simulate trials
         for thisTrial in trials:
             resp = 'resp'+str(thisTrial['trialType'])
@@ -138,6 +141,67 @@ class TestTrialHandler:
         trials.saveAsWideText(pjoin(self.temp_dir, 'testRandom.csv'), delim=',', appendFile=False)#this omits values
         utils.compareTextFiles(pjoin(self.temp_dir, 'testRandom.csv'), pjoin(fixturesPath,'corrRandom.csv'))
 
+    def test_data_types(self):
+        conditions=[{'trialType':n} for n in range(3)]
+        trials= data.TrialHandler(trialList=conditions, seed=100, nReps=4, method='random')
+        for thisTrial in trials:
+            trials.addData('rt', numpy.float64(0.5))#numpy numbers stay numeric
+            trials.addData('correct', thisTrial['trialType']==1)
+            trials.addData('resp', 'resp'+str(thisTrial['trialType']))
+        assert trials.data.isNumeric['rt'] and trials.data['rt'].dtype!='O'
+        assert trials.data['correct'].dtype==bool
+        assert trials.data['correct'].sum()==4
+        assert not trials.data.isNumeric['resp']
+        #each trial type was run nReps times, in order
+        assert trials.data['ran'].sum()==12
+        assert not numpy.any(trials.data['rt'].mask)
+        assert list(trials.data['order'][0].argsort()) == [0,1,2,3]
+
+    def test_data_extends_reps(self):
+        conditions=[{'trialType':n} for n in range(3)]
+        trials= data.TrialHandler(trialList=conditions, nReps=2, method='sequential')
+        for thisTrial in trials:
+            trials.addData('rt', 0.5)
+        #more reps than expected
+        for repN in range(2,5):
+            trials.data.add('rt', 0.25, position=[0,repN])
+        assert trials.data['rt'].shape==(3,8)#grows by doubling
+        assert trials.data['rt'][0,4]==0.25
+        assert numpy.all(trials.data['rt'].mask[1,2:])
+        assert numpy.all(trials.data['rt'].mask[0,5:])
+        assert trials.data['ran'].shape==(3,8)
+
+    def test_sequence_methods(self):
+        conditions=[{'trialType':n} for n in range(5)]
+        for method in ['random','fullRandom','randomNoRepeat','blocked','latinSquare']:
+            trials= data.TrialHandler(trialList=conditions, seed=10, nReps=12, method=method)
+            seq = trials.sequenceIndices.T.ravel()#presentation order
+            #every condition is presented nReps times
+            assert list(numpy.bincount(seq)) == [12]*5
+            #same seed gives same sequence
+            again= data.TrialHandler(trialList=conditions, seed=10, nReps=12, method=method)
+            assert numpy.all(again.sequenceIndices==trials.sequenceIndices)
+            #getFutureTrial agrees with what next() returns
+            future = [trials.getFutureTrial(n)['trialType'] for n in range(1,61)]
+            assert future == [thisTrial['trialType'] for thisTrial in trials]
+        noRepeat= data.TrialHandler(trialList=conditions, nReps=1000, method='randomNoRepeat')
+        seq = noRepeat.sequenceIndices.T.ravel()
+        assert not numpy.any(seq[1:]==seq[:-1])
+        blocked= data.TrialHandler(trialList=conditions, nReps=3, method='blocked')
+        assert numpy.all(blocked.sequenceIndices.T.ravel().reshape(5,3).ptp(axis=1)==0)
+        latin= data.TrialHandler(trialList=conditions[:4], nReps=4, method='latinSquare')
+        #balanced: each condition follows each other one exactly once within the square
+        pairs = set(zip(latin.sequenceIndices[:-1].T.ravel(), latin.sequenceIndices[1:].T.ravel()))
+        assert len(pairs)==12
+
+    def test_register_sequence_method(self):
+        def reverse(nConds, nReps, randomState):
+            return numpy.tile(numpy.arange(nConds)[::-1], nReps)
+        data.registerSequenceMethod('reverse', reverse)
+        conditions=[{'trialType':n} for n in range(3)]
+        trials= data.TrialHandler(trialList=conditions, nReps=2, method='reverse')
+        assert [thisTrial['trialType'] for thisTrial in trials] == [2,1,0,2,1,0]
+
 class TestMultiStairs:
     def setup_class(self):
         self.temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
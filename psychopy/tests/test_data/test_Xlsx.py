@@ -1,6 +1,7 @@
 """Tests for psychopy.data.DataHandler"""
 import os, shutil
 import numpy
+from pytest import raises
 
 from openpyxl.reader.excel import load_workbook
 from psychopy import data, misc
@@ -52,6 +53,78 @@ def test_TrialTypeImport():
                 print header, trialCSV[header], trialXLSX[header]
             assert trialXLSX[header] == trialCSV[header]
 
+def test_ConditionsTypes():
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    try:
+        fileName = os.path.join(tempDir, 'conds.tsv')
+        f = open(fileName, 'w')
+        f.write('ori\tsf\tname\tshow\txy\tn\n')
+        f.write('0\t1.5\tleft\tTrue\t[1, -0.5]\t1\n')
+        f.write('90\t\t2\tFalse\t(0, "a")\t\n')
+        f.close()
+        conds = data.importConditions(fileName)
+        assert conds[0] == {'ori':0, 'sf':1.5, 'name':u'left', 'show':True,
+                            'xy':[1,-0.5], 'n':1.0}
+        assert type(conds[1]['ori'])==int and type(conds[1]['name'])==unicode
+        assert numpy.isnan(conds[1]['sf']) and numpy.isnan(conds[1]['n'])
+        assert conds[1]['show'] is False
+        assert conds[1]['xy'] == (0, 'a')
+    finally:
+        shutil.rmtree(tempDir)
+
+def test_ConditionsCache():
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    data._ConditionsCache.cacheDir = os.path.join(tempDir, 'cache')
+    try:
+        fileName = os.path.join(tempDir, 'conds.csv')
+        f = open(fileName, 'w')
+        f.write('ori,sf,label\n')
+        for n in range(10000):
+            f.write('%i,%f,cond%i\n' %(n, n/10.0, n))
+        f.close()
+        conds = data.importConditions(fileName)
+        cacheName = data._ConditionsCache(fileName).cacheName
+        assert os.path.isfile(cacheName)
+        assert not os.path.isfile(fileName+'.cache')#not next to the file
+        assert data.importConditions(fileName) == conds
+        #a new time but the same contents: the cache is used and updated
+        os.utime(fileName, (0, 0))
+        assert data.importConditions(fileName) == conds
+        assert data._ConditionsCache(fileName).load()
+        md5s = []
+        cached = data._ConditionsCache(fileName)
+        cached.md5 = lambda: md5s.append(1)
+        assert cached.load() and md5s==[]#not hashed again
+        #a changed file is parsed again
+        f = open(fileName, 'a')
+        f.write('-1,0,new\n')
+        f.close()
+        conds, fieldNames = data.importConditions(fileName, returnFieldNames=True)
+        assert len(conds)==10001 and conds[-1]['label']==u'new'
+        assert fieldNames==['ori','sf','label']
+        #the cache can be turned off
+        os.remove(cacheName)
+        data.importConditions(fileName, useCache=False)
+        assert not os.path.isfile(cacheName)
+    finally:
+        data._ConditionsCache.cacheDir = None
+        shutil.rmtree(tempDir)
+
+def test_ConditionsEmpty():
+    from openpyxl import Workbook
+    tempDir = mkdtemp(prefix='psychopy-tests-testdata')
+    try:
+        for ext in ['csv', 'xlsx']:
+            fileName = os.path.join(tempDir, 'empty.'+ext)
+            if ext=='xlsx':
+                Workbook().save(fileName)
+            else:
+                open(fileName, 'w').close()
+            with raises(ImportError):
+                data.importConditions(fileName)
+    finally:
+        shutil.rmtree(tempDir)
+
 if __name__=='__main__':
     t=TestXLSX()
     t.setup_class()
@@ -0,0 +1,116 @@
+"""Tests for the background serial readers of cedrus.RB730 and forp.ButtonBox,
+with a pseudo-terminal standing in for the device"""
+import os, sys, struct, time
+import pytest
+from psychopy import core, event
+from psychopy.hardware import cedrus, forp
+
+if not hasattr(os, 'openpty'):
+    pytest.skip("needs a pseudo-terminal")
+import tty, termios, fcntl, select, array
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+class _PtyPort(object):
+    #the computer's end of a pseudo-terminal, with the pyserial methods used
+    def __init__(self, fd):
+        self.fd = fd
+        self.timeout = 0
+    def inWaiting(self):
+        n = array.array('i', [0])
+        fcntl.ioctl(self.fd, termios.FIONREAD, n)
+        return n[0]
+    def read(self, size=1):
+        if not select.select([self.fd], [], [], self.timeout or 0)[0]:
+            return ''
+        return os.read(self.fd, size)
+    def writelines(self, message):
+        os.write(self.fd, message)
+    def flushInput(self):
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+    def close(self):
+        os.close(self.fd)
+
+def openPty():
+    """Returns the device's end of a pseudo-terminal and a port for the other"""
+    device, computer = os.openpty()
+    tty.setraw(computer)
+    if serial:
+        port = serial.Serial(os.ttyname(computer), timeout=0)
+        os.close(computer)
+    else:
+        port = _PtyPort(computer)
+    return device, port
+
+def xid(key, down, rt):
+    return 'k'+chr(key<<5 | down<<4)+struct.pack('<i', rt)
+
+def waitFor(condition, timeout=2.0):
+    t0 = time.time()
+    while not condition() and time.time()-t0<timeout:
+        time.sleep(0.001)
+
+def test_decode_xid():
+    data = bytearray('X'+xid(3, 1, 250)+xid(7, 0, 100000)+xid(1, 1, 5)[:4])
+    keys, nUsed = cedrus._decodeXID(data)
+    assert keys==[(3, 'down', 250), (7, 'up', 100000)]
+    assert nUsed==13#the partial packet is kept for later
+    evt = cedrus.RB730.KeyEvent(XID=xid(2, 1, 42))
+    assert (evt.key, evt.direction, evt.rt)==(2, 'down', 42)
+
+def test_rb730():
+    device, port = openPty()
+    rb = cedrus.RB730(port)
+    assert rb.reader.running
+    packets = ''.join([xid(n%7+1, n%2, n*10) for n in range(200)])
+    tWritten = core.getTime()
+    for start in range(0, len(packets), 7):#packets split across reads
+        os.write(device, packets[start:start+7])
+    waitFor(lambda: rb.reader.nEvents==200)
+    keys = rb.getKeyEvents(allowedKeys=range(1,8), downOnly=False)
+    assert [(k.key, k.rt) for k in keys]==[(n%7+1, n*10) for n in range(200)]
+    assert [k.direction for k in keys[:2]]==['up', 'down']
+    assert all([tWritten<=k.time<=core.getTime() for k in keys])
+    assert rb.readMessage()==packets
+    os.write(device, xid(4, 1, 1)+xid(5, 0, 2))
+    waitFor(lambda: rb.reader.nEvents==202)
+    assert [k.key for k in rb.getKeyEvents()]==[4]#downOnly
+    rb.close()
+    os.close(device)
+
+def test_forp():
+    device, port = openPty()
+    box = forp.ButtonBox(serialPort=port, queue=event.InputEventQueue())
+    keys = event.inputEvents.newReader(types=['key'])
+    codes = [0, 1, 1, 3, 1, 0, 16, 0, 8]
+    os.write(device, ''.join(map(chr, codes)))
+    waitFor(lambda: box.reader.nBytes==len(codes))
+    assert box.getEvents(asKeys=True)==set([forp.BUTTON_BLUE, forp.BUTTON_YELLOW,
+                                            forp.BUTTON_TRIGGER, forp.BUTTON_RED])
+    assert box.rawEvts==codes
+    assert box.pressEvents==[1, 2, 5, 4]
+    assert [(k.value, k.source) for k in keys.getEvents()]==[(u'1','fORP'), (u'2','fORP'), (u'5','fORP'), (u'4','fORP')]
+    assert box.buttonStatus[forp.BUTTON_RED] and not box.buttonStatus[forp.BUTTON_BLUE]
+    #red is still held: only reported again with allowRepeats
+    os.write(device, chr(8))
+    waitFor(lambda: box.reader.nBytes==len(codes)+1)
+    assert box.getEvents()==set()
+    os.write(device, chr(8))
+    waitFor(lambda: box.reader.nBytes==len(codes)+2)
+    assert box.getEvents(allowRepeats=True)==set([forp.BUTTON_RED])
+    box.close()
+    os.close(device)
+
+def test_forp_polled():
+    device, port = openPty()
+    box = forp.ButtonBox(serialPort=port, readInBackground=False)
+    assert not box.reader.running
+    os.write(device, chr(0)+chr(2))
+    waitFor(lambda: port.inWaiting()==2)
+    assert box.getEvents()==set([forp.BUTTON_YELLOW])
+    assert box.getEvents(returnRaw=True)==[]
+    box.close()
+    os.close(device)
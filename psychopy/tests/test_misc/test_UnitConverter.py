@@ -0,0 +1,73 @@
+from psychopy import misc, monitors
+import numpy
+
+def _makeMonitor():
+    mon = monitors.Monitor('unitTestMonitor', width=40, distance=57, verbose=False)
+    mon.setSizePix([800,600])
+    return mon
+
+def test_linear():
+    mon = _makeMonitor()
+    conv = misc.UnitConverter(mon)
+    assert numpy.allclose(conv.cm2pix(40.0), 800)
+    assert numpy.allclose(conv.pix2cm(800.0), 40)
+    assert numpy.allclose(conv.deg2cm(1.0), 57*0.017455)
+    assert numpy.allclose(conv.deg2pix(2.0), misc.deg2pix(2.0, mon))
+    xys = numpy.array([[1.0,-2.0],[3.5,0.0]])
+    assert numpy.allclose(conv.pix2deg(conv.deg2pix(xys)), xys)
+    assert numpy.allclose(conv.cm2deg(conv.deg2cm(xys)), xys)
+
+def test_invalidation():
+    mon = _makeMonitor()
+    conv = misc.UnitConverter(mon)
+    assert numpy.allclose(conv.cm2pix(1.0), 20)
+    mon.setWidth(20)
+    assert numpy.allclose(conv.cm2pix(1.0), 40)
+    mon.setSizePix([400,300])
+    assert numpy.allclose(conv.cm2pix(1.0), 20)
+    assert numpy.allclose(misc.cm2pix(1.0, mon), 20)
+    mon.setDistance(114)
+    assert numpy.allclose(conv.deg2cm(1.0), 114*0.017455)
+
+def test_in_place():
+    mon = _makeMonitor()
+    conv = misc.UnitConverter(mon)
+    xys = numpy.random.uniform(-5, 5, [100,2])
+    expected = conv.deg2pix(xys)
+    out = numpy.zeros([100,2])
+    assert conv.deg2pix(xys, out=out) is out
+    assert numpy.allclose(out, expected)
+    #toPix reuses a previous result but never the input itself
+    assert conv.toPix(xys, 'norm') is xys
+    assert conv.toPix(xys, 'deg', out=xys) is not xys
+    assert conv.toPix(xys, 'deg', out=out) is out
+    assert conv.toPix(xys, 'deg', out=numpy.zeros(3)).shape==(100,2)
+
+def test_flat_screen():
+    mon = _makeMonitor()
+    conv = misc.UnitConverter(mon, correctFlat=True)
+    assert numpy.allclose(conv.deg2cm(45.0), 57)
+    assert numpy.allclose(conv.cm2deg(-57.0), -45)
+    xys = numpy.array([[0.0,10.0],[30.0,-20.0]])
+    pix = conv.deg2pix(xys)
+    assert numpy.allclose(pix, 57*numpy.tan(numpy.radians(xys))*20)
+    assert numpy.allclose(conv.pix2deg(pix), xys)
+    #near the centre it agrees with the linear conversion
+    assert abs(conv.deg2pix(0.1)-misc.deg2pix(0.1, mon))<0.01
+
+def test_missing_values():
+    mon = monitors.Monitor('unitTestMonitor2', verbose=False)
+    conv = misc.UnitConverter(mon)
+    for func in [conv.cm2pix, conv.deg2cm, conv.deg2pix]:
+        try:
+            func(1.0)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('%s should fail for an uncalibrated monitor' %func.__name__)
+    try:
+        misc.deg2pix(1.0, 'notAMonitor')
+    except ValueError, err:
+        assert 'deg2pix' in str(err)
+    else:
+        raise AssertionError('deg2pix should need a Monitor')
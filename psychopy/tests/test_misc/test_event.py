@@ -0,0 +1,142 @@
+from psychopy import event, core
+import threading, os, tempfile
+import numpy
+
+def test_readers_are_independent():
+    queue = event.InputEventQueue()
+    keys = queue.newReader(types=['key'])
+    everything = queue.newReader()
+    queue.put('key', 'a', source='test')
+    queue.put('mousePress', 'left')
+    queue.put('key', 'b', time=1.5)
+    assert [evt.value for evt in keys.getEvents()]==['a', 'b']
+    assert keys.getEvents()==[]
+    #the other reader still has them all (in order)
+    events = everything.getEvents()
+    assert [evt.type for evt in events]==['key', 'mousePress', 'key']
+    assert events[0].source=='test' and events[2].time==1.5
+    #a new reader only gets new events
+    late = queue.newReader()
+    assert late.getEvents()==[]
+    assert len(queue._events)==0#nobody needs the old events any more
+
+def test_filtered_reads():
+    queue = event.InputEventQueue()
+    reader = queue.newReader()
+    for key in ['1', 'q', '2', '5', '1', 'space']:
+        queue.put('key', key)
+    #only the requested keys are removed, in the order they arrived
+    assert [evt.value for evt in reader.getEvents('key', ['5','1'])]==['1', '5', '1']
+    assert [evt.value for evt in reader.getEvents('key', ['q'], clear=False)]==['q']
+    assert [evt.value for evt in reader.getEvents('key')]==['q', '2', 'space']
+    queue.put('key', 'x')
+    reader.clear('key')
+    assert reader.getEvents()==[]
+
+def test_threaded_producers():
+    queue = event.InputEventQueue()
+    reader = queue.newReader()
+    def produce(source):
+        for n in range(1000):
+            queue.put('button', n, source=source)
+    threads = [threading.Thread(target=produce, args=(name,)) for name in ['rb730', 'fORP', 'sync']]
+    for thread in threads:
+        thread.start()
+    received = []
+    while any([thread.is_alive() for thread in threads]):
+        received.extend(reader.getEvents())
+    received.extend(reader.getEvents())
+    assert len(received)==3000
+    for name in ['rb730', 'fORP', 'sync']:#nothing lost or reordered
+        assert [evt.value for evt in received if evt.source==name]==range(1000)
+
+def test_max_events():
+    queue = event.InputEventQueue(maxEvents=10)
+    reader = queue.newReader()
+    for n in range(25):
+        queue.put('key', str(n))
+    assert queue.nDropped==15
+    assert [evt.value for evt in reader.getEvents()]==[str(n) for n in range(15,25)]
+
+def test_key_buffer():
+    event._keyReader.clear()
+    event._onPygletKey(symbol='5', modifiers=None, emulated=True)
+    event._onPygletKey(symbol='a', modifiers=None, emulated=True)
+    keys = event._keyReader.getEvents('key', ['5'])
+    assert [(evt.value, evt.source) for evt in keys]==[('5', 'EmulatedKey')]
+    assert [evt.value for evt in event._keyReader.getEvents()]==['a']
+
+class _FakeKeyboard(object):
+    #presses its keys when its events are dispatched, once their time has come
+    def __init__(self, presses):
+        self.presses = presses
+    def _dispatch_events(self):
+        while self.presses and self.presses[0][0]<=core.getTime():
+            t, key = self.presses.pop(0)
+            event._onPygletKey(symbol=key, modifiers=None, emulated=True)
+
+class _FakeWin(object):
+    def __init__(self, dispatchers):
+        self._eventDispatchers = dispatchers
+
+def test_input_poller():
+    event._keyReader.clear()
+    t0 = core.getTime()
+    presses = [(t0+0.02*n, str(n)) for n in range(1,6)]
+    keyboard = _FakeKeyboard(list(presses))
+    poller = event.InputPoller(pollRate=1000, win=_FakeWin([keyboard]), autoStart=False)
+    poller.start()
+    assert poller.running
+    core.wait(0.15, hogCPUperiod=0)#nothing else dispatches the keyboard meanwhile
+    poller.stop()
+    assert not poller.running and poller.nPolls>50
+    keys = event._keyReader.getEvents('key')
+    assert [evt.value for evt in keys]==[key for t, key in presses]
+    for (t, key), evt in zip(presses, keys):
+        assert 0<=evt.time-t<0.01#well within a frame
+
+class _FakeMouseWin(object):
+    size = numpy.array([200, 100])
+    units = 'norm'
+
+def test_mouse_recording():
+    mouse = event.Mouse(win=_FakeMouseWin())
+    mouse.startRecording()
+    for n in range(3000):#more than the initial capacity
+        event._onPygletMouseMotion(x=n%200, y=50, dx=1, dy=0)
+    event.mouseButtons[0] = 1#as the press handler does
+    event._onPygletMouseDrag(x=150, y=75, dx=0, dy=0, buttons=1, modifiers=0)
+    event.mouseButtons[0] = 0
+    event._onPygletMouseMotion(x=150, y=75, dx=0, dy=0)
+    times, positions, buttons = mouse.getTrajectory()
+    assert len(times)==3002 and numpy.all(numpy.diff(times)>=0)
+    assert numpy.allclose(positions[:200,0], numpy.arange(200)/100.0-1)
+    assert numpy.allclose(positions[-1], [0.5, 0.5])
+    assert buttons.tolist()[-2:]==[[1,0,0], [0,0,0]]
+    #cleared, then only the most recent samples in pixels
+    assert len(mouse.getTrajectory()[0])==0
+    mouse.startRecording(maxSamples=100)
+    for n in range(250):
+        event._onPygletMouseMotion(x=n, y=0, dx=1, dy=0)
+    mouse.stopRecording()
+    event._onPygletMouseMotion(x=0, y=0, dx=1, dy=0)#not recorded
+    times, positions, buttons = mouse.getTrajectory(units='pix')
+    assert positions[:,0].tolist()==range(150-100, 250-100)
+    assert mouse._recorder.nDropped==150
+
+def test_save_trajectory():
+    mouse = event.Mouse(win=_FakeMouseWin())
+    fileName = os.path.join(tempfile.mkdtemp(), 'trajectories.tsv')
+    clock = core.Clock()
+    mouse.startRecording()
+    for trial in range(2):
+        for n in range(5):
+            event._onPygletMouseMotion(x=100+n, y=50, dx=1, dy=0)
+        mouse.saveTrajectory(fileName, trial=trial, units='pix', clock=clock)
+    mouse.stopRecording()
+    lines = open(fileName).read().splitlines()
+    assert lines[0].split('\t')==['trial', 't', 'x', 'y', 'left', 'middle', 'right']
+    assert len(lines)==11
+    assert [line.split('\t')[0] for line in lines[1:]]==['0']*5+['1']*5
+    assert lines[-1].split('\t')[2:]==['4', '0', '0', '0', '0']
+    os.remove(fileName)
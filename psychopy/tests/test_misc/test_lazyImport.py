@@ -0,0 +1,18 @@
+from psychopy import lazyImport
+import sys
+
+def test_lazy_module():
+    mod = lazyImport.LazyModule('wave')#something that psychopy doesn't import
+    sys.modules.pop('wave', None)
+    assert not lazyImport.isLoaded(mod)
+    assert 'not yet imported' in repr(mod)
+    assert mod.WAVE_FORMAT_PCM==1#imports it
+    assert lazyImport.isLoaded(mod) and 'wave' in sys.modules
+
+def test_missing_module():
+    mod = lazyImport.LazyModule('psychopyNoSuchModule')
+    assert not lazyImport.isAvailable(mod)
+    assert not lazyImport.isAvailable(mod)
+    assert not lazyImport.isInstalled('psychopyNoSuchModule')
+    assert not lazyImport.isInstalled('numpy.noSuchModule')
+    assert lazyImport.isInstalled('numpy.linalg')
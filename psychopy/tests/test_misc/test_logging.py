@@ -0,0 +1,48 @@
+from psychopy import logging
+import StringIO, time
+
+def _makeLogger(maxFlushed=5000):
+    logger = logging._Logger(format="%(levelname)s\t%(message)s", maxFlushed=maxFlushed)
+    stream = StringIO.StringIO()
+    logging.LogFile(stream, level=logging.INFO, logger=logger)
+    return logger, stream
+
+def test_flush_writes_entries():
+    logger, stream = _makeLogger()
+    logger.log('first', level=logging.EXP)
+    logger.log('ignored', level=logging.DEBUG)
+    logger.log('second', level=logging.DATA)
+    assert stream.getvalue()=='' #nothing written until flush
+    logger.flush()
+    assert stream.getvalue()=='EXP\tfirst\nDATA\tsecond\n'
+    assert len(logger.toFlush)==0
+
+def test_flushed_retention():
+    logger, stream = _makeLogger(maxFlushed=10)
+    for n in range(100):
+        logger.log('msg %i' %n, level=logging.EXP)
+    logger.flush()
+    assert len(logger.flushed)==10
+    assert logger.flushed[-1].message=='msg 99'
+    logger.setMaxFlushed(None)
+    for n in range(100):
+        logger.log('msg %i' %n, level=logging.EXP)
+    logger.flush()
+    assert len(logger.flushed)==110
+
+def test_background_writer():
+    logger, stream = _makeLogger()
+    logger.startBackgroundWriter(interval=0.01)
+    try:
+        for n in range(50):
+            logger.log('msg %i' %n, level=logging.EXP)
+        logger.flush() #only wakes the writer
+        t0 = time.time()
+        while stream.getvalue().count('\n')<50 and time.time()-t0<2:
+            time.sleep(0.01)
+        assert stream.getvalue().count('\n')==50
+        logger.log('last', level=logging.EXP)
+    finally:
+        logger.stopBackgroundWriter()
+    assert stream.getvalue().endswith('EXP\tlast\n')
+    assert logger._writer is None
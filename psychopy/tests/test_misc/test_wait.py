@@ -0,0 +1,37 @@
+from psychopy import core
+
+#the bounds allow for a loaded (e.g. CI) machine; waits usually end within
+#a few us (see core.getWaitStats())
+late = 0.02
+
+def test_wait_precision():
+    sched = core.WaitScheduler()
+    overshoot = sched.calibrate(nSleeps=5)
+    assert sched.calibrated and overshoot>=0
+    for secs in [0.001, 0.02, 0.06]:
+        t0 = core.getTime()
+        sched.waitUntil(t0+secs)
+        assert 0<=core.getTime()-t0-secs<late
+    stats = sched.getStats()
+    assert stats['nWaits']==3
+    assert 0<=stats['meanError']<=stats['maxError']<late
+    assert 0<stats['spinFraction']<1#mostly slept
+    sched.resetStats()
+    assert sched.getStats()['nWaits']==0 and sched.getStats()['meanError'] is None
+
+def test_wait_until_no_drift():
+    clock = core.Clock()
+    for n in range(1, 21):
+        core.wait(0.001)#'work' of a trial, before the next onset
+        core.waitUntil(n*0.005, clock=clock)
+    #still on time after 20 trials
+    assert 0<=clock.getTime()-0.1<late
+    t0 = core.getTime()
+    core.waitUntil(0.05, clock=clock)#has passed
+    assert core.getTime()-t0<late
+
+def test_wait_hog_cpu():
+    t0 = core.getTime()
+    core.wait(0.02, hogCPUperiod=0)#all sleep
+    core.wait(0.02, hogCPUperiod=0.02)#all spin
+    assert 0.04<=core.getTime()-t0<0.04+2*late
@@ -4,7 +4,7 @@
 # Copyright (C) 2012 Jonathan Peirce
 # Distributed under the terms of the GNU General Public License (GPL).
 
-import sys, os, glob, copy
+import sys, os, glob, copy, hashlib, weakref, threading, Queue
 #on windows try to load avbin now (other libs can interfere)
 if sys.platform=='win32':
     #make sure we also check in SysWOW64 if on 64-bit windows
@@ -22,8 +22,10 @@ import colors
 import psychopy.event
 #misc must only be imported *after* event or MovieStim breaks on win32 (JWP has no idea why!)
 import psychopy.misc
-import Image
-import makeMovies
+#optional and slow-to-import libs are only imported when first used
+from psychopy.lazyImport import LazyModule, isAvailable, isInstalled, isLoaded
+Image = LazyModule('Image')
+makeMovies = LazyModule('psychopy.makeMovies')
 
 if sys.platform=='win32' and not haveAvbin:
     logging.error("""avbin.dll failed to load. Try importing psychopy.visual as the first
@@ -49,17 +51,9 @@ GL = pyglet.gl
 import psychopy.gamma
 #import pyglet.gl, pyglet.window, pyglet.image, pyglet.font, pyglet.event
 import _shadersPyglet as _shaders
-try:
-    from pyglet import media
-    havePygletMedia=True
-except:
-    havePygletMedia=False
-
-try:
-    import pygame
-    havePygame=True
-except:
-    havePygame=False
+media = LazyModule('pyglet.media')#NB on win32 this was imported above, with avbin
+pygame = LazyModule('pygame')
+havePygame = isInstalled('pygame')
 
 #check for advanced drawing abilities
 #actually FBO isn't working yet so disable
@@ -70,12 +64,6 @@ try:
 except:
     haveFB=False
 
-try:
-    from matplotlib import nxutils
-    haveNxutils = True
-except:
-    haveNxutils = False
-
 global DEBUG; DEBUG=False
 
 #symbols for MovieStim
@@ -89,6 +77,223 @@ from psychopy.constants import *
 #keep track of windows that have been opened
 openWindows=[]
 
+class FrameTiming(object):
+    """Detailed timing of the frames of a :class:`Window`, created by
+    `win.setRecordFrameTiming(True)` and then available as `win.frameTiming`.
+
+    The flip times and the time taken by each part of flip() are stored for
+    the most recent `bufferSize` frames (in a circular numpy buffer so
+    recording costs the same however long the session). The parts are:
+
+        - draw: drawing the stimuli that have autoDraw set
+        - dispatch: handling window (keyboard/mouse) and sound events
+        - swap: the buffer swap, including waiting for the screen refresh
+        - log: writing the messages from win.logOnFlip()
+
+    For each autoDraw stimulus (by name) the number of draws and the mean and
+    longest draw time are kept for the whole session.
+
+    NB the draw times are the time taken to send the drawing commands. The
+    graphics card may do the actual drawing later (e.g. during the swap).
+    All times are in seconds.
+    """
+    phases = ('draw', 'dispatch', 'swap', 'log')
+    def __init__(self, bufferSize=3600, refreshThreshold=1.2/60):
+        self.bufferSize = bufferSize
+        self.refreshThreshold = refreshThreshold#longer intervals count as dropped
+        self.recording = True
+        self.reset()
+    def reset(self):
+        """Discards all the timing data collected so far
+        """
+        self.flipTimes = numpy.zeros(self.bufferSize)
+        self.phaseTimes = numpy.zeros([self.bufferSize, len(self.phases)])
+        self.nFrames = 0#in total, not just those in the buffer
+        self.nDropped = 0
+        self.longestInterval = 0.0
+        self._lastFlipT = None
+        self._stimTimes = {}#name:[nDraws, totalTime, longestTime]
+    def addFrame(self, flipTime, draw=0.0, dispatch=0.0, swap=0.0, log=0.0):
+        """Adds the timing of one frame (called by Window.flip())
+        """
+        index = self.nFrames%self.bufferSize
+        self.flipTimes[index] = flipTime
+        self.phaseTimes[index] = draw, dispatch, swap, log
+        self.nFrames += 1
+        if self._lastFlipT is not None:
+            interval = flipTime-self._lastFlipT
+            if interval>self.refreshThreshold:
+                self.nDropped += 1
+            if interval>self.longestInterval:
+                self.longestInterval = interval
+        self._lastFlipT = flipTime
+    def addStimTime(self, stim, drawTime):
+        """Adds the time taken to draw a stimulus (called by Window.flip())
+        """
+        name = stim.name or stim.__class__.__name__
+        stimTimes = self._stimTimes.get(name)
+        if stimTimes is None:
+            self._stimTimes[name] = [1, drawTime, drawTime]
+        else:
+            stimTimes[0] += 1
+            stimTimes[1] += drawTime
+            if drawTime>stimTimes[2]:
+                stimTimes[2] = drawTime
+    def _bufferOrder(self):
+        """indices of the frames in the buffer, oldest first"""
+        nInBuffer = min(self.nFrames, self.bufferSize)
+        start = self.nFrames-nInBuffer
+        return numpy.arange(start, start+nInBuffer)%self.bufferSize
+    def getFlipTimes(self):
+        """Returns the times of the frames in the buffer, oldest first
+        """
+        return self.flipTimes[self._bufferOrder()]
+    def getIntervals(self):
+        """Returns the intervals between the frames in the buffer, oldest first
+        """
+        return numpy.diff(self.getFlipTimes())
+    def getPhaseTimes(self, phase=None):
+        """Returns the time spent in each part of flip() for the frames in the
+        buffer as an array of [frameN, phase] (see `FrameTiming.phases`) or
+        just the times for one phase, e.g. `getPhaseTimes('draw')`
+        """
+        times = self.phaseTimes[self._bufferOrder()]
+        if phase is None:
+            return times
+        return times[:,self.phases.index(phase)]
+    def getStimTimes(self):
+        """Returns a dict with an entry for each autoDraw stimulus (by name)
+        giving the number of draws and the mean and longest draw time
+        """
+        return dict([(name, {'n':n, 'mean':total/n, 'max':longest})
+            for name, (n, total, longest) in self._stimTimes.items()])
+    def getPercentiles(self, percentiles=(50, 95, 99)):
+        """Returns the given percentiles of the frame intervals in the buffer
+        """
+        intervals = self.getIntervals()
+        if not len(intervals):
+            return [numpy.nan]*len(percentiles)
+        return [numpy.percentile(intervals, p) for p in percentiles]
+    def summary(self, percentiles=(50, 95, 99)):
+        """Returns a dict summarising the timing, for printing or saving
+        """
+        summary = {'nFrames':self.nFrames, 'nDropped':self.nDropped,
+                   'longestInterval':self.longestInterval,
+                   'stimTimes':self.getStimTimes()}
+        intervals = self.getIntervals()
+        if len(intervals):
+            summary['meanInterval'] = intervals.mean()
+        for p, value in zip(percentiles, self.getPercentiles(percentiles)):
+            summary['interval%g' %p] = value
+        for phase, meanTime in zip(self.phases, self.getPhaseTimes().mean(axis=0)):
+            summary['mean_'+phase] = meanTime
+        return summary
+    def saveAsText(self, fileName, delim=','):
+        """Saves the frames in the buffer, one row per frame, with the flip time,
+        the interval since the previous frame and the time for each part of
+        flip()
+        """
+        flipTimes = self.getFlipTimes()
+        intervals = numpy.concatenate([[numpy.nan], numpy.diff(flipTimes)])
+        table = numpy.column_stack([flipTimes, intervals, self.getPhaseTimes()])
+        f = open(fileName, 'w')
+        f.write(delim.join(('flipTime', 'interval')+self.phases)+'\n')
+        numpy.savetxt(f, table, fmt='%.6f', delimiter=delim)
+        f.close()
+
+class FrameCapture(object):
+    """Captures the frames of a :class:`Window` to numpy arrays as they are
+    flipped, created by `win.startFrameCapture()` and then available as
+    `win.frameCapture`.
+
+    Each frame is read from the back buffer just before the swap. Where the
+    graphics card supports pixel buffer objects (OpenGL 2.1) the pixels are
+    copied into one of `nPixelBuffers` buffers on the card, which returns at
+    once, and then fetched into the `frames` array nPixelBuffers-1 flips
+    later, so capturing doesn't make flip() wait for the card to finish
+    drawing. Otherwise each frame is read straight away.
+
+    `frames` is a preallocated [nFrames, height, width, 3] array of uint8
+    (RGB, top row first).
+    """
+    def __init__(self, win, nFrames=100, callback=None, nPixelBuffers=2):
+        self.win = win
+        w, h = self.size = int(win.size[0]), int(win.size[1])
+        self.frames = numpy.zeros([nFrames, h, w, 3], numpy.uint8)
+        self.callback = callback
+        self.nCaptured = 0#frames that have arrived in self.frames
+        self.nRead = 0#frames that have been read from the window
+        self.capturing = True
+        self._nBytes = w*h*3
+        self._pending = []#pixel buffers holding frames that haven't been fetched yet
+        if nPixelBuffers>0 and GL.gl_info.have_version(2,1):
+            self._pixelBuffers = (GL.GLuint*nPixelBuffers)()
+            GL.glGenBuffers(nPixelBuffers, self._pixelBuffers)
+            for pixelBuffer in self._pixelBuffers:
+                GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pixelBuffer)
+                GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, self._nBytes, None, GL.GL_STREAM_READ)
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        else:
+            self._pixelBuffers = None
+            self._rows = numpy.empty([h, w, 3], numpy.uint8)
+    def _readFrame(self):
+        """Reads the back buffer of the window (called by Window.flip())
+        """
+        if self.callback is None and self.nRead>=len(self.frames):
+            logging.warning('FrameCapture is full (%i frames), no more frames will be captured' %self.nRead)
+            self.finish()
+            return
+        w, h = self.size
+        self.win._setReadBuffer('back')
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        if self._pixelBuffers is None:
+            GL.glReadPixels(0, 0, w, h, GL.GL_RGB, GL.GL_UNSIGNED_BYTE, self._rows.ctypes.data)
+            self._store(self._rows)
+        else:
+            if len(self._pending)==len(self._pixelBuffers):
+                self._fetch()#the oldest, so that its buffer can be reused
+            pixelBuffer = self._pixelBuffers[self.nRead%len(self._pixelBuffers)]
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pixelBuffer)
+            GL.glReadPixels(0, 0, w, h, GL.GL_RGB, GL.GL_UNSIGNED_BYTE, 0)#into the buffer
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+            self._pending.append(pixelBuffer)
+        self.nRead += 1
+    def _fetch(self):
+        """Copies the oldest pending frame from its pixel buffer"""
+        pixelBuffer = self._pending.pop(0)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pixelBuffer)
+        address = GL.glMapBuffer(GL.GL_PIXEL_PACK_BUFFER, GL.GL_READ_ONLY)
+        rows = numpy.frombuffer((GL.GLubyte*self._nBytes).from_address(address), numpy.uint8)
+        self._store(rows.reshape([self.size[1], self.size[0], 3]))
+        GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+    def _store(self, rows):
+        index = self.nCaptured%len(self.frames)
+        self.frames[index] = rows[::-1]#OpenGL gives the bottom row first
+        self.nCaptured += 1
+        if self.callback is not None:
+            self.callback(self.nCaptured-1, self.frames[index])
+    def finish(self):
+        """Stops capturing and fetches any frames that are still waiting on
+        the graphics card
+        """
+        self.capturing = False
+        while self._pending:
+            self._fetch()
+        if self._pixelBuffers is not None:
+            GL.glDeleteBuffers(len(self._pixelBuffers), self._pixelBuffers)
+            self._pixelBuffers = None
+    def getFrames(self):
+        """Returns the captured frames as an array [nFrames, height, width, 3]
+        in the order they were flipped (only the most recent ones if more
+        frames were captured than can be stored)
+        """
+        nFrames = len(self.frames)
+        if self.nCaptured<=nFrames:
+            return self.frames[:self.nCaptured]
+        start = self.nCaptured%nFrames
+        return numpy.concatenate([self.frames[start:], self.frames[:start]])
+
 class Window:
     """Used to set up a context in which to draw objects,
     using either PyGame (python's SDL binding) or pyglet.
@@ -124,6 +329,7 @@ class Window:
                  waitBlanking=True,
                  allowStencil=False,
                  stereo=False,
+                 offscreen=False,
                  name='window1'):
         """
         :Parameters:
@@ -140,6 +346,7 @@ class Window:
                 If set to False, window will be drawn with no frame and no buttons to close etc...
             winType :  *None*, 'pyglet', 'pygame'
                 If None then PsychoPy will revert to user/site preferences
+                (and see `offscreen`)
             monitor : *None*, string or a `~psychopy.monitors.Monitor` object
                 The monitor to be used during the experiment
             units :  *None*, 'height' (of the window), 'norm' (normalised),'deg','cm','pix'
@@ -164,6 +371,14 @@ class Window:
                 (notably, allowing the class:`~psychopy.visual.Aperture` to be used).
             stereo : True or *False*
                 If True and your graphics card supports quad buffers then this will be enabled.
+            offscreen : True or *False*
+                If True the window is never shown and everything is drawn to
+                (double-buffered) offscreen buffers on the graphics card, which
+                you can read with :meth:`~Window.getFrameArray`,
+                :meth:`~Window.startFrameCapture` or getMovieFrame(). flip()
+                then doesn't wait for the screen refresh, so frames can be
+                rendered as fast as the card allows (pyglet only, and still
+                needs an OpenGL context, e.g. from a virtual X display)
                 You can switch between left and right-eye scenes for drawing operations using
                 :func:`~psychopy.visual.Window.setBuffer`
 
@@ -177,6 +392,14 @@ class Window:
 
         self._defDepth=0.0
         self._toLog=[]
+        self.frameTiming=None#a FrameTiming object if setRecordFrameTiming(True)
+        self.frameCapture=None#a FrameCapture object if startFrameCapture()
+        self._frameRows=None#reused by getFrameArray()
+        self._movieWriter=None#see startMovieRecording()
+        self.batchDraw=False#see setBatchDraw()
+        self._batchedToDraw=None#(ids of the _toDraw stimuli, grouped into batches)
+        self._unitConverter=None#see getUnitConverter()
+        self._imageCache=None#see getImageCache()
 
         #settings for the monitor: local settings (if available) override monitor
         #if we have a monitors.Monitor object (psychopy 0.54 onwards)
@@ -221,6 +444,7 @@ class Window:
         else: self.viewPos = viewPos
         self.viewOri  = float(viewOri)
         self.stereo = stereo #use quad buffer if requested (and if possible)
+        self.offscreen = offscreen
 
         #setup bits++ if possible
         self.bitsMode = bitsMode #could be [None, 'fast', 'slow']
@@ -293,6 +517,9 @@ class Window:
         if self.winType=='pygame' and not havePygame:
             logging.warning("Requested pygame backend but pygame is not installed or not fully working")
             self.winType='pyglet'
+        if self.winType=='pygame' and self.offscreen:
+            logging.warning("Offscreen windows need the pyglet backend, using pyglet")
+            self.winType='pyglet'
         #setup the context
         if self.winType == "pygame": self._setupPygame()
         elif self.winType == "pyglet": self._setupPyglet()
@@ -318,10 +545,14 @@ class Window:
         self._toDraw=[]
         self._toDrawDepths=[]
         self._eventDispatchers=[]
-        try:
-            self.origGammaRamp=psychopy.gamma.getGammaRamp(self.winHandle)
-        except:
+        if self.offscreen:
+            self.useNativeGamma=True#no screen to apply a gamma to
             self.origGammaRamp=None
+        else:
+            try:
+                self.origGammaRamp=psychopy.gamma.getGammaRamp(self.winHandle)
+            except:
+                self.origGammaRamp=None
         if self.useNativeGamma:
             logging.info('Using gamma table of operating system')
         else:
@@ -332,7 +563,10 @@ class Window:
         self.waitBlanking = waitBlanking
 
         self._refreshThreshold=1/1.0#initial val needed by flip()
-        self._monitorFrameRate = self._getActualFrameRate()#over several frames with no drawing
+        if self.offscreen:
+            self._monitorFrameRate = None#flips aren't synced to a screen
+        else:
+            self._monitorFrameRate = self._getActualFrameRate()#over several frames with no drawing
         if self._monitorFrameRate != None:
             self._refreshThreshold = (1.0/self._monitorFrameRate)*1.2
         else:
@@ -356,6 +590,95 @@ class Window:
         self.recordFrameIntervals=value
 
         self.frameClock.reset()
+    def setRecordFrameTiming(self, value=True, bufferSize=3600):
+        """Turns on (or off) detailed timing of each flip(), stored in
+        `win.frameTiming` (a :class:`FrameTiming` object). As well as the time
+        of each flip this records how long each of the autoDraw stimuli took to
+        draw and how long flip() spent dispatching events, swapping buffers
+        and logging, so you can see what is causing dropped frames.
+
+        :Parameters:
+
+            value : True or False
+                False stops the recording (but keeps win.frameTiming for you
+                to look at)
+            bufferSize : int
+                the number of most recent frames that are kept (summary counts
+                cover all the frames)
+
+        e.g.::
+
+            win.setRecordFrameTiming(True)
+            #... run trials
+            print win.frameTiming.summary()
+            win.frameTiming.saveAsText('frameTimes.csv')
+
+        """
+        if value:
+            if self.frameTiming is None or self.frameTiming.bufferSize!=bufferSize:
+                self.frameTiming = FrameTiming(bufferSize=bufferSize,
+                    refreshThreshold=self._refreshThreshold)
+            elif not self.frameTiming.recording:
+                self.frameTiming._lastFlipT = None#the pause isn't a dropped frame
+            self.frameTiming.recording = True
+        elif self.frameTiming is not None:
+            self.frameTiming.recording = False
+    def setBatchDraw(self, value=True):
+        """Draw the autoDraw stimuli in batches where possible. Consecutive
+        (in drawing order) ShapeStims, Polygons, Circles, Rects and Lines that
+        are all filled without an outline (or all outlines without a fill) and
+        share the same lineWidth, interpolate and closeShape are then drawn
+        together as a :class:`ShapeBatch`, which is much faster when there are
+        many of them. Other stimuli are drawn as normal, so the frame looks
+        the same.
+
+        The batches are kept from one flip to the next (while the autoDraw
+        stimuli stay the same) and only the shapes that have changed are
+        updated. With frame timing on (see :meth:`~Window.setRecordFrameTiming`)
+        the draw times of the batches are stored under the name 'ShapeBatch'.
+        """
+        self.batchDraw = value
+        self._batchedToDraw = None
+    def _getBatchedToDraw(self):
+        """The autoDraw stimuli grouped into :class:`ShapeBatch` objects, kept
+        until the list of autoDraw stimuli changes (or a batch finds that one
+        of its shapes can't be batched with the others any more)
+        """
+        ids = tuple(map(id, self._toDraw))
+        if self._batchedToDraw is None or self._batchedToDraw[0]!=ids:
+            previous = []
+            if self._batchedToDraw is not None:
+                previous = self._batchedToDraw[1]
+            self._batchedToDraw = (ids, _batchStimuli(self, self._toDraw, previous))
+        return self._batchedToDraw[1]
+    def getUnitConverter(self):
+        """Returns the :class:`~psychopy.misc.UnitConverter` that stimuli on
+        this window use to convert 'deg' and 'cm' to pixels. Its scale factors
+        are cached and updated if the monitor calibration changes.
+
+        To use tangent-corrected (rather than linear) degrees for all stimuli
+        on the window::
+
+            win.getUnitConverter().correctFlat = True
+        """
+        conv = self._unitConverter
+        if conv is None or conv.monitor is not self.monitor:
+            correctFlat = conv is not None and conv.correctFlat
+            conv = self._unitConverter = psychopy.misc.UnitConverter(self.monitor,
+                correctFlat=correctFlat)
+        return conv
+    def getImageCache(self):
+        """Returns the :class:`ImageCache` of decoded image files for stimuli
+        on this window (creating it when first needed). Images are added to
+        it by `stim.preloadImages()`, e.g. ::
+
+            cache = win.getImageCache()
+            cache.maxBytes = 2*2**30#keep up to 2GB of decoded images
+            stim.preloadImages([trial['image'] for trial in trials.trialList])
+        """
+        if self._imageCache is None:
+            self._imageCache = ImageCache(self)
+        return self._imageCache
     def saveFrameIntervals(self, fileName=None, clear=True):
         """Save recorded screen frame intervals to disk, as comma-separated values.
 
@@ -414,8 +737,22 @@ class Window:
         win.flip(clearBuffer=True)#results in a clear screen after flipping
         win.flip(clearBuffer=False)#the screen is not cleared (so represent the previous screen)
         """
-        for thisStim in self._toDraw:
-            thisStim.draw()
+        timing = self.frameTiming
+        if self.batchDraw:
+            toDraw = self._getBatchedToDraw()
+        else:
+            toDraw = self._toDraw
+        if timing is None or not timing.recording:
+            timing = None
+            for thisStim in toDraw:
+                thisStim.draw()
+        else:
+            tStart = core.getTime()
+            for thisStim in toDraw:
+                t0 = core.getTime()
+                thisStim.draw()
+                timing.addStimTime(thisStim, core.getTime()-t0)
+            tDrawn = core.getTime()
 
         if haveFB:
             #need blit the frambuffer object to the actual back buffer
@@ -437,20 +774,31 @@ class Window:
         if self.bitsMode in ['fast','bits++']:
             self.bits._drawLUTtoScreen()
 
+        if self.frameCapture is not None and self.frameCapture.capturing:
+            self.frameCapture._readFrame()#the back buffer, before it's swapped
+
         if self.winType =="pyglet":
             #make sure this is current context
             self.winHandle.switch_to()
 
             GL.glTranslatef(0.0,0.0,-5.0)
 
-            for dispatcher in self._eventDispatchers:
-                dispatcher._dispatch_events()
+            if timing: tDispatch = core.getTime()
+            with core._dispatchLock:#an event.InputPoller may be polling these too
+                for dispatcher in self._eventDispatchers:
+                    dispatcher._dispatch_events()
             self.winHandle.dispatch_events()#this might need to be done even more often than once per frame?
-            pyglet.media.dispatch_events()#for sounds to be processed
-            self.winHandle.flip()
+            if isLoaded(media):
+                media.dispatch_events()#for sounds to be processed
+            if timing: tDispatch = core.getTime()-tDispatch
+            if self.offscreen:
+                self._swapOffscreenBuffers(clearBuffer)
+            else:
+                self.winHandle.flip()
             #self.winHandle.clear()
             GL.glLoadIdentity()
         else:
+            if timing: tDispatch = 0.0
             if pygame.display.get_init():
                 pygame.display.flip()
                 pygame.event.pump()#keeps us in synch with system event queue
@@ -512,10 +860,16 @@ class Window:
                        logging.warning("Multiple dropped frames have occurred - I'll stop bothering you about them!")
 
         #log events
+        if timing: tLog = core.getTime()
         for logEntry in self._toLog:
             #{'msg':msg,'level':level,'obj':copy.copy(obj)}
             logging.log(msg=logEntry['msg'], level=logEntry['level'], t=now, obj=logEntry['obj'])
         self._toLog = []
+        if timing:
+            tEnd = core.getTime()
+            #swap is everything after drawing that wasn't event dispatch or logging
+            timing.addFrame(now, draw=tDrawn-tStart, dispatch=tDispatch,
+                swap=tLog-tDrawn-tDispatch, log=tEnd-tLog)
 
         #    If self.waitBlanking is True, then return the time that
         # GL.glFinish() returned, set as the 'now' variable. Otherwise
@@ -606,6 +960,9 @@ class Window:
         Frames are stored in memory until a .saveMovieFrames(filename) command
         is issued. You can issue getMovieFrame() as often
         as you like and then save them all in one go when finished.
+
+        For long recordings use :meth:`~Window.startMovieRecording`, which
+        writes the frames as it goes.
         """
         im = self._getFrame(buffer=buffer)
         self.movieFrames.append(im)
@@ -616,10 +973,7 @@ class Window:
         """
         #GL.glLoadIdentity()
         #do the reading of the pixels
-        if buffer=='back':
-            GL.glReadBuffer(GL.GL_BACK)
-        else:
-            GL.glReadBuffer(GL.GL_FRONT)
+        self._setReadBuffer(buffer)
 
         #fetch the data with glReadPixels
         #pyglet.gl stores the data in a ctypes buffer
@@ -632,6 +986,129 @@ class Window:
 
         return im
 
+    def getFrameArray(self, buffer='front', out=None):
+        """Return the current Window as a numpy array of uint8 with shape
+        [height, width, 3] (RGB, top row first). Much quicker than getting an
+        image with getMovieFrame().
+
+        :parameters:
+
+            buffer: 'front' (what was shown by the last flip) or 'back'
+                (what has been drawn since)
+            out: an array of the right shape and type to put the frame in,
+                to save allocating a new one for every frame
+        """
+        w, h = int(self.size[0]), int(self.size[1])
+        if out is None:
+            out = numpy.empty([h, w, 3], numpy.uint8)
+        elif out.shape!=(h, w, 3) or out.dtype!=numpy.uint8:
+            raise ValueError("out should be a uint8 array of shape %s" %str((h, w, 3)))
+        self._setReadBuffer(buffer)
+        #OpenGL gives the bottom row first, so read into a (reused) buffer to flip
+        rows = self._frameRows
+        if rows is None or rows.shape!=(h, w, 3):
+            rows = self._frameRows = numpy.empty([h, w, 3], numpy.uint8)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        GL.glReadPixels(0, 0, w, h, GL.GL_RGB, GL.GL_UNSIGNED_BYTE, rows.ctypes.data)
+        out[:] = rows[::-1]
+        return out
+    def startFrameCapture(self, nFrames=100, callback=None, nPixelBuffers=2):
+        """Capture every frame, as it is flipped, to a numpy array (without
+        stalling flip() to wait for the pixels where the graphics card can copy
+        them in the background). Returns (and stores as `win.frameCapture`) a
+        :class:`FrameCapture`.
+
+        :parameters:
+
+            nFrames: the number of frames to store (in a preallocated array).
+                Without a callback, capture stops when that many frames have
+                been captured
+            callback: a function(frameN, frame) to be called with each frame
+                as it arrives (the frame array gets reused, so copy anything you
+                want to keep). With a callback the stored frames are a circular
+                buffer of the most recent nFrames
+            nPixelBuffers: the number of frames that can be waiting to be read
+                back from the graphics card. Frames arrive nPixelBuffers-1
+                flips late (use 0 to read each frame at once)
+
+        e.g.::
+
+            win = visual.Window([256,256], offscreen=True)
+            win.startFrameCapture(nFrames=300)
+            for frameN in range(300):
+                gabor.setPhase(0.01, '+')
+                gabor.draw()
+                win.flip()
+            frames = win.stopFrameCapture().getFrames()#300x256x256x3
+
+        """
+        if self.frameCapture is not None:
+            self.stopFrameCapture()
+        self.frameCapture = FrameCapture(self, nFrames=nFrames,
+            callback=callback, nPixelBuffers=nPixelBuffers)
+        return self.frameCapture
+    def stopFrameCapture(self):
+        """Stop capturing frames (see :meth:`~Window.startFrameCapture`),
+        fetch any that are still waiting and return the :class:`FrameCapture`
+        """
+        capture = self.frameCapture
+        if capture is not None:
+            capture.finish()
+        return capture
+    def startMovieRecording(self, fileName, fps=30, mpgCodec='mpeg1video',
+            queueSize=60, maxWait=0.002):
+        """Write every frame to a movie file, or a series of image files, as
+        it is flipped. Unlike getMovieFrame() and saveMovieFrames() the frames
+        aren't kept in memory: they are read into numpy arrays (see
+        :meth:`~Window.startFrameCapture`) and written by a background thread.
+        Returns the :class:`~psychopy.makeMovies.MovieWriter`.
+
+        :parameters:
+
+            fileName: the name of the file. Image types (png, tif...) create
+                fileName00001.png etc. .gif makes an animated GIF (with the
+                colors of the first frame), .mpg requires pymedia and .mov is
+                OS X only
+            fps: frames per second (Quicktime only)
+            queueSize: the number of frames that can be waiting to be written
+            maxWait: if the writer falls behind, flip() waits at most this long
+                (secs) for space in the queue and then drops the frame
+
+        e.g.::
+
+            win.startMovieRecording('trial.png')
+            #... draw and flip as normal
+            stats = win.stopMovieRecording().getStats()#nWritten, nDropped...
+
+        """
+        self.stopMovieRecording()
+        self._movieWriter = makeMovies.MovieWriter(fileName, size=self.size,
+            fps=fps, mpgCodec=mpgCodec, queueSize=queueSize, maxWait=maxWait)
+        self.startFrameCapture(nFrames=1, callback=self._movieWriter.addFrame)
+        return self._movieWriter
+    def stopMovieRecording(self):
+        """Stop recording (see :meth:`~Window.startMovieRecording`), wait
+        for the frames to be written and return the MovieWriter (or None if
+        there was no recording)
+        """
+        writer = self._movieWriter
+        if writer is None:
+            return None
+        self._movieWriter = None
+        self.stopFrameCapture()
+        writer.close()
+        return writer
+    def _setReadBuffer(self, buffer):
+        """Select the buffer ('front' or 'back') for glReadPixels"""
+        if self.offscreen:
+            index = self._offscreenBack
+            if buffer!='back':
+                index = 1-index
+            GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT0_EXT+index)
+        elif buffer=='back':
+            GL.glReadBuffer(GL.GL_BACK)
+        else:
+            GL.glReadBuffer(GL.GL_FRONT)
     def saveMovieFrames(self, fileName, mpgCodec='mpeg1video',
         fps=30, clearFrames=True):
         """
@@ -710,10 +1187,7 @@ class Window:
         box = [(rect[0]/2. + 0.5)*x, (rect[1]/-2. + 0.5)*y, # Left Top in pix
                 (rect[2]/2. + 0.5)*x, (rect[3]/-2. + 0.5)*y] # Right Bottom in pix
         box = map(int, box)
-        if buffer=='back':
-            GL.glReadBuffer(GL.GL_BACK)
-        else:
-            GL.glReadBuffer(GL.GL_FRONT)
+        self._setReadBuffer(buffer)
 
         if self.winType == 'pyglet': #pyglet.gl stores the data in a ctypes buffer
             bufferDat = (GL.GLubyte * (4 * (box[2]-box[0]) * (box[3]-box[1])))()
@@ -742,12 +1216,19 @@ class Window:
 
     def close(self):
         """Close the window (and reset the Bits++ if necess)."""
+        self.stopMovieRecording()
         if (not self.useNativeGamma) and self.origGammaRamp!=None:
             psychopy.gamma.setGammaRamp(self.winHandle, self.origGammaRamp)
         self.setMouseVisible(True)
         if self.winType=='pyglet':
+            self.winHandle.switch_to()
+            if self._imageCache is not None:
+                self._imageCache.close()
+            self._shaderRegistry.deleteAll()
             self.winHandle.close()
         else:
+            if self._imageCache is not None:
+                self._imageCache.close()
             #pygame.quit()
             pygame.display.quit()
         if self.bitsMode!=None:
@@ -849,6 +1330,16 @@ class Window:
         The `units` can be 'height' (multiples of window height), 'norm'(normalised), 'pix'(pixels), 'cm' or
         'stroke_font'. The `font` parameter is only used if units='stroke_font'
         """
+        thisScale = self._getScale(units, font)
+        #actually set the scale as appropriate
+        thisScale = thisScale/numpy.asarray(prevScale)#allows undoing of a previous scaling procedure
+        GL.glScalef(thisScale[0], thisScale[1], 1.0)
+        return thisScale #just in case the user wants to know?!
+
+    def _getScale(self, units, font='dummyFont'):
+        """The (x,y) scale from `units` to the window's normalised units, as
+        used by setScale() (without changing the GL matrix)
+        """
         if units=="norm":
             thisScale = numpy.array([1.0,1.0])
         elif units=="height":
@@ -872,10 +1363,7 @@ class Window:
             thisScale = cmScale * 0.017455 * self.scrDistCM
         elif units=="stroke_font":
             thisScale = numpy.array([2*font.letterWidth,2*font.letterWidth]/self.size/38.0)
-        #actually set the scale as appropriate
-        thisScale = thisScale/numpy.asarray(prevScale)#allows undoing of a previous scaling procedure
-        GL.glScalef(thisScale[0], thisScale[1], 1.0)
-        return thisScale #just in case the user wants to know?!
+        return thisScale
 
     def setGamma(self,gamma):
         """Set the monitor gamma, using Bits++ if possible"""
@@ -918,13 +1406,20 @@ class Window:
         else:w,h=self.size
         if self.allowGUI: style=None
         else: style='borderless'
+        if self.offscreen:
+            #the (hidden) window just provides the OpenGL context
+            self._isFullScr = False
+            w,h = self.size
         self.winHandle = pyglet.window.Window(width=w,height=h,
                                               caption="PsychoPy",
                                               fullscreen=self._isFullScr,
                                               config=config,
                                               screen=thisScreen,
-                                              style=style
+                                              style=style,
+                                              visible=not self.offscreen
                                           )
+        if self.offscreen:
+            self._setupOffscreenBuffers()
         #provide warning if stereo buffers are requested but unavailable
         if self.stereo and not GL.gl_info.have_extension(GL.GL_STEREO):
             logging.warning('A stereo window was requested but the graphics card does not appear to support GL_STEREO')
@@ -938,6 +1433,8 @@ class Window:
         self.winHandle.on_mouse_press = psychopy.event._onPygletMousePress
         self.winHandle.on_mouse_release = psychopy.event._onPygletMouseRelease
         self.winHandle.on_mouse_scroll = psychopy.event._onPygletMouseWheel
+        self.winHandle.on_mouse_motion = psychopy.event._onPygletMouseMotion
+        self.winHandle.on_mouse_drag = psychopy.event._onPygletMouseDrag
         if not self.allowGUI:
             #make mouse invisible. Could go further and make it 'exclusive' (but need to alter x,y handling then)
             self.winHandle.set_mouse_visible(False)
@@ -952,6 +1449,46 @@ class Window:
             icon = pyglet.image.load(filename=iconFile)
             self.winHandle.set_icon(icon)
         except: pass#doesn't matter
+    def _setupOffscreenBuffers(self):
+        """Creates a framebuffer object with two color buffers (used as the
+        front and back buffers of an offscreen window) and a depth/stencil
+        buffer, and makes it the target for drawing
+        """
+        w, h = int(self.size[0]), int(self.size[1])
+        fbo = GL.GLuint()
+        GL.glGenFramebuffersEXT(1, ctypes.byref(fbo))
+        GL.glBindFramebufferEXT(GL.GL_FRAMEBUFFER_EXT, fbo)
+        renderBuffers = (GL.GLuint*3)()
+        GL.glGenRenderbuffersEXT(3, renderBuffers)
+        for n in range(2):
+            GL.glBindRenderbufferEXT(GL.GL_RENDERBUFFER_EXT, renderBuffers[n])
+            GL.glRenderbufferStorageEXT(GL.GL_RENDERBUFFER_EXT, GL.GL_RGBA8, w, h)
+            GL.glFramebufferRenderbufferEXT(GL.GL_FRAMEBUFFER_EXT, GL.GL_COLOR_ATTACHMENT0_EXT+n,
+                GL.GL_RENDERBUFFER_EXT, renderBuffers[n])
+        GL.glBindRenderbufferEXT(GL.GL_RENDERBUFFER_EXT, renderBuffers[2])
+        GL.glRenderbufferStorageEXT(GL.GL_RENDERBUFFER_EXT, GL.GL_DEPTH24_STENCIL8_EXT, w, h)
+        GL.glFramebufferRenderbufferEXT(GL.GL_FRAMEBUFFER_EXT, GL.GL_DEPTH_ATTACHMENT_EXT,
+            GL.GL_RENDERBUFFER_EXT, renderBuffers[2])
+        GL.glFramebufferRenderbufferEXT(GL.GL_FRAMEBUFFER_EXT, GL.GL_STENCIL_ATTACHMENT_EXT,
+            GL.GL_RENDERBUFFER_EXT, renderBuffers[2])
+        GL.glBindRenderbufferEXT(GL.GL_RENDERBUFFER_EXT, 0)
+        status = GL.glCheckFramebufferStatusEXT(GL.GL_FRAMEBUFFER_EXT)
+        if status!=GL.GL_FRAMEBUFFER_COMPLETE_EXT:
+            raise RuntimeError("Couldn't create the buffers for an offscreen window (status %s)" %status)
+        self._offscreenFBO = fbo
+        self._offscreenRenderBuffers = renderBuffers
+        self._offscreenBack = 0#index of the color buffer being drawn to
+        GL.glDrawBuffer(GL.GL_COLOR_ATTACHMENT0_EXT)
+    def _swapOffscreenBuffers(self, clearBuffer=True):
+        """The equivalent of a buffer swap for an offscreen window"""
+        front = self._offscreenBack
+        self._offscreenBack = 1-front
+        GL.glDrawBuffer(GL.GL_COLOR_ATTACHMENT0_EXT+self._offscreenBack)
+        if not clearBuffer:
+            #start the next frame from the one just finished (as when the screen isn't cleared)
+            w, h = int(self.size[0]), int(self.size[1])
+            GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT0_EXT+front)
+            GL.glBlitFramebufferEXT(0, 0, w, h, 0, 0, w, h, GL.GL_COLOR_BUFFER_BIT, GL.GL_NEAREST)
     def _checkMatchingSizes(self, requested,actual):
         """Checks whether the requested and actual screen sizes differ. If not
         then a warning is output and the window size is set to actual
@@ -1031,12 +1568,17 @@ class Window:
         if not GL.gl_info.have_extension('GL_ARB_texture_float'):
             self._haveShaders=False
 
+        self._textureCache=_TextureCache()#textures shared between stimuli, see createTexture()
+        #shader programs are compiled when a stimulus first uses them, see getShader()
+        self._shaderRegistry=_shaders.ShaderRegistry(
+            binaryCacheDir=os.path.join(prefs.paths['userPrefsDir'], 'shaderCache'))
         if self.winType=='pyglet' and self._haveShaders:
-            #we should be able to compile shaders (don't just 'try')
-            self._progSignedTexMask = _shaders.compileProgram(_shaders.vertSimple, _shaders.fragSignedColorTexMask)#fragSignedColorTexMask
-            self._progSignedTex = _shaders.compileProgram(_shaders.vertSimple, _shaders.fragSignedColorTex)
-            self._progSignedTexMask1D = _shaders.compileProgram(_shaders.vertSimple, _shaders.fragSignedColorTexMask1D)
-            self._progSignedTexFont = _shaders.compileProgram(_shaders.vertSimple, _shaders.fragSignedColorTexFont)
+            self.registerShader('signedTexMask', _shaders.vertSimple, _shaders.fragSignedColorTexMask)
+            self.registerShader('signedTex', _shaders.vertSimple, _shaders.fragSignedColorTex)
+            self.registerShader('signedTexMask1D', _shaders.vertSimple, _shaders.fragSignedColorTexMask1D)
+            self.registerShader('signedTexFont', _shaders.vertSimple, _shaders.fragSignedColorTexFont)
+            self.registerShader('signedTexMaskTransform', _shaders.vertTexTransform, _shaders.fragSignedColorTexMask)
+            self.registerShader('signedTexMask1DTransform', _shaders.vertTexTransform, _shaders.fragSignedColorTexMask1D)
 #        elif self.winType=='pygame':#on PyOpenGL we should try to get an init value
 #            from OpenGL.GL.ARB import shader_objects
 #            if shader_objects.glInitShaderObjectsARB():
@@ -1057,6 +1599,38 @@ class Window:
         if haveFB:
             self._setupFrameBuffer()
 
+    def registerShader(self, name, vertexSource=None, fragmentSource=None):
+        """Add a GLSL shader program to the window, for stimuli to use with
+        :meth:`~Window.getShader`. The program isn't compiled until it is first
+        used, and linked programs are cached on disk where the graphics driver
+        supports that. A program of the same name is replaced.
+
+        Returns the :class:`~psychopy._shadersPyglet.ShaderProgram`.
+
+        The window registers these programs (with `_shaders.vertSimple` as
+        the vertex shader) if shaders are supported: 'signedTexMask',
+        'signedTex', 'signedTexMask1D' and 'signedTexFont'; and
+        'signedTexMaskTransform' and 'signedTexMask1DTransform', whose
+        `texTransform` uniform scales and offsets the texture coordinates.
+        """
+        return self._shaderRegistry.register(name, vertexSource, fragmentSource)
+    def getShader(self, name):
+        """Returns the :class:`~psychopy._shadersPyglet.ShaderProgram` with
+        this name. Its `handle` is the GL program (compiled on first use) and
+        its `uniforms` and `attributes` dicts give the locations of the
+        variables in the program, e.g.::
+
+            prog = win.getShader('signedTexMask')
+            GL.glUseProgram(prog.handle)
+            GL.glUniform1i(prog.uniforms['mask'], 1)
+        """
+        return self._shaderRegistry.get(name)
+    #the GL programs for the built-in shaders (as previous versions)
+    _progSignedTexMask = property(lambda self: self.getShader('signedTexMask').handle)
+    _progSignedTex = property(lambda self: self.getShader('signedTex').handle)
+    _progSignedTexMask1D = property(lambda self: self.getShader('signedTexMask1D').handle)
+    _progSignedTexFont = property(lambda self: self.getShader('signedTexFont').handle)
+
     def _setupFrameBuffer(self):
         # Setup framebuffer
         self.frameBuffer = FB.glGenFramebuffersEXT(1)
@@ -1367,15 +1941,15 @@ class _BaseVisualStim:
     def _calcSizeRendered(self):
         """Calculate the size of the stimulus in coords of the :class:`~psychopy.visual.Window` (normalised or pixels)"""
         if self.units in ['norm','pix', 'height']: self._sizeRendered=copy.copy(self.size)
-        elif self.units in ['deg', 'degs']: self._sizeRendered=psychopy.misc.deg2pix(self.size, self.win.monitor)
-        elif self.units=='cm': self._sizeRendered=psychopy.misc.cm2pix(self.size, self.win.monitor)
+        elif self.units in ['deg', 'degs']: self._sizeRendered=self.win.getUnitConverter().deg2pix(self.size)
+        elif self.units=='cm': self._sizeRendered=self.win.getUnitConverter().cm2pix(self.size)
         else:
             logging.ERROR("Stimulus units should be 'height', 'norm', 'deg', 'cm' or 'pix', not '%s'" %self.units)
     def _calcPosRendered(self):
         """Calculate the pos of the stimulus in coords of the :class:`~psychopy.visual.Window` (normalised or pixels)"""
         if self.units in ['norm','pix', 'height']: self._posRendered= copy.copy(self.pos)
-        elif self.units in ['deg', 'degs']: self._posRendered=psychopy.misc.deg2pix(self.pos, self.win.monitor)
-        elif self.units=='cm': self._posRendered=psychopy.misc.cm2pix(self.pos, self.win.monitor)
+        elif self.units in ['deg', 'degs']: self._posRendered=self.win.getUnitConverter().deg2pix(self.pos)
+        elif self.units=='cm': self._posRendered=self.win.getUnitConverter().cm2pix(self.pos)
     def setAutoDraw(self, val, log=True):
         """Add or remove a stimulus from the list of stimuli that will be
         automatically drawn on each flip. You do NOT need to call this on every frame flip!
@@ -1444,9 +2018,9 @@ class _BaseVisualStim:
         elif type(x) in [list, tuple, numpy.ndarray]:
             x, y = x[0], x[1]
         if self.units in ['deg','degs']:
-            x, y = psychopy.misc.deg2pix(numpy.array((x, y)), self.win.monitor)
+            x, y = self.win.getUnitConverter().deg2pix(numpy.array((x, y)))
         elif self.units == 'cm':
-            x, y = psychopy.misc.cm2pix(numpy.array((x, y)), self.win.monitor)
+            x, y = self.win.getUnitConverter().cm2pix(numpy.array((x, y)))
         if self.ori:
             oriRadians = numpy.radians(self.ori)
             sinOri = numpy.sin(oriRadians)
@@ -1470,8 +2044,8 @@ class _BaseVisualStim:
     def overlaps(self, polygon):
         """Determines if this stimulus intersects another one. If `polygon` is
         another stimulus instance, then the vertices and location of that stimulus
-        will be used as the polygon. Overlap detection is only approximate; it
-        can fail with pointy shapes. Returns `True` if the two shapes overlap.
+        will be used as the polygon. Returns `True` if the two shapes overlap
+        (including where only their edges cross).
 
         Note that, if your stimulus uses a mask (such as a Gaussian blob) then
         this is not accounted for by the `overlaps` method; the extent of the
@@ -1670,16 +2244,17 @@ class DotStim(_BaseVisualStim):
 
         self.coherence=round(coherence*self.nDots)/self.nDots#store actual coherence
 
-        self._dotsXY = self._newDotsXY(self.nDots) #initialise a random array of X,Y
+        self._allocDotArrays()
+        self._dotsXY[:] = self._newDotsXY(self.nDots) #initialise a random array of X,Y
         self._dotsSpeed = numpy.ones(self.nDots, 'f')*self.speed#all dots have the same speed
-        self._dotsLife = abs(dotLife)*numpy.random.rand(self.nDots)#abs() means we can ignore the -1 case (no life)
+        self._dotsLife[:] = abs(dotLife)*numpy.random.rand(self.nDots)#abs() means we can ignore the -1 case (no life)
         #determine which dots are signal
-        self._signalDots = numpy.zeros(self.nDots, dtype=bool)
         self._signalDots[0:int(self.coherence*self.nDots)]=True
         #numpy.random.shuffle(self._signalDots)#not really necessary
         #set directions (only used when self.noiseDots='direction')
-        self._dotsDir = numpy.random.rand(self.nDots)*2*pi
+        self._dotsDir[:] = numpy.random.rand(self.nDots)*2*pi
         self._dotsDir[self._signalDots] = self.dir*pi/180
+        self._calcDotsVel()
 
         self._calcFieldCoordsRendered()
         self._update_dotsXY()
@@ -1739,13 +2314,14 @@ class DotStim(_BaseVisualStim):
         """
         self._set('coherence', val, op, log=log)
         self.coherence=round(self.coherence*self.nDots)/self.nDots#store actual coherence rounded by nDots
-        self._signalDots = numpy.zeros(self.nDots, dtype=bool)
+        self._signalDots.fill(False)
         self._signalDots[0:int(self.coherence*self.nDots)]=True
         #for 'direction' method we need to update the direction of the number
         #of signal dots immediately, but for other methods it will be done during updateXY
         if self.noiseDots in ['direction','position']:
-            self._dotsDir=numpy.random.rand(self.nDots)*2*pi
+            self._dotsDir[:]=numpy.random.rand(self.nDots)*2*pi
             self._dotsDir[self._signalDots]=self.dir*pi/180
+            self._calcDotsVel()
     def setDir(self,val, op='', log=True):
         """Change the direction of the signal dots (units in degrees)
         """
@@ -1754,6 +2330,7 @@ class DotStim(_BaseVisualStim):
         self._set('dir', val, op, log=log)
         #dots currently moving in the signal direction also need to update their direction
         self._dotsDir[signalDots] = self.dir*pi/180
+        self._calcDotsVel(signalDots)
     def setSpeed(self,val, op='', log=True):
         """Change the speed of the dots (in stimulus `units` per second)
         """
@@ -1802,6 +2379,39 @@ class DotStim(_BaseVisualStim):
             self.element.setDepth(initialDepth)#reset depth before going to next frame
         GL.glPopMatrix()
 
+    def _allocDotArrays(self):
+        """Allocate the per-dot arrays once, so that updating the dots on each
+        frame can be done in place without creating new arrays
+        """
+        nDots = self.nDots
+        self._dotsXY = numpy.zeros([nDots,2], float)
+        self._dotsDir = numpy.zeros(nDots, float)
+        self._dotsVel = numpy.zeros([nDots,2], float)#unit vectors (cos,sin) of _dotsDir
+        self._dotsLife = numpy.zeros(nDots, float)
+        self._signalDots = numpy.zeros(nDots, dtype=bool)
+        self._noiseDots = numpy.zeros(nDots, dtype=bool)
+        self._deadDots = numpy.zeros(nDots, dtype=bool)
+        self._dotsPerm = numpy.arange(nDots)#reused for shuffling 'different' signal dots
+        #scratch buffers
+        self._scratchXY = numpy.zeros([nDots,2], float)
+        self._scratchOutXY = numpy.zeros([nDots,2], dtype=bool)
+        self._scratchN = numpy.zeros(nDots, float)
+        self._scratchOutN = numpy.zeros(nDots, dtype=bool)
+
+    def _calcDotsVel(self, mask=None):
+        """Update the unit velocity vectors of the dots from their directions.
+
+        Only the dots in `mask` are recalculated (all dots if mask is None) so
+        that dots keeping their direction don't need cos/sin on every frame
+        """
+        if mask is None:
+            numpy.cos(self._dotsDir, out=self._dotsVel[:,0])
+            numpy.sin(self._dotsDir, out=self._dotsVel[:,1])# 0 radians=East!
+        else:
+            dirs = self._dotsDir[mask]
+            self._dotsVel[mask,0] = numpy.cos(dirs)
+            self._dotsVel[mask,1] = numpy.sin(dirs)
+
     def _newDotsXY(self, nDots):
         """Returns a uniform spread of dots, according to the fieldShape and fieldSize
 
@@ -1810,12 +2420,14 @@ class DotStim(_BaseVisualStim):
             dots = self._newDots(nDots)
 
         """
-        if self.fieldShape=='circle':#make more dots than we need and only use those that are within circle
-            while True:#repeat until we have enough
-                new=numpy.random.uniform(-1, 1, [nDots*2,2])#fetch twice as many as needed
-                inCircle= (numpy.hypot(new[:,0],new[:,1])<1)
-                if sum(inCircle)>=nDots:
-                    return new[inCircle,:][:nDots,:]*self.fieldSize/2.0
+        if self.fieldShape=='circle':
+            #sample the unit circle directly (sqrt of the radius keeps the density uniform)
+            radius = numpy.sqrt(numpy.random.uniform(0, 1, nDots))
+            theta = numpy.random.uniform(0, 2*pi, nDots)
+            new = numpy.empty([nDots,2])
+            numpy.multiply(radius, numpy.cos(theta), out=new[:,0])
+            numpy.multiply(radius, numpy.sin(theta), out=new[:,1])
+            return new*self.fieldSize/2.0
         else:
             return numpy.random.uniform(-self.fieldSize/2.0, self.fieldSize/2.0, [nDots,2])
 
@@ -1826,13 +2438,14 @@ class DotStim(_BaseVisualStim):
 
         """Find dead dots, update positions, get new positions for dead and out-of-bounds
         """
+        dead = self._deadDots
         #renew dead dots
         if self.dotLife>0:#if less than zero ignore it
             self._dotsLife -= 1 #decrement. Then dots to be reborn will be negative
-            dead = (self._dotsLife<=0.0)
-            self._dotsLife[dead]=self.dotLife
+            numpy.less_equal(self._dotsLife, 0.0, out=dead)
+            numpy.putmask(self._dotsLife, dead, self.dotLife)
         else:
-            dead=numpy.zeros(self.nDots, dtype=bool)
+            dead.fill(False)
 
         ##update XY based on speed and dir
         #NB self._dotsDir is in radians, but self.dir is in degs
@@ -1840,60 +2453,61 @@ class DotStim(_BaseVisualStim):
         if self.signalDots =='different':
             #  **up to version 1.70.00 this was the other way around, not in keeping with Scase et al**
             #noise and signal dots change identity constantly
-            numpy.random.shuffle(self._dotsDir)
-            self._signalDots = (self._dotsDir==(self.dir*pi/180))#and then update _signalDots from that
+            numpy.random.shuffle(self._dotsPerm)
+            numpy.take(self._dotsDir, self._dotsPerm, out=self._scratchN)
+            self._dotsDir[:] = self._scratchN
+            numpy.take(self._dotsVel, self._dotsPerm, axis=0, out=self._scratchXY)
+            self._dotsVel[:] = self._scratchXY
+            numpy.equal(self._dotsDir, self.dir*pi/180, out=self._signalDots)#and then update _signalDots from that
+        numpy.logical_not(self._signalDots, out=self._noiseDots)
 
         #update the locations of signal and noise
         if self.noiseDots=='walk':
             # noise dots are ~self._signalDots
-            self._dotsDir[~self._signalDots] = numpy.random.rand((~self._signalDots).sum())*pi*2
-            #then update all positions from dir*speed
-            self._dotsXY[:,0] += self.speed*numpy.reshape(numpy.cos(self._dotsDir),(self.nDots,))
-            self._dotsXY[:,1] += self.speed*numpy.reshape(numpy.sin(self._dotsDir),(self.nDots,))# 0 radians=East!
-        elif self.noiseDots == 'direction':
-            #simply use the stored directions to update position
-            self._dotsXY[:,0] += self.speed*numpy.reshape(numpy.cos(self._dotsDir),(self.nDots,))
-            self._dotsXY[:,1] += self.speed*numpy.reshape(numpy.sin(self._dotsDir),(self.nDots,))# 0 radians=East!
+            self._dotsDir[self._noiseDots] = numpy.random.rand(numpy.count_nonzero(self._noiseDots))*pi*2
+            self._calcDotsVel(self._noiseDots)
         elif self.noiseDots=='position':
-            #update signal dots
-            self._dotsXY[self._signalDots,0] += \
-                self.speed*numpy.reshape(numpy.cos(self._dotsDir[self._signalDots]),(self._signalDots.sum(),))
-            self._dotsXY[self._signalDots,1] += \
-                self.speed*numpy.reshape(numpy.sin(self._dotsDir[self._signalDots]),(self._signalDots.sum(),))# 0 radians=East!
-            #update noise dots
-            dead = dead+(~self._signalDots)#just create new ones
+            #noise dots are moved along with the rest but then get new positions anyway
+            numpy.logical_or(dead, self._noiseDots, out=dead)
+        #then update all positions from velocity*speed
+        numpy.multiply(self._dotsVel, self.speed, out=self._scratchXY)
+        numpy.add(self._dotsXY, self._scratchXY, out=self._dotsXY)
 
         #handle boundaries of the field
         if self.fieldShape in  [None, 'square', 'sqr']:
-            dead = dead+(numpy.abs(self._dotsXY[:,0])>(self.fieldSize[0]/2.0))+(numpy.abs
-                                                                                  (self
-                                                                                   ._dotsXY[:,1])>(self.fieldSize[1]/2.0))
+            numpy.absolute(self._dotsXY, out=self._scratchXY)
+            numpy.greater(self._scratchXY, self.fieldSize/2.0, out=self._scratchOutXY)
+            numpy.logical_or(dead, self._scratchOutXY[:,0], out=dead)
+            numpy.logical_or(dead, self._scratchOutXY[:,1], out=dead)
         elif self.fieldShape == 'circle':
-            #transform to a normalised circle (radius = 1 all around) then to polar coords to check
-            normXY = self._dotsXY/(self.fieldSize/2.0)#the normalised XY position (where radius should be <1)
-            dead = dead + (numpy.hypot(normXY[:,0],normXY[:,1])>1) #add out-of-bounds to those that need replacing
+            #transform to a normalised circle (radius = 1 all around) and check the squared radius
+            numpy.divide(self._dotsXY, self.fieldSize/2.0, out=self._scratchXY)
+            numpy.square(self._scratchXY, out=self._scratchXY)
+            numpy.add(self._scratchXY[:,0], self._scratchXY[:,1], out=self._scratchN)
+            numpy.greater(self._scratchN, 1.0, out=self._scratchOutN)
+            numpy.logical_or(dead, self._scratchOutN, out=dead) #add out-of-bounds to those that need replacing
 
         #update any dead dots
-        if sum(dead):
-            self._dotsXY[dead,:] = self._newDotsXY(sum(dead))
+        nDead = numpy.count_nonzero(dead)
+        if nDead:
+            self._dotsXY[dead,:] = self._newDotsXY(nDead)
 
         #update the pixel XY coordinates
         self._calcDotsXYRendered()
 
     def _calcDotsXYRendered(self):
-        if self.units in ['norm','pix', 'height']: self._dotsXYRendered=self._dotsXY
-        elif self.units in ['deg','degs']: self._dotsXYRendered=psychopy.misc.deg2pix(self._dotsXY, self.win.monitor)
-        elif self.units=='cm': self._dotsXYRendered=psychopy.misc.cm2pix(self._dotsXY, self.win.monitor)
+        self._dotsXYRendered=self.win.getUnitConverter().toPix(self._dotsXY, self.units,
+            out=getattr(self, '_dotsXYRendered', None))
     def _calcFieldCoordsRendered(self):
         if self.units in ['norm', 'pix', 'height']:
             self._fieldSizeRendered=self.fieldSize
             self._fieldPosRendered=self.fieldPos
         elif self.units in ['deg', 'degs']:
-            self._fieldSizeRendered=psychopy.misc.deg2pix(self.fieldSize, self.win.monitor)
-            self._fieldPosRendered=psychopy.misc.deg2pix(self.fieldPos, self.win.monitor)
+            self._fieldSizeRendered=self.win.getUnitConverter().deg2pix(self.fieldSize)
+            self._fieldPosRendered=self.win.getUnitConverter().deg2pix(self.fieldPos)
         elif self.units=='cm':
-            self._fieldSizeRendered=psychopy.misc.cm2pix(self.fieldSize, self.win.monitor)
-            self._fieldPosRendered=psychopy.misc.cm2pix(self.fieldPos, self.win.monitor)
+            self._fieldSizeRendered=self.win.getUnitConverter().cm2pix(self.fieldSize)
+            self._fieldPosRendered=self.win.getUnitConverter().cm2pix(self.fieldPos)
 
 class SimpleImageStim:
     """A simple stimulus for loading images from a file and presenting at exactly
@@ -2007,6 +2621,12 @@ class SimpleImageStim:
         if val!=self._useShaders:
             self._useShaders=val
             self.setImage()
+    def preloadImages(self, images):
+        """Decode image files that this stimulus will show later, in
+        background threads, so that setImage() doesn't have to (see
+        :class:`ImageCache`). Returns straight away.
+        """
+        self.win.getImageCache().preload(images, 'pixels')
     def _updateImageStr(self):
         self._imStr=self.imArray.tostring()
         self._needStrUpdate=False
@@ -2085,8 +2705,8 @@ class SimpleImageStim:
     def _calcPosRendered(self):
         """Calculate the pos of the stimulus in coords of the :class:`~psychopy.visual.Window` (normalised or pixels)"""
         if self.units in ['pix', 'pixels', 'height', 'norm']: self._posRendered=self.pos
-        elif self.units in ['deg', 'degs']: self._posRendered=psychopy.misc.deg2pix(self.pos, self.win.monitor)
-        elif self.units=='cm': self._posRendered=psychopy.misc.cm2pix(self.pos, self.win.monitor)
+        elif self.units in ['deg', 'degs']: self._posRendered=self.win.getUnitConverter().deg2pix(self.pos)
+        elif self.units=='cm': self._posRendered=self.win.getUnitConverter().cm2pix(self.pos)
     def setImage(self,filename=None, log=True):
         """Set the image to be drawn.
 
@@ -2101,8 +2721,11 @@ class SimpleImageStim:
         #is a string - see if it points to a file
             if os.path.isfile(filename):
                 self.filename=filename
-                im = Image.open(self.filename)
-                im = im.transpose(Image.FLIP_TOP_BOTTOM)
+                #perhaps already decoded by the window's ImageCache
+                if self.win._imageCache is not None:
+                    decoded = self.win._imageCache.decode(filename, 'pixels')
+                else:
+                    decoded = _decodeImageFile(filename, 'pixels')
             else:
                 logging.error("couldn't find image...%s" %(filename))
                 core.quit()
@@ -2116,14 +2739,13 @@ class SimpleImageStim:
                 core.quit()
                 raise #ensure we quit
             self.filename = repr(filename) #'<Image.Image image ...>'
+            decoded = _imagePixels(im)
 
-        self.size = im.size
         #set correct formats for bytes/floats
-        if im.mode=='RGBA':
-            self.imArray = numpy.array(im).astype(numpy.float32)/255
+        self.imArray, self.size = decoded
+        if self.imArray.shape[2]==4:
             self.internalFormat = GL.GL_RGBA
         else:
-            self.imArray = numpy.array(im.convert("RGB")).astype(numpy.float32)/255
             self.internalFormat = GL.GL_RGB
         self.dataType = GL.GL_FLOAT
         self._needStrUpdate = True
@@ -2369,7 +2991,8 @@ class GratingStim(_BaseVisualStim):
 
     def setSF(self,value,operation='', log=True):
         self._set('sf', value, operation, log=log)
-        self.needUpdate = 1
+        if not self._useShaders:#with shaders sf is applied in draw()
+            self.needUpdate = 1
         self._calcCyclesPerStim()
         self._requestedSf=value#to track whether we're just using a default value
     def _setSfToDefault(self):
@@ -2395,8 +3018,8 @@ class GratingStim(_BaseVisualStim):
         else:
             #we have an image - calculate the size in `units` that matches original pixel size
             if self.units=='pix': self.size=numpy.array(self.origSize)
-            elif self.units=='deg': self.size= psychopy.misc.pix2deg(numpy.array(self.origSize, float), self.win.monitor)
-            elif self.units=='cm': self.size= psychopy.misc.pix2cm(numpy.array(self.origSize, float), self.win.monitor)
+            elif self.units=='deg': self.size= self.win.getUnitConverter().pix2deg(numpy.array(self.origSize, float))
+            elif self.units=='cm': self.size= self.win.getUnitConverter().pix2cm(numpy.array(self.origSize, float))
             elif self.units=='norm': self.size= 2*numpy.array(self.origSize, float)/self.win.size
             elif self.units=='height': self.size= numpy.array(self.origSize, float)/self.win.size[1]
         #set it
@@ -2406,7 +3029,8 @@ class GratingStim(_BaseVisualStim):
         self.needUpdate=True
     def setPhase(self,value, operation='', log=True):
         self._set('phase', value, operation, log=log)
-        self.needUpdate = 1
+        if not self._useShaders:#with shaders phase is applied in draw()
+            self.needUpdate = 1
     def setTex(self,value, log=True):
         self._texName = value
         createTexture(value, id=self.texID, pixFormat=GL.GL_RGB, stim=self,
@@ -2450,11 +3074,28 @@ class GratingStim(_BaseVisualStim):
         GL.glColor4f(desiredRGB[0],desiredRGB[1],desiredRGB[2], self.opacity)
 
         if self.needUpdate: self._updateList()
+        if self._useShaders:
+            self._setTexTransform()
         GL.glCallList(self._listID)
 
         #return the view to previous state
         GL.glPopMatrix()
 
+    def _getTexTransform(self):
+        """The (xScale, yScale, xOffset, yOffset) that maps the texture coords
+        of the vertices (-0.5 to 0.5) to the cycles and phase of the grating
+        """
+        return (self._cycles[0], self._cycles[1], 0.5-self.phase[0], 0.5-self.phase[1])
+    def _setTexTransform(self):
+        """Sets the texTransform uniform of the shader program (which the
+        display list then uses), so that phase and sf changes don't need the
+        list to be rebuilt
+        """
+        prog = self.win.getShader('signedTexMaskTransform')
+        GL.glUseProgram(prog.handle)
+        xScale, yScale, xOffset, yOffset = self._getTexTransform()
+        GL.glUniform4f(prog.uniforms['texTransform'], xScale, yScale, xOffset, yOffset)
+
     def _updateListShaders(self):
         """
         The user shouldn't need this method since it gets called
@@ -2465,10 +3106,11 @@ class GratingStim(_BaseVisualStim):
         """
         self.needUpdate=0
         GL.glNewList(self._listID,GL.GL_COMPILE)
-        #setup the shaderprogram
-        GL.glUseProgram(self.win._progSignedTexMask)
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "texture"), 0) #set the texture to be texture unit 0
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "mask"), 1)  # mask is texture unit 1
+        #setup the shaderprogram (the phase and sf are set by _setTexTransform)
+        prog = self.win.getShader('signedTexMaskTransform')
+        GL.glUseProgram(prog.handle)
+        GL.glUniform1i(prog.uniforms['texture'], 0) #set the texture to be texture unit 0
+        GL.glUniform1i(prog.uniforms['mask'], 1)  # mask is texture unit 1
         #mask
         GL.glActiveTexture(GL.GL_TEXTURE1)
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.maskID)
@@ -2484,10 +3126,8 @@ class GratingStim(_BaseVisualStim):
         T =  self._sizeRendered[1]/2
         B = -self._sizeRendered[1]/2
         #depth = self.depth
-        Ltex = -self._cycles[0]/2 - self.phase[0]+0.5
-        Rtex = +self._cycles[0]/2 - self.phase[0]+0.5
-        Ttex = +self._cycles[1]/2 - self.phase[1]+0.5
-        Btex = -self._cycles[1]/2 - self.phase[1]+0.5
+        Ltex = Btex = -0.5#scaled and offset by the shader (see _getTexTransform)
+        Rtex = Ttex = 0.5
         Lmask=Bmask= 0.0; Tmask=Rmask=1.0#mask
 
         GL.glBegin(GL.GL_QUADS)                  # draw a 4 sided polygon
@@ -2588,8 +3228,8 @@ class GratingStim(_BaseVisualStim):
         As of v1.61.00 this is called automatically during garbage collection of
         your stimulus, so doesn't need calling explicitly by the user.
         """
-        GL.glDeleteTextures(1, self.texID)
-        GL.glDeleteTextures(1, self.maskID)
+        self.win._textureCache.delete(self.texID)
+        self.win._textureCache.delete(self.maskID)
 
     def _calcCyclesPerStim(self):
         if self.units in ['norm', 'height']: self._cycles=self.sf#this is the only form of sf that is not size dependent
@@ -2776,7 +3416,7 @@ class RadialStim(GratingStim):
         self._calcPosRendered()
         self._calcSizeRendered()#must be done BEFORE _updateXY
 
-        self._updateTextureCoords()
+        self._updateTextureCoords()#cycles and phases are applied when drawing
         self._updateMaskCoords()
         self._updateXY()
         if not self._useShaders:
@@ -2792,23 +3432,19 @@ class RadialStim(GratingStim):
     def setAngularCycles(self,value,operation='', log=True):
         """set the number of cycles going around the stimulus"""
         self._set('angularCycles', value, operation, log=log)
-        self._updateTextureCoords()
-        self.needUpdate=True
+        self.needUpdate=True#only needed without shaders
     def setRadialCycles(self,value,operation='', log=True):
         """set the number of texture cycles from centre to periphery"""
         self._set('radialCycles', value, operation, log=log)
-        self._updateTextureCoords()
-        self.needUpdate=True
+        self.needUpdate=True#only needed without shaders
     def setAngularPhase(self,value, operation='', log=True):
         """set the angular phase of the texture (radians)"""
         self._set('angularPhase', value, operation, log=log)
-        self._updateTextureCoords()
-        self.needUpdate=True
+        self.needUpdate=True#only needed without shaders
     def setRadialPhase(self,value, operation='', log=True):
         """set the radial phase of the texture (radians)"""
         self._set('radialPhase', value, operation, log=log)
-        self._updateTextureCoords()
-        self.needUpdate=True
+        self.needUpdate=True#only needed without shaders
 
     def draw(self, win=None):
         """
@@ -2850,9 +3486,12 @@ class RadialStim(GratingStim):
             GL.glEnable(GL.GL_TEXTURE_1D)
 
             #setup the shaderprogram
-            GL.glUseProgram(self.win._progSignedTexMask1D)
-            GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask1D, "texture"), 0) #set the texture to be texture unit 0
-            GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask1D, "mask"), 1)  # mask is texture unit 1
+            prog = self.win.getShader('signedTexMask1DTransform')
+            GL.glUseProgram(prog.handle)
+            GL.glUniform1i(prog.uniforms['texture'], 0) #set the texture to be texture unit 0
+            GL.glUniform1i(prog.uniforms['mask'], 1)  # mask is texture unit 1
+            xScale, yScale, xOffset, yOffset = self._getTexTransform()
+            GL.glUniform4f(prog.uniforms['texTransform'], xScale, yScale, xOffset, yOffset)
 
             #set pointers to visible textures
             GL.glClientActiveTexture(GL.GL_TEXTURE0)
@@ -2902,16 +3541,28 @@ class RadialStim(GratingStim):
         self._visibleXY = self._visibleXY.reshape(self._nVisible,2)
 
     def _updateTextureCoords(self):
-        #calculate texture coordinates if angularCycles or Phase change
+        """Update if angularRes or visibleWedge change.
+        The coords are fractions of a revolution (x) and of the radius (y); the
+        cycles and phases are applied to them when drawing (_getTexTransform)"""
         self._textureCoords = numpy.zeros([self.angularRes, 3, 2])
-        self._textureCoords[:,0,0] = (self._angles+self._triangleWidth/2)*self.angularCycles/(2*pi)+self.angularPhase #x position of inner vertex
-        self._textureCoords[:,0,1] = 0.25+-self.radialPhase #y position of inner vertex
-        self._textureCoords[:,1,0] = (self._angles)*self.angularCycles/(2*pi)+self.angularPhase #x position of 1st outer vertex
-        self._textureCoords[:,1,1] = 0.25+self.radialCycles-self.radialPhase#y position of 1st outer vertex
-        self._textureCoords[:,2,0] = (self._angles+self._triangleWidth)*self.angularCycles/(2*pi)+self.angularPhase#x position of 2nd outer vertex
-        self._textureCoords[:,2,1] = 0.25+self.radialCycles-self.radialPhase#y position of 2nd outer vertex
+        self._textureCoords[:,0,0] = (self._angles+self._triangleWidth/2)/(2*pi) #x position of inner vertex
+        self._textureCoords[:,1,0] = (self._angles)/(2*pi) #x position of 1st outer vertex
+        self._textureCoords[:,2,0] = (self._angles+self._triangleWidth)/(2*pi)#x position of 2nd outer vertex
+        self._textureCoords[:,1:,1] = 1.0#y position of outer vertices
         self._visibleTexture = self._textureCoords[self._visible,:,:].reshape(self._nVisible,2)
 
+    def _getTexTransform(self):
+        """The (xScale, yScale, xOffset, yOffset) that maps the texture coords
+        of the vertices to the cycles and phases of the stimulus
+        """
+        return (self.angularCycles, self.radialCycles, self.angularPhase, 0.25-self.radialPhase)
+    def _getTransformedTextureCoords(self):
+        """The texture coords with the cycles and phases applied (for the
+        display lists, which are only used without shaders)
+        """
+        xScale, yScale, xOffset, yOffset = self._getTexTransform()
+        return self._visibleTexture*[xScale, yScale]+[xOffset, yOffset]
+
     def _updateMaskCoords(self):
         #calculate mask coords
         self._maskCoords = numpy.zeros([self.angularRes,3]) + self.maskRadialPhase
@@ -2934,13 +3585,15 @@ class RadialStim(GratingStim):
         GL.glVertexPointer(2, GL.GL_FLOAT, 0, arrPointer)
 
         #setup the shaderprogram
-        GL.glUseProgram(self.win._progSignedTexMask1D)
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask1D, "texture"), 0) #set the texture to be texture unit 0
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask1D, "mask"), 1)  # mask is texture unit 1
+        prog = self.win.getShader('signedTexMask1D')
+        GL.glUseProgram(prog.handle)
+        GL.glUniform1i(prog.uniforms['texture'], 0) #set the texture to be texture unit 0
+        GL.glUniform1i(prog.uniforms['mask'], 1)  # mask is texture unit 1
 
         #set pointers to visible textures
         GL.glClientActiveTexture(GL.GL_TEXTURE0)
-        arrPointer = self._visibleTexture.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+        self._listTexture = self._getTransformedTextureCoords()
+        arrPointer = self._listTexture.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
         GL.glTexCoordPointer(2, GL.GL_FLOAT, 0, arrPointer)
         GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
         #then bind main texture
@@ -3005,7 +3658,8 @@ class RadialStim(GratingStim):
         GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
         #texture
         GL.glClientActiveTextureARB(GL.GL_TEXTURE0_ARB)
-        GL.glTexCoordPointer(2, GL.GL_DOUBLE, 0,self._visibleTexture.ctypes)
+        self._listTexture = self._getTransformedTextureCoords()
+        GL.glTexCoordPointer(2, GL.GL_DOUBLE, 0,self._listTexture.ctypes)
         GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
 
         #do the drawing
@@ -3077,6 +3731,7 @@ class RadialStim(GratingStim):
         #do the openGL binding
         if self.interpolate: smoothing=GL.GL_LINEAR
         else: smoothing=GL.GL_NEAREST
+        self.win._textureCache.makePrivate(self.maskID)
         GL.glBindTexture(GL.GL_TEXTURE_1D, self.maskID)
         GL.glTexImage1D(GL.GL_TEXTURE_1D, 0, GL.GL_ALPHA,
                         res, 0,
@@ -3102,8 +3757,8 @@ class RadialStim(GratingStim):
         As of v1.61.00 this is called automatically during garbage collection of
         your stimulus, so doesn't need calling explicitly by the user.
         """
-        GL.glDeleteTextures(1, self.texID)
-        GL.glDeleteTextures(1, self.maskID)
+        self.win._textureCache.delete(self.texID)
+        self.win._textureCache.delete(self.maskID)
 
 class ElementArrayStim:
     """
@@ -3137,6 +3792,7 @@ class ElementArrayStim:
                  elementMask='gauss',
                  texRes=48,
                  interpolate=True,
+                 useVBO=False,
                  name='', autoLog=True):
 
         """
@@ -3218,6 +3874,13 @@ class ElementArrayStim:
                 the number of pixels in the textures (overridden if an array
                 or image is provided)
 
+            useVBO : True or *False*
+                If True the element attributes are stored in vertex buffer
+                objects on the graphics card and only the attributes that
+                have changed (e.g. just the vertices after setOris) are
+                uploaded again. Recommended for large arrays that change on
+                every frame (requires OpenGL1.5).
+
             name : string
                 The name of the objec to be using during logged messages about
                 this stim
@@ -3245,6 +3908,8 @@ class ElementArrayStim:
         self.phases = phases
         self.needVertexUpdate=True
         self.needColorUpdate=True
+        self.needTexCoordUpdate=True
+        self._needCornerUpdate=True
         self._useShaders=True
         self.interpolate=interpolate
         self.fieldDepth=fieldDepth
@@ -3253,6 +3918,8 @@ class ElementArrayStim:
             raise TypeError('ElementArrayStim requires a pyglet context')
         if not self.win._haveShaders:
             raise Exception("ElementArrayStim requires shaders support and floating point textures")
+        self.useVBO=useVBO
+        self._allocElementArrays()
 
         self.colorSpace=colorSpace
         if rgbs!=None:
@@ -3357,6 +4024,7 @@ class ElementArrayStim:
             self.oris=value
         else: exec('self.oris'+operation+'=value')
         self.needVertexUpdate=True
+        self._needCornerUpdate=True
         if log and self.autoLog:
             self.win.logOnFlip("Set %s oris=%s" %(self.name, type(value)),
                 level=logging.EXP,obj=self)
@@ -3393,6 +4061,7 @@ class ElementArrayStim:
         if operation=='':
             self.sfs=value
         else: exec('self.sfs'+operation+'=value')
+        self.needTexCoordUpdate=True
         if log and self.autoLog:
             self.win.logOnFlip("Set %s sfs=%s" %(self.name, type(value)),
                 level=logging.EXP,obj=self)
@@ -3448,6 +4117,7 @@ class ElementArrayStim:
         else: exec('self.sizes'+operation+'=value')
         self._calcSizesRendered()
         self.needVertexUpdate=True
+        self._needCornerUpdate=True
         self.needTexCoordUpdate=True
 
         if log and self.autoLog:
@@ -3626,6 +4296,9 @@ class ElementArrayStim:
         if self.needTexCoordUpdate:
             self.updateTextureCoords()
 
+        if self.useVBO:
+            self._uploadDirtyBuffers()
+
         #scale the drawing frame and get to centre of field
         GL.glPushMatrix()#push before drawing, pop after
         GL.glPushClientAttrib(GL.GL_CLIENT_ALL_ATTRIB_BITS)#push the data for client attributes
@@ -3635,13 +4308,14 @@ class ElementArrayStim:
 
         GL.glTranslatef(self._fieldPosRendered[0],self._fieldPosRendered[1],0)
 
-        GL.glColorPointer(4, GL.GL_DOUBLE, 0, self._RGBAs.ctypes.data_as(ctypes.POINTER(ctypes.c_double)))
-        GL.glVertexPointer(3, GL.GL_DOUBLE, 0, self._visXYZvertices.ctypes.data_as(ctypes.POINTER(ctypes.c_double)))
+        GL.glColorPointer(4, GL.GL_FLOAT, 0, self._attribPointer('_RGBAs'))
+        GL.glVertexPointer(3, GL.GL_FLOAT, 0, self._attribPointer('_visXYZvertices'))
 
         #setup the shaderprogram
-        GL.glUseProgram(self.win._progSignedTexMask)
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "texture"), 0) #set the texture to be texture unit 0
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "mask"), 1)  # mask is texture unit 1
+        prog = self.win.getShader('signedTexMask')
+        GL.glUseProgram(prog.handle)
+        GL.glUniform1i(prog.uniforms['texture'], 0) #set the texture to be texture unit 0
+        GL.glUniform1i(prog.uniforms['mask'], 1)  # mask is texture unit 1
 
         #bind textures
         GL.glActiveTexture (GL.GL_TEXTURE1)
@@ -3653,11 +4327,13 @@ class ElementArrayStim:
 
         #setup client texture coordinates first
         GL.glClientActiveTexture (GL.GL_TEXTURE0)
-        GL.glTexCoordPointer (2, GL.GL_DOUBLE, 0, self._texCoords.ctypes)
+        GL.glTexCoordPointer (2, GL.GL_FLOAT, 0, self._attribPointer('_texCoords'))
         GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
         GL.glClientActiveTexture (GL.GL_TEXTURE1)
-        GL.glTexCoordPointer (2, GL.GL_DOUBLE, 0, self._maskCoords.ctypes)
+        GL.glTexCoordPointer (2, GL.GL_FLOAT, 0, self._attribPointer('_maskCoords'))
         GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        if self.useVBO:
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)#the pointers keep their buffers
 
         GL.glEnableClientState(GL.GL_COLOR_ARRAY)
         GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
@@ -3681,75 +4357,128 @@ class ElementArrayStim:
         GL.glPopMatrix()
 
     def _calcSizesRendered(self):
-        if self.units in ['norm','pix', 'height']: self._sizesRendered=self.sizes
-        elif self.units in ['deg', 'degs']: self._sizesRendered=psychopy.misc.deg2pix(self.sizes, self.win.monitor)
-        elif self.units=='cm': self._sizesRendered=psychopy.misc.cm2pix(self.sizes, self.win.monitor)
+        self._sizesRendered=self.win.getUnitConverter().toPix(self.sizes, self.units,
+            out=getattr(self, '_sizesRendered', None))
     def _calcXYsRendered(self):
-        if self.units in ['norm','pix','height']: self._XYsRendered=self.xys
-        elif self.units in ['deg', 'degs']: self._XYsRendered=psychopy.misc.deg2pix(self.xys, self.win.monitor)
-        elif self.units=='cm': self._XYsRendered=psychopy.misc.cm2pix(self.xys, self.win.monitor)
+        self._XYsRendered=self.win.getUnitConverter().toPix(self.xys, self.units,
+            out=getattr(self, '_XYsRendered', None))
     def _calcFieldCoordsRendered(self):
         if self.units in ['norm', 'pix','height']:
             self._fieldSizeRendered=self.fieldSize
             self._fieldPosRendered=self.fieldPos
         elif self.units in ['deg', 'degs']:
-            self._fieldSizeRendered=psychopy.misc.deg2pix(self.fieldSize, self.win.monitor)
-            self._fieldPosRendered=psychopy.misc.deg2pix(self.fieldPos, self.win.monitor)
+            self._fieldSizeRendered=self.win.getUnitConverter().deg2pix(self.fieldSize)
+            self._fieldPosRendered=self.win.getUnitConverter().deg2pix(self.fieldPos)
         elif self.units=='cm':
-            self._fieldSizeRendered=psychopy.misc.cm2pix(self.fieldSize, self.win.monitor)
-            self._fieldPosRendered=psychopy.misc.cm2pix(self.fieldPos, self.win.monitor)
+            self._fieldSizeRendered=self.win.getUnitConverter().cm2pix(self.fieldSize)
+            self._fieldPosRendered=self.win.getUnitConverter().cm2pix(self.fieldPos)
 
-    def updateElementVertices(self):
-        self._calcXYsRendered()
+    def _allocElementArrays(self):
+        """Allocate the (float32) arrays of per-vertex attributes once and, if
+        useVBO is True, a vertex buffer object for each of them
+        """
+        N=self.nElements
+        self._visXYZvertices=numpy.zeros([N,4,3],numpy.float32)
+        self._elementCorners=numpy.zeros([N,4,2],float)#vertices relative to each element centre
+        self._RGBAs=numpy.zeros([N,4,4],numpy.float32)
+        self._texCoords=numpy.zeros([N,4,2],numpy.float32)
+        self._maskCoords=numpy.array([[0,1],[1,1],[1,0],[0,0]],numpy.float32).reshape([1,4,2]).repeat(N,0)
+        self._dirtyBuffers=set(['_visXYZvertices','_RGBAs','_texCoords','_maskCoords'])
+        self._vbos={}
+        if self.useVBO:
+            for name in self._dirtyBuffers:
+                data=getattr(self,name)
+                vbo=GL.GLuint()
+                GL.glGenBuffers(1, ctypes.byref(vbo))
+                GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
+                GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data.ctypes.data_as(ctypes.c_void_p), GL.GL_DYNAMIC_DRAW)
+                self._vbos[name]=vbo
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+            self._dirtyBuffers.clear()
+
+    def _uploadDirtyBuffers(self):
+        """Upload only the attribute arrays that have changed since the last draw"""
+        for name in self._dirtyBuffers:
+            data=getattr(self,name)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._vbos[name])
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, data.nbytes, data.ctypes.data_as(ctypes.c_void_p))
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        self._dirtyBuffers.clear()
+
+    def _attribPointer(self, name):
+        """Returns the pointer to be given to glVertexPointer etc for one of
+        the attribute arrays (for VBOs this binds the buffer and returns an
+        offset of zero)
+        """
+        if self.useVBO:
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._vbos[name])
+            return None
+        return getattr(self,name).ctypes.data_as(ctypes.POINTER(ctypes.c_float))
 
-        self._visXYZvertices=numpy.zeros([self.nElements , 4, 3],'d')
-        wx = self._sizesRendered[:,0]*numpy.cos(self.oris[:]*numpy.pi/180)/2
-        wy = self._sizesRendered[:,0]*numpy.sin(self.oris[:]*numpy.pi/180)/2
-        hx = self._sizesRendered[:,1]*numpy.sin(self.oris[:]*numpy.pi/180)/2
-        hy = -self._sizesRendered[:,1]*numpy.cos(self.oris[:]*numpy.pi/180)/2
+    def _updateElementCorners(self):
+        """Calculate the vertices of each element relative to its centre
+        (only needed when oris or sizes change)
+        """
+        oris = numpy.reshape(self.oris, [-1])*numpy.pi/180
+        cosOri = numpy.cos(oris)
+        sinOri = numpy.sin(oris)
+        wx = self._sizesRendered[:,0]*cosOri/2
+        wy = self._sizesRendered[:,0]*sinOri/2
+        hx = self._sizesRendered[:,1]*sinOri/2
+        hy = -self._sizesRendered[:,1]*cosOri/2
 
+        corners = self._elementCorners
         #X
-        self._visXYZvertices[:,0,0] = self._XYsRendered[:,0] -wx + hx#TopL
-        self._visXYZvertices[:,1,0] = self._XYsRendered[:,0] +wx + hx#TopR
-        self._visXYZvertices[:,2,0] = self._XYsRendered[:,0] +wx - hx#BotR
-        self._visXYZvertices[:,3,0] = self._XYsRendered[:,0] -wx - hx#BotL
-
+        corners[:,0,0] = -wx + hx#TopL
+        corners[:,1,0] = +wx + hx#TopR
+        corners[:,2,0] = +wx - hx#BotR
+        corners[:,3,0] = -wx - hx#BotL
         #Y
-        self._visXYZvertices[:,0,1] = self._XYsRendered[:,1] -wy + hy
-        self._visXYZvertices[:,1,1] = self._XYsRendered[:,1] +wy + hy
-        self._visXYZvertices[:,2,1] = self._XYsRendered[:,1] +wy - hy
-        self._visXYZvertices[:,3,1] = self._XYsRendered[:,1] -wy - hy
+        corners[:,0,1] = -wy + hy
+        corners[:,1,1] = +wy + hy
+        corners[:,2,1] = +wy - hy
+        corners[:,3,1] = -wy - hy
+
+        self._needCornerUpdate=False
 
+    def updateElementVertices(self):
+        """Update self._visXYZvertices from the xys (and oris and sizes if they
+        have changed). Not needed by the user (simply call setXYs() etc.)
+        """
+        if self._needCornerUpdate:
+            self._updateElementCorners()
+        self._calcXYsRendered()
+
+        xys = numpy.reshape(self._XYsRendered, [-1,1,2])
+        numpy.add(self._elementCorners, xys, out=self._visXYZvertices[:,:,0:2])
         #depth
-        self._visXYZvertices[:,:,2] = numpy.tile(self.depths,(1,4)) + self.fieldDepth
+        self._visXYZvertices[:,:,2] = numpy.reshape(self.depths, [-1,1]) + self.fieldDepth
 
+        self._dirtyBuffers.add('_visXYZvertices')
         self.needVertexUpdate=False
 
     #----------------------------------------------------------------------
     def updateElementColors(self):
-        """Create a new array of self._RGBAs based on self.rgbs. Not needed by the
+        """Update the array of self._RGBAs based on self.rgbs. Not needed by the
         user (simple call setColors())
 
         For element arrays the self.rgbs values correspond to one element so
         this function also converts them to be one for each vertex of each element
         """
         N=self.nElements
-        self._RGBAs=numpy.zeros([N,4],'d')
+        contrs = numpy.reshape(self.contrs, [N,1])
         if self.colorSpace in ['rgb','dkl','lms','hsv']: #these spaces are 0-centred
-            self._RGBAs[:,0:3] = self.rgbs[:,:] * self.contrs[:].reshape([N,1]).repeat(3,1)/2+0.5
+            rgbs = self.rgbs * contrs/2+0.5
         else:
-            self._RGBAs[:,0:3] = self.rgbs * self.contrs[:].reshape([N,1]).repeat(3,1)/255.0
-        self._RGBAs[:,-1] = self.opacities.reshape([N,])
-        self._RGBAs=self._RGBAs.reshape([N,1,4]).repeat(4,1)#repeat for the 4 vertices in the grid
+            rgbs = self.rgbs * contrs/255.0
+        self._RGBAs[:,:,0:3] = rgbs.reshape([N,1,3])#the same for the 4 vertices of each element
+        self._RGBAs[:,:,3] = numpy.reshape(self.opacities, [N,1])
 
+        self._dirtyBuffers.add('_RGBAs')
         self.needColorUpdate=False
 
     def updateTextureCoords(self):
-        """Create a new array of self._maskCoords"""
-
-        N=self.nElements
-        self._maskCoords=numpy.array([[0,1],[1,1],[1,0],[0,0]],'d').reshape([1,4,2])
-        self._maskCoords = self._maskCoords.repeat(N,0)
+        """Update the array of self._texCoords"""
 
         #for the main texture
         if self.units in ['norm', 'pix', 'height']:#sf is dependent on size (openGL default)
@@ -3763,9 +4492,14 @@ class ElementArrayStim:
             T = +self.sfs[:,1]*self.sizes[:,1]/2 - self.phases[:,1]+0.5
             B = -self.sfs[:,1]*self.sizes[:,1]/2 - self.phases[:,1]+0.5
 
-        #self._texCoords=numpy.array([[1,1],[1,0],[0,0],[0,1]],'d').reshape([1,4,2])
-        self._texCoords=numpy.concatenate([[L,T],[R,T],[R,B],[L,B]]) \
-            .transpose().reshape([N,4,2]).astype('d')
+        #vertices are TopL, TopR, BotR, BotL
+        texCoords = self._texCoords
+        texCoords[:,0,0] = L; texCoords[:,0,1] = T
+        texCoords[:,1,0] = R; texCoords[:,1,1] = T
+        texCoords[:,2,0] = R; texCoords[:,2,1] = B
+        texCoords[:,3,0] = L; texCoords[:,3,1] = B
+
+        self._dirtyBuffers.add('_texCoords')
         self.needTexCoordUpdate=False
 
     def setTex(self,value, log=True):
@@ -3795,8 +4529,11 @@ class ElementArrayStim:
         As of v1.61.00 this is called automatically during garbage collection of
         your stimulus, so doesn't need calling explicitly by the user.
         """
-        GL.glDeleteTextures(1, self.texID)
-        GL.glDeleteTextures(1, self.maskID)
+        self.win._textureCache.delete(self.texID)
+        self.win._textureCache.delete(self.maskID)
+        for vbo in self._vbos.values():
+            GL.glDeleteBuffers(1, ctypes.byref(vbo))
+        self._vbos={}
 
 class MovieStim(_BaseVisualStim):
     """A stimulus class for playing movies (mpeg, avi, etc...) in PsychoPy.
@@ -3877,7 +4614,7 @@ class MovieStim(_BaseVisualStim):
         """
         _BaseVisualStim.__init__(self, win, units=units, name=name, autoLog=autoLog)
 
-        if not havePygletMedia:
+        if not isAvailable(media):
             raise ImportError, """pyglet.media is needed for MovieStim and could not be imported.
                 This can occur for various reasons;
                     - psychopy.visual was imported too late (after a lib that uses scipy)
@@ -3885,7 +4622,7 @@ class MovieStim(_BaseVisualStim):
                     - avbin is not installed
             """
         self._movie=None # the actual pyglet media object
-        self._player=pyglet.media.ManagedSoundPlayer()
+        self._player=media.ManagedSoundPlayer()
         self._player._on_eos=self._onEos
         self.filename=filename
         self.duration=None
@@ -3937,7 +4674,7 @@ class MovieStim(_BaseVisualStim):
         duration (in seconds).
         """
         try:
-            self._movie = pyglet.media.load(filename, streaming=True)
+            self._movie = media.load(filename, streaming=True)
         except Exception, e:
             # pyglet.media.riff is N/A if avbin is available, and then
             # actual exception would get masked with a new one for unknown
@@ -4160,7 +4897,7 @@ class TextStim(_BaseVisualStim):
         self.depth=depth
         self.ori=ori
         self.wrapWidth=wrapWidth
-        self._pygletTextObj=None
+        self._textLayout=None
 
         self.pos= numpy.array(pos, float)
 
@@ -4168,11 +4905,11 @@ class TextStim(_BaseVisualStim):
         if self.units=='cm':
             if height==None: self.height = 1.0#default text height
             else: self.height = height
-            self.heightPix = psychopy.misc.cm2pix(self.height, win.monitor)
+            self.heightPix = win.getUnitConverter().cm2pix(self.height)
         elif self.units in ['deg', 'degs']:
             if height==None: self.height = 1.0
             else: self.height = height
-            self.heightPix = psychopy.misc.deg2pix(self.height, win.monitor)
+            self.heightPix = win.getUnitConverter().deg2pix(self.height)
         elif self.units=='norm':
             if height==None: self.height = 0.1
             else: self.height = height
@@ -4193,8 +4930,8 @@ class TextStim(_BaseVisualStim):
             elif self.units in ['pix', 'pixels']: self.wrapWidth=500
         if self.units=='norm': self._wrapWidthPix= self.wrapWidth*win.size[0]/2
         elif self.units=='height': self._wrapWidthPix= self.wrapWidth*win.size[0]
-        elif self.units in ['deg', 'degs']: self._wrapWidthPix= psychopy.misc.deg2pix(self.wrapWidth, win.monitor)
-        elif self.units=='cm': self._wrapWidthPix= psychopy.misc.cm2pix(self.wrapWidth, win.monitor)
+        elif self.units in ['deg', 'degs']: self._wrapWidthPix= win.getUnitConverter().deg2pix(self.wrapWidth)
+        elif self.units=='cm': self._wrapWidthPix= win.getUnitConverter().cm2pix(self.wrapWidth)
         elif self.units in ['pix', 'pixels']: self._wrapWidthPix=self.wrapWidth
 
         #generate the texture and list holders
@@ -4224,11 +4961,11 @@ class TextStim(_BaseVisualStim):
         if self.units=='cm':
             if height==None: self.height = 1.0#default text height
             else: self.height = height
-            self.heightPix = psychopy.misc.cm2pix(self.height, self.win.monitor)
+            self.heightPix = self.win.getUnitConverter().cm2pix(self.height)
         elif self.units in ['deg', 'degs']:
             if height==None: self.height = 1.0
             else: self.height = height
-            self.heightPix = psychopy.misc.deg2pix(self.height, self.win.monitor)
+            self.heightPix = self.win.getUnitConverter().deg2pix(self.height)
         elif self.units=='norm':
             if height==None: self.height = 0.1
             else: self.height = height
@@ -4367,19 +5104,7 @@ class TextStim(_BaseVisualStim):
         """Set the text to be rendered using the current font
         """
         if self.win.winType=="pyglet":
-            self._pygletTextObj = pyglet.font.Text(self._font, self.text,
-                                                       halign=self.alignHoriz, valign=self.alignVert,
-                                                       color = (1.0,1.0,1.0, self.opacity),
-                                                       width=self._wrapWidthPix)#width of the frame
-#            self._pygletTextObj = pyglet.text.Label(self.text,self.fontname, int(self.heightPix),
-#                                                       anchor_x=self.alignHoriz, anchor_y=self.alignVert,#the point we rotate around
-#                                                       halign=self.alignHoriz,
-#                                                       color = (int(127.5*self.rgb[0]+127.5),
-#                                                            int(127.5*self.rgb[1]+127.5),
-#                                                            int(127.5*self.rgb[2]+127.5),
-#                                                            int(255*self.opacity)),
-#                                                       multiline=True, width=self._wrapWidthPix)#width of the frame
-            self.width, self.height = self._pygletTextObj.width, self._pygletTextObj.height
+            self._setTextLayout()
         else:
             self._surf = self._font.render(value, self.antialias, [255,255,255])
             self.width, self.height = self._surf.get_size()
@@ -4397,6 +5122,16 @@ class TextStim(_BaseVisualStim):
         self._needSetText=False
         self.needUpdate = True
 
+    def _setTextLayout(self):
+        """Lay out the text with the glyphs of the current (pyglet) font.
+        Recently used texts are kept by the font's :class:`_GlyphAtlas`, so
+        switching back to one of them is almost free.
+        """
+        atlas = _GlyphAtlas.forFont(self._font)
+        self._textLayout = atlas.getLayout(self.text, self._wrapWidthPix,
+                                           self.alignHoriz, self.alignVert)
+        self.width, self.height = self._textLayout.width, self._textLayout.height
+
     def _updateListShaders(self):
         """
         This is only used with pygame text - pyglet handles all from the draw()
@@ -4430,7 +5165,7 @@ class TextStim(_BaseVisualStim):
             #unbind the main texture
             GL.glActiveTexture(GL.GL_TEXTURE0)
 #            GL.glActiveTextureARB(GL.GL_TEXTURE0_ARB)
-            GL.glBindTexture(GL.GL_TEXTURE_2D, 0) #the texture is specified by pyglet.font.GlyphString.draw()
+            GL.glBindTexture(GL.GL_TEXTURE_2D, 0) #the glyph textures are bound by _TextLayout.draw()
             GL.glEnable(GL.GL_TEXTURE_2D)
         else:
             #bind the appropriate main texture
@@ -4441,7 +5176,7 @@ class TextStim(_BaseVisualStim):
         if self.win.winType=="pyglet":
             GL.glActiveTexture(GL.GL_TEXTURE0)
             GL.glEnable(GL.GL_TEXTURE_2D)
-            self._pygletTextObj.draw()
+            self._textLayout.draw()
         else:
             GL.glBegin(GL.GL_QUADS)                  # draw a 4 sided polygon
             # right bottom
@@ -4471,12 +5206,7 @@ class TextStim(_BaseVisualStim):
         desiredRGB = self._getDesiredRGB(self.rgb, self.colorSpace, self.contrast)
 
         if self.win.winType=="pyglet":
-            self._pygletTextObj = pyglet.font.Text(self._font, self.text,
-                                                       halign=self.alignHoriz, valign=self.alignVert,
-                                                       color = (desiredRGB[0],desiredRGB[1], desiredRGB[2], self.opacity),
-                                                       width=self._wrapWidthPix,#width of the frame
-                                                       )
-            self.width, self.height = self._pygletTextObj.width, self._pygletTextObj.height
+            self._setTextLayout()#the color is set as glColor when drawing
         else:
             self._surf = self._font.render(value, self.antialias,
                                            [desiredRGB[0]*255,
@@ -4535,7 +5265,7 @@ class TextStim(_BaseVisualStim):
             GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
 
         if self.win.winType=="pyglet":
-            self._pygletTextObj.draw()
+            self._textLayout.draw()
         else:
             GL.glBegin(GL.GL_QUADS)                  # draw a 4 sided polygon
             # right bottom
@@ -4582,11 +5312,15 @@ class TextStim(_BaseVisualStim):
             desiredRGB = self._getDesiredRGB(self.rgb, self.colorSpace, self.contrast)
             GL.glColor4f(desiredRGB[0],desiredRGB[1],desiredRGB[2], self.opacity)
 
-            GL.glUseProgram(self.win._progSignedTexFont)#self.win._progSignedTex)
+            prog = self.win.getShader('signedTexFont')
+            GL.glUseProgram(prog.handle)
 #            GL.glUniform3iv(GL.glGetUniformLocation(self.win._progSignedTexFont, "rgb"), 1,
 #                desiredRGB.ctypes.data_as(ctypes.POINTER(ctypes.c_float))) #set the texture to be texture unit 0
-            GL.glUniform3f(GL.glGetUniformLocation(self.win._progSignedTexFont, "rgb"), desiredRGB[0],desiredRGB[1],desiredRGB[2])
+            GL.glUniform3f(prog.uniforms['rgb'], desiredRGB[0],desiredRGB[1],desiredRGB[2])
 
+        elif win.winType=='pyglet': #glyphs are alpha-only textures, so they take the glColor
+            desiredRGB = self._getDesiredRGB(self.rgb, self.colorSpace, self.contrast)
+            GL.glColor4f(desiredRGB[0],desiredRGB[1],desiredRGB[2], self.opacity)
         else: #color is set in texture, so set glColor to white
             GL.glColor4f(1,1,1,1)
 
@@ -4608,9 +5342,9 @@ class TextStim(_BaseVisualStim):
             #unbind the main texture
             GL.glActiveTexture(GL.GL_TEXTURE0)
             GL.glEnable(GL.GL_TEXTURE_2D)
-            #then allow pyglet to bind and use texture during drawing
+            #then the layout binds the glyph textures during drawing
 
-            self._pygletTextObj.draw()
+            self._textLayout.draw()
             GL.glDisable(GL.GL_TEXTURE_2D)
         else:
             #for pygame we should (and can) use a drawing list
@@ -4777,6 +5511,14 @@ class ShapeStim(_BaseVisualStim):
         self.setSize(size, log=False)
         self.setVertices(vertices, log=False)
         self._calcVerticesRendered()
+    def __setattr__(self, name, value):
+        #count the changes (set methods and _set() assign the attribute too)
+        #so that a ShapeBatch only updates the shapes that have changed
+        self.__dict__[name] = value
+        if name in _shapeColorAttribs:
+            self.__dict__['_colorChangeN'] = self.__dict__.get('_colorChangeN', 0)+1
+        else:
+            self.__dict__['_changeN'] = self.__dict__.get('_changeN', 0)+1
     def setColor(self, color, colorSpace=None, operation=''):
         """For ShapeStim use :meth:`~ShapeStim.setLineColor` or
         :meth:`~ShapeStim.setFillColor`
@@ -4899,11 +5641,11 @@ class ShapeStim(_BaseVisualStim):
             self._verticesRendered=self.vertices
             self._posRendered=self.pos
         elif self.units in ['deg', 'degs']:
-            self._verticesRendered=psychopy.misc.deg2pix(self.vertices, self.win.monitor)
-            self._posRendered=psychopy.misc.deg2pix(self.pos, self.win.monitor)
+            self._verticesRendered=self.win.getUnitConverter().deg2pix(self.vertices)
+            self._posRendered=self.win.getUnitConverter().deg2pix(self.pos)
         elif self.units=='cm':
-            self._verticesRendered=psychopy.misc.cm2pix(self.vertices, self.win.monitor)
-            self._posRendered=psychopy.misc.cm2pix(self.pos, self.win.monitor)
+            self._verticesRendered=self.win.getUnitConverter().cm2pix(self.vertices)
+            self._posRendered=self.win.getUnitConverter().cm2pix(self.pos)
         self._verticesRendered = self._verticesRendered * self.size
 
 class Polygon(ShapeStim):
@@ -5103,6 +5845,237 @@ class Line(ShapeStim):
     def overlaps(self):
         pass
 
+#the ShapeStim attributes that only affect its colors (see ShapeStim.__setattr__)
+_shapeColorAttribs = set(['fillRGB', 'lineRGB', 'fillColorSpace', 'lineColorSpace',
+    'contrast', 'opacity'])
+
+class ShapeBatch(object):
+    """Draws a group of :class:`ShapeStim` objects (including :class:`Polygon`,
+    :class:`Circle`, :class:`Rect` and :class:`Line`) with a few OpenGL calls,
+    instead of the dozen or so that each shape needs when drawn on its own.
+
+    The vertices of all the shapes are moved (by their pos, ori and size) into
+    a single (float32) vertex array, with an array of colours alongside, and
+    all the shapes are then drawn with one call. The arrays are kept from one
+    draw to the next and only the shapes that have changed since (i.e. had an
+    attribute set, e.g. by setPos() or setFillColor()) are updated, so
+    hundreds of small shapes are much cheaper to draw. NB changing an array
+    of a shape in place (e.g. `stim.pos[0] = 1`) isn't noticed.
+
+    The shapes must all be filled without an outline or all be outlines
+    without a fill (so that drawing them together looks the same as drawing
+    them in turn), and share the same lineWidth, interpolate and closeShape
+    settings.
+
+    You can make a batch yourself::
+
+        dots = [visual.Circle(win, radius=5, pos=xy, units='pix',
+                    fillColor='red', lineColor=None) for xy in xys]
+        batch = visual.ShapeBatch(win, dots)
+        batch.draw()
+
+    or use `win.setBatchDraw(True)` to have the autoDraw stimuli batched.
+    """
+    name = 'ShapeBatch'
+    def __init__(self, win, stimuli=()):
+        self.win = win
+        self.stimuli = list(stimuli)
+        self._key = None#see _batchKey()
+        self._xy = None#float32 [nVertices,2] in normalised window coords
+        self._rgba = None#float32 [nVertices,4]
+        self._firsts = self._counts = None#the vertices of each shape
+        self._changeNs = self._colorChangeNs = None#of each shape when last updated
+        self._winSize = None
+    def draw(self, win=None):
+        """Draw all the shapes of the batch (in the window of the batch)
+        """
+        if win==None: win=self.win
+        if win.winType=='pyglet': win.winHandle.switch_to()
+        if not self.stimuli:
+            return
+        if not self._update(win):
+            #a shape can't be batched with the others any more: draw them in
+            #turn, and have the window group its stimuli again
+            if win._batchedToDraw is not None and self in win._batchedToDraw[1]:
+                win._batchedToDraw = None
+            for stim in self.stimuli:
+                stim.draw(win)
+            return
+        first = self.stimuli[0]
+
+        GL.glPushMatrix()#push before drawing, pop after
+        #load Null textures into multitexteureARB - or they modulate glColor
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glActiveTexture(GL.GL_TEXTURE1)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        if first.interpolate:
+            GL.glEnable(GL.GL_LINE_SMOOTH)
+            GL.glEnable(GL.GL_POLYGON_SMOOTH)
+        else:
+            GL.glDisable(GL.GL_LINE_SMOOTH)
+            GL.glDisable(GL.GL_POLYGON_SMOOTH)
+
+        GL.glVertexPointer(2, GL.GL_FLOAT, 0, self._xy.ctypes.data_as(ctypes.POINTER(ctypes.c_float)))
+        GL.glColorPointer(4, GL.GL_FLOAT, 0, self._rgba.ctypes.data_as(ctypes.POINTER(ctypes.c_float)))
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        if self._key[0]=='fill':
+            mode = GL.GL_POLYGON
+        else:
+            GL.glLineWidth(first.lineWidth)
+            if first.closeShape: mode = GL.GL_LINE_LOOP
+            else: mode = GL.GL_LINE_STRIP
+        _multiDrawArrays(mode, self._firsts, self._counts)
+        GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glPopMatrix()
+    def _update(self, win):
+        """Updates the vertices and colours of the shapes that have changed
+        (of all of them the first time). Returns False if the shapes can't be
+        drawn together
+        """
+        stimuli = self.stimuli
+        changeNs = numpy.array([stim._changeN for stim in stimuli])
+        colorChangeNs = numpy.array([stim._colorChangeN for stim in stimuli])
+        winSize = (int(win.size[0]), int(win.size[1]))
+        allShapes = numpy.arange(len(stimuli))
+        if self._xy is None or len(stimuli)!=len(self._counts) or winSize!=self._winSize:
+            changed = recolored = allShapes
+        else:
+            changed = numpy.flatnonzero(changeNs!=self._changeNs)
+            recolored = numpy.flatnonzero(colorChangeNs!=self._colorChangeNs)
+            if not len(changed) and not len(recolored):
+                return True
+        for i in changed:
+            if stimuli[i].needVertexUpdate: stimuli[i]._calcVerticesRendered()
+        counts = numpy.array([stimuli[i]._verticesRendered.shape[0] for i in changed], numpy.int32)
+        if len(changed)<len(stimuli) and numpy.any(counts!=self._counts[changed]):
+            changed = recolored = allShapes#the shapes move within the arrays
+            counts = numpy.array([stim._verticesRendered.shape[0] for stim in stimuli], numpy.int32)
+        #can they (still) be drawn together?
+        if len(changed)==len(stimuli) or len(recolored)==len(stimuli):
+            self._key = None
+        for i in numpy.union1d(changed, recolored):
+            key = _batchKey(stimuli[i])
+            if key is None or (self._key is not None and key!=self._key):
+                return False
+            self._key = key
+        if len(changed)==len(stimuli) and (self._xy is None or len(counts)!=len(self._counts) \
+                or numpy.any(counts!=self._counts)):
+            self._counts = counts
+            self._firsts = numpy.cumsum(counts)-counts
+            self._xy = numpy.zeros([counts.sum(), 2], numpy.float32)
+            self._rgba = numpy.zeros([counts.sum(), 4], numpy.float32)
+            recolored = allShapes
+        self._winSize = winSize
+        if len(changed):
+            self._updateVertices(win, changed, counts)
+        if len(recolored):
+            self._updateColors(recolored)
+        #the shapes' own updates (e.g. _calcVerticesRendered) count as changes too
+        self._changeNs = numpy.array([stim._changeN for stim in stimuli])
+        self._colorChangeNs = numpy.array([stim._colorChangeN for stim in stimuli])
+        return True
+    def _rows(self, indices):
+        """The vertex rows of the shapes with the given indices"""
+        counts = self._counts[indices]
+        return numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts)-counts, counts) \
+            + numpy.repeat(self._firsts[indices], counts)
+    def _updateVertices(self, win, indices, counts):
+        """Transform the vertices of the shapes with the given indices to
+        normalised window coords (in one go)
+        """
+        shapes = [self.stimuli[i] for i in indices]
+        winScales = {}#stim._winScale:scale (see Window.setScale)
+        for stim in shapes:
+            if stim._winScale not in winScales:
+                winScales[stim._winScale] = win._getScale(stim._winScale)
+        vertices = numpy.concatenate([stim._verticesRendered for stim in shapes]).astype(float)
+        oris = numpy.repeat(numpy.radians([float(stim.ori) for stim in shapes]), counts)
+        cosOri, sinOri = cos(oris), sin(oris)
+        positions = numpy.repeat(numpy.array([stim._posRendered for stim in shapes],
+            float).reshape([-1,2]), counts, axis=0)
+        scales = numpy.repeat(numpy.array([winScales[stim._winScale] for stim in shapes]),
+            counts, axis=0)
+        xy = numpy.empty(vertices.shape, float)
+        #as glRotatef(-ori), i.e. clockwise
+        xy[:,0] = vertices[:,0]*cosOri + vertices[:,1]*sinOri
+        xy[:,1] = vertices[:,1]*cosOri - vertices[:,0]*sinOri
+        xy += positions
+        xy *= scales
+        self._xy[self._rows(indices)] = xy
+    def _updateColors(self, indices):
+        rgbas = []
+        for i in indices:
+            stim = self.stimuli[i]
+            if self._key[0]=='fill':
+                rgb = stim._getDesiredRGB(stim.fillRGB, stim.fillColorSpace, stim.contrast)
+            else:
+                rgb = stim._getDesiredRGB(stim.lineRGB, stim.lineColorSpace, stim.contrast)
+            rgbas.append((rgb[0], rgb[1], rgb[2], stim.opacity))
+        self._rgba[self._rows(indices)] = numpy.repeat(numpy.array(rgbas, float),
+            self._counts[indices], axis=0)
+
+def _multiDrawArrays(mode, firsts, counts):
+    """glMultiDrawArrays for numpy arrays of the first vertex and the number
+    of vertices of each primitive
+    """
+    firsts = numpy.ascontiguousarray(firsts, numpy.int32)
+    counts = numpy.ascontiguousarray(counts, numpy.int32)
+    GL.glMultiDrawArrays(mode, firsts.ctypes.data_as(ctypes.POINTER(GL.GLint)),
+        counts.ctypes.data_as(ctypes.POINTER(GL.GLsizei)), len(counts))
+
+def _batchKey(stim):
+    """The settings that stimuli must share to be drawn in the same
+    :class:`ShapeBatch`, or None if `stim` can't be batched (only ShapeStims
+    that use the standard ShapeStim.draw() and have a fill or an outline,
+    but not both, can)
+    """
+    if not isinstance(stim, ShapeStim) or \
+            getattr(stim.__class__.draw, 'im_func', None) is not ShapeStim.draw.im_func:
+        return None
+    if stim.vertices.ndim!=2:
+        return None
+    #the outline of a shape must be drawn right after its fill, so a batch is
+    #of fills or of outlines
+    hasFill = stim.vertices.shape[0]>2 and stim.fillRGB is not None
+    hasLine = stim.lineRGB is not None
+    if hasFill and not hasLine:
+        return ('fill', bool(stim.interpolate))
+    elif hasLine and not hasFill:
+        return ('line', stim.lineWidth, bool(stim.interpolate), bool(stim.closeShape))
+    return None
+
+def _batchStimuli(win, stimuli, previous=()):
+    """Returns the list of `stimuli` with each run of (2 or more) consecutive
+    stimuli that can be drawn together replaced by a :class:`ShapeBatch`, so
+    that drawing the list in order looks the same. The batches in `previous`
+    (e.g. of the last frame) are reused for the same runs of stimuli
+    """
+    batches = {}#ids of the stimuli:batch
+    for batch in previous:
+        if isinstance(batch, ShapeBatch):
+            batches[tuple(map(id, batch.stimuli))] = batch
+    grouped = []
+    run = []; runKey = None
+    for stim in stimuli + [None]:#None to finish the last run
+        if stim is None: key = None
+        else: key = _batchKey(stim)
+        if run and key!=runKey:
+            if len(run)>1:
+                grouped.append(batches.get(tuple(map(id, run))) or ShapeBatch(win, run))
+            else: grouped.append(run[0])
+            run = []
+        if key is None:
+            if stim is not None: grouped.append(stim)
+        else:
+            run.append(stim)
+        runKey = key
+    return grouped
+
 class ImageStim(_BaseVisualStim):
     def __init__(self,
                  win,
@@ -5271,9 +6244,10 @@ class ImageStim(_BaseVisualStim):
         self.needUpdate=0
         GL.glNewList(self._listID,GL.GL_COMPILE)
         #setup the shaderprogram
-        GL.glUseProgram(self.win._progSignedTexMask)
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "texture"), 0) #set the texture to be texture unit 0
-        GL.glUniform1i(GL.glGetUniformLocation(self.win._progSignedTexMask, "mask"), 1)  # mask is texture unit 1
+        prog = self.win.getShader('signedTexMask')
+        GL.glUseProgram(prog.handle)
+        GL.glUniform1i(prog.uniforms['texture'], 0) #set the texture to be texture unit 0
+        GL.glUniform1i(prog.uniforms['mask'], 1)  # mask is texture unit 1
         #mask
         GL.glActiveTexture(GL.GL_TEXTURE1)
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.maskID)
@@ -5405,8 +6379,8 @@ class ImageStim(_BaseVisualStim):
         As of v1.61.00 this is called automatically during garbage collection of
         your stimulus, so doesn't need calling explicitly by the user.
         """
-        GL.glDeleteTextures(1, self.texID)
-        GL.glDeleteTextures(1, self.maskID)
+        self.win._textureCache.delete(self.texID)
+        self.win._textureCache.delete(self.maskID)
     def draw(self, win=None):
         if win==None: win=self.win
         if win.winType=='pyglet': win.winHandle.switch_to()
@@ -5440,6 +6414,27 @@ class ImageStim(_BaseVisualStim):
         if log and self.autoLog:
             self.win.logOnFlip("Set %s image=%s" %(self.name, value),
                 level=logging.EXP,obj=self)
+    def preloadImages(self, images, upload=False):
+        """Decode image files that this stimulus will show later, in
+        background threads, so that setImage() doesn't have to (see
+        :class:`ImageCache`). Returns straight away unless `upload` is True.
+
+        If `upload` is True (and shaders are used) the textures are also made
+        now, waiting for the images to be decoded, so that setImage() only
+        has to use them. Do that between trials, not while drawing frames.
+        """
+        cache = self.win.getImageCache()
+        cache.preload(images, (_intensityMode(GL.GL_RGB), False))
+        if not upload or not self._useShaders:
+            return#textures also depend on the color without shaders, so aren't shared
+        origSize = self.origSize#createTexture sets this for the image
+        for image in images:
+            id = GL.GLuint()
+            GL.glGenTextures(1, ctypes.byref(id))
+            createTexture(image, id=id, pixFormat=GL.GL_RGB, stim=self,
+                maskParams=self.maskParams, forcePOW2=False)
+            cache.holdTexture(id)
+        self.origSize = origSize
     def setMask(self,value, log=True):
         """Change the image to be used as an alpha-mask for the image
         """
@@ -5458,8 +6453,8 @@ class ImageStim(_BaseVisualStim):
         else:
             #we have an image - calculate the size in `units` that matches original pixel size
             if self.units=='pix': self.size=numpy.array(self.origSize)
-            elif self.units=='deg': self.size= psychopy.misc.pix2deg(numpy.array(self.origSize, float), self.win.monitor)
-            elif self.units=='cm': self.size= psychopy.misc.pix2cm(numpy.array(self.origSize, float), self.win.monitor)
+            elif self.units=='deg': self.size= self.win.getUnitConverter().pix2deg(numpy.array(self.origSize, float))
+            elif self.units=='cm': self.size= self.win.getUnitConverter().pix2cm(numpy.array(self.origSize, float))
             elif self.units=='norm': self.size= 2*numpy.array(self.origSize, float)/self.win.size
             elif self.units=='height': self.size= numpy.array(self.origSize, float)/self.win.size[1]
         #set it
@@ -5581,6 +6576,7 @@ class BufferImageStim(GratingStim):
         # setTex is called only once
         self._texName = tex
         id = self.texID
+        self.win._textureCache.makePrivate(id)
         pixFormat = GL.GL_RGB
         useShaders = self._useShaders
         self.interpolate = interpolate
@@ -5660,6 +6656,8 @@ class BufferImageStim(GratingStim):
         GL.glRotatef(-self.ori, 0.0, 0.0, 1.0)
         GL.glColor4f(self.desiredRGB[0], self.desiredRGB[1], self.desiredRGB[2], self.opacity)
 
+        if self._useShaders:
+            self._setTexTransform()
         GL.glCallList(self._listID) # make it happen
         GL.glPopMatrix() #return the view to previous state
 
@@ -6823,15 +7821,15 @@ class Aperture:
     def _calcSizeRendered(self):
         """Calculate the size of the stimulus in coords of the :class:`~psychopy.visual.Window` (normalised or pixels)"""
         if self.units in ['norm','pix', 'height']: self._sizeRendered=self.size
-        elif self.units in ['deg', 'degs']: self._sizeRendered=psychopy.misc.deg2pix(self.size, self.win.monitor)
-        elif self.units=='cm': self._sizeRendered=psychopy.misc.cm2pix(self.size, self.win.monitor)
+        elif self.units in ['deg', 'degs']: self._sizeRendered=self.win.getUnitConverter().deg2pix(self.size)
+        elif self.units=='cm': self._sizeRendered=self.win.getUnitConverter().cm2pix(self.size)
         else:
             logging.ERROR("Stimulus units should be 'height', 'norm', 'deg', 'cm' or 'pix', not '%s'" %self.units)
     def _calcPosRendered(self):
         """Calculate the pos of the stimulus in coords of the :class:`~psychopy.visual.Window` (normalised or pixels)"""
         if self.units in ['norm','pix', 'height']: self._posRendered=self.pos
-        elif self.units in ['deg', 'degs']: self._posRendered=psychopy.misc.deg2pix(self.pos, self.win.monitor)
-        elif self.units=='cm': self._posRendered=psychopy.misc.cm2pix(self.pos, self.win.monitor)
+        elif self.units in ['deg', 'degs']: self._posRendered=self.win.getUnitConverter().deg2pix(self.pos)
+        elif self.units=='cm': self._posRendered=self.win.getUnitConverter().cm2pix(self.pos)
     def enable(self):
         """Enable the aperture so that it is used in future drawing operations
 
@@ -7065,10 +8063,18 @@ def createTexture(tex, id, pixFormat, stim, res=128, maskParams=None, forcePOW2=
     """
     Create an intensity texture, ranging -1:1.0
     """
-    global _nImageResizes
-    notSqr=False #most of the options will be creating a sqr texture
     useShaders = stim._useShaders
     interpolate = stim.interpolate
+    #stimuli with the same texture share a single copy from the window's cache
+    #(not without shaders, where the texture also depends on the stim's color)
+    cache = stim.win._textureCache
+    cacheKey = None
+    if useShaders:
+        cacheKey = _textureCacheKey(tex, pixFormat, res, interpolate, maskParams, forcePOW2)
+    if cacheKey is not None and cache.use(cacheKey, id, stim):
+        return
+    cache.makePrivate(id)#we're about to change the texture in id
+    stimAttribs = {}#set on stim by this function, so also needed for cached copies
     if type(tex) == numpy.ndarray:
         #handle a numpy array
         #for now this needs to be an NxN intensity array
@@ -7094,6 +8100,7 @@ def createTexture(tex, id, pixFormat, stim, res=128, maskParams=None, forcePOW2=
                 logging.error("Requiring a square power of two (e.g. 16x16, 256x256) texture but didn't receive one")
                 core.quit()
             res=tex.shape[0]
+        stimAttribs['_tex1D'] = stim._tex1D
     elif tex in [None,"none", "None"]:
         res=1 #4x4 (2x2 is SUPPOSED to be fine but generates wierd colors!)
         intensity = numpy.ones([res,res],numpy.float32)
@@ -7189,18 +8196,12 @@ def createTexture(tex, id, pixFormat, stim, res=128, maskParams=None, forcePOW2=
 
     else:
         if type(tex) in [str, unicode, numpy.string_]:
-            # maybe tex is the name of a file:
-            if not os.path.isfile(tex):
-                logging.error("Couldn't find image file '%s'; check path?" %(tex)); logging.flush()
-                raise OSError, "Couldn't find image file '%s'; check path? (tried: %s)" \
-                    % (tex, os.path.abspath(tex))#ensure we quit
-            try:
-                im = Image.open(tex)
-                im = im.transpose(Image.FLIP_TOP_BOTTOM)
-            except IOError:
-                logging.error("Found file '%s' but failed to load as an image" %(tex)); logging.flush()
-                raise IOError, "Found file '%s' [= %s] but it failed to load as an image" \
-                    % (tex, os.path.abspath(tex))#ensure we quit
+            # maybe tex is the name of a file (perhaps already decoded by the window's ImageCache):
+            kind = (_intensityMode(pixFormat), forcePOW2)
+            if stim.win._imageCache is not None:
+                intensity, wasLum, origSize = stim.win._imageCache.decode(tex, kind)
+            else:
+                intensity, wasLum, origSize = _decodeImageFile(tex, kind)
         else:
             # can't be a file; maybe its an image already in memory?
             try:
@@ -7208,37 +8209,10 @@ def createTexture(tex, id, pixFormat, stim, res=128, maskParams=None, forcePOW2=
             except AttributeError: # nope, not an image in memory
                 logging.error("Couldn't make sense of requested image."); logging.flush()
                 raise AttributeError, "Couldn't make sense of requested image."#ensure we quit
-        # at this point we have a valid im
-        stim.origSize=im.size
-        #is it 1D?
-        if im.size[0]==1 or im.size[1]==1:
-            logging.error("Only 2D textures are supported at the moment")
-        else:
-            maxDim = max(im.size)
-            powerOf2 = int(2**numpy.ceil(numpy.log2(maxDim)))
-            if im.size[0]!=powerOf2 or im.size[1]!=powerOf2:
-                if not forcePOW2:
-                    notSqr=True
-                elif _nImageResizes<reportNImageResizes:
-                    logging.warning("Image '%s' was not a square power-of-two image. Linearly interpolating to be %ix%i" %(tex, powerOf2, powerOf2))
-                elif _nImageResizes==reportNImageResizes:
-                    logging.warning("Multiple images have needed resizing - I'll stop bothering you!")
-                _nImageResizes+=1
-                im=im.resize([powerOf2,powerOf2],Image.BILINEAR)
-
-        #is it Luminance or RGB?
-        if im.mode=='L':
-            wasLum = True
-            intensity= numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1.0 # 2/255-1.0 == get to range -1:1
-        elif pixFormat==GL.GL_ALPHA:#we have RGB and need Lum
-            wasLum = True
-            im = im.convert("L")#force to intensity (in case it was rgb)
-            intensity= numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1.0 # much faster to avoid division 2/255
-        elif pixFormat==GL.GL_RGB:#we have RGB and keep it that way
-            #texture = im.tostring("raw", "RGB", 0, -1)
-            im = im.convert("RGBA")#force to rgb (in case it was CMYK or L)
-            intensity = numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1
-            wasLum=False
+            intensity, wasLum, origSize = _imageIntensity(im, _intensityMode(pixFormat), forcePOW2, tex)
+        # at this point we have a valid image
+        stim.origSize=origSize
+        stimAttribs['origSize'] = origSize
 
     if pixFormat==GL.GL_RGB and wasLum and useShaders:
         #keep as float32 -1:1
@@ -7318,6 +8292,529 @@ def createTexture(tex, id, pixFormat, stim, res=128, maskParams=None, forcePOW2=
                         pixFormat, dataType, texture)
 
     GL.glTexEnvi(GL.GL_TEXTURE_ENV, GL.GL_TEXTURE_ENV_MODE, GL.GL_MODULATE)#?? do we need this - think not!
+    if cacheKey is not None:
+        cache.add(cacheKey, id, stimAttribs)
+
+def _openImage(filename):
+    """Opens an image file with PIL, flipped so that its bottom row comes first
+    (as OpenGL expects)
+    """
+    if not os.path.isfile(filename):
+        logging.error("Couldn't find image file '%s'; check path?" %(filename)); logging.flush()
+        raise OSError, "Couldn't find image file '%s'; check path? (tried: %s)" \
+            % (filename, os.path.abspath(filename))#ensure we quit
+    try:
+        im = Image.open(filename)
+        im = im.transpose(Image.FLIP_TOP_BOTTOM)
+    except IOError:
+        logging.error("Found file '%s' but failed to load as an image" %(filename)); logging.flush()
+        raise IOError, "Found file '%s' [= %s] but it failed to load as an image" \
+            % (filename, os.path.abspath(filename))#ensure we quit
+    return im
+
+def _intensityMode(pixFormat):
+    """The PIL mode of images that are made into textures of `pixFormat`
+    """
+    if pixFormat==GL.GL_ALPHA:
+        return 'L'
+    return 'RGBA'
+
+def _imageIntensity(im, mode, forcePOW2, name):
+    """Converts a PIL image to the intensity array (-1:1) that createTexture()
+    makes a texture from, with `mode` 'L' (for masks) or 'RGBA' (unless the
+    image is already 'L').
+
+    Returns (intensity, wasLum, origSize)
+    """
+    global _nImageResizes
+    origSize = im.size
+    #is it 1D?
+    if im.size[0]==1 or im.size[1]==1:
+        logging.error("Only 2D textures are supported at the moment")
+    else:
+        maxDim = max(im.size)
+        powerOf2 = int(2**numpy.ceil(numpy.log2(maxDim)))
+        if im.size[0]!=powerOf2 or im.size[1]!=powerOf2:
+            if forcePOW2 and _nImageResizes<reportNImageResizes:
+                logging.warning("Image '%s' was not a square power-of-two image. Linearly interpolating to be %ix%i" %(name, powerOf2, powerOf2))
+            elif forcePOW2 and _nImageResizes==reportNImageResizes:
+                logging.warning("Multiple images have needed resizing - I'll stop bothering you!")
+            _nImageResizes+=1
+            im=im.resize([powerOf2,powerOf2],Image.BILINEAR)
+
+    #is it Luminance or RGB?
+    if im.mode=='L':
+        wasLum = True
+        intensity= numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1.0 # 2/255-1.0 == get to range -1:1
+    elif mode=='L':#we have RGB and need Lum
+        wasLum = True
+        im = im.convert("L")#force to intensity (in case it was rgb)
+        intensity= numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1.0 # much faster to avoid division 2/255
+    else:#we have RGB and keep it that way
+        #texture = im.tostring("raw", "RGB", 0, -1)
+        im = im.convert("RGBA")#force to rgb (in case it was CMYK or L)
+        intensity = numpy.array(im).astype(numpy.float32)*0.0078431372549019607-1
+        wasLum=False
+    return intensity, wasLum, origSize
+
+def _imagePixels(im):
+    """Converts a PIL image to the RGB or RGBA pixel array (0:1) that
+    SimpleImageStim draws.
+
+    Returns (imArray, size)
+    """
+    if im.mode=='RGBA':
+        imArray = numpy.array(im).astype(numpy.float32)/255
+    else:
+        imArray = numpy.array(im.convert("RGB")).astype(numpy.float32)/255
+    return imArray, im.size
+
+def _decodeImageFile(filename, kind):
+    """Reads and converts an image file, ready to be uploaded: for
+    createTexture() if `kind` is (mode, forcePOW2), or for SimpleImageStim
+    if `kind` is 'pixels'. Doesn't use OpenGL, so it can run in any thread.
+    """
+    im = _openImage(filename)
+    if kind=='pixels':
+        return _imagePixels(im)
+    mode, forcePOW2 = kind
+    return _imageIntensity(im, mode, forcePOW2, filename)
+
+def _textureCacheKey(tex, pixFormat, res, interpolate, maskParams, forcePOW2):
+    """Returns a key for a texture in the _TextureCache, based on everything
+    that createTexture() uses to make it (or None if it can't be cached).
+    """
+    if type(tex)==numpy.ndarray:
+        texKey = ('array', tex.shape, tex.dtype.str,
+            hashlib.md5(numpy.ascontiguousarray(tex)).hexdigest())
+    elif tex is None:
+        texKey = None
+    elif type(tex) in [str, unicode, numpy.string_]:
+        texKey = tex
+        if os.path.isfile(tex):#so that a changed file isn't taken from the cache
+            texKey = (os.path.abspath(tex), os.path.getmtime(tex))
+    else:
+        return None#e.g. a PIL image
+    if maskParams is not None:
+        maskParams = repr(sorted(maskParams.items()))
+    return (texKey, pixFormat, res, interpolate, maskParams, forcePOW2)
+
+class _TextureCache(object):
+    """The textures of a Window that are shared by its stimuli, so that
+    identical textures are only created and uploaded to the graphics card once.
+
+    The stimuli still refer to textures by their own ctypes texture id objects
+    (e.g. stim.texID). When a stimulus uses a cached texture its id object is
+    set to the shared texture, which is deleted when the last stimulus stops
+    using it. Textures that aren't in the cache belong to the stimulus.
+    """
+    def __init__(self):
+        self._textures = {}#cacheKey:texture number
+        self._users = {}#texture number:[cacheKey, nStimsUsingIt, stimAttribs]
+    def __len__(self):
+        return len(self._textures)
+    def use(self, key, id, stim):
+        """Sets `id` to the cached texture for `key`, if there is one, and
+        returns True (or False if there isn't one)
+        """
+        texture = self._textures.get(key)
+        if texture is None:
+            return False
+        if id.value!=texture:
+            self.delete(id)#whatever id was previously
+            id.value = texture
+            self._users[texture][1] += 1
+        for attrib, value in self._users[texture][2].items():
+            setattr(stim, attrib, value)
+        return True
+    def add(self, key, id, stimAttribs):
+        """The texture in `id` (which must not already be shared) becomes the
+        cached texture for `key`
+        """
+        self._textures[key] = id.value
+        self._users[id.value] = [key, 1, stimAttribs]
+    def makePrivate(self, id):
+        """Makes sure that `id` is a texture that no other stimulus uses
+        """
+        if id.value in self._users:
+            self.delete(id)
+            GL.glGenTextures(1, ctypes.byref(id))
+    def delete(self, id):
+        """Deletes the texture in `id` or, if it is shared, stops using it
+        """
+        if not id.value:
+            return
+        users = self._users.get(id.value)
+        if users is None:
+            GL.glDeleteTextures(1, id)
+        else:
+            users[1] -= 1
+            if users[1]==0:
+                del self._textures[users[0]]
+                del self._users[id.value]
+                GL.glDeleteTextures(1, id)
+        id.value = 0#so that deleting again does nothing
+
+class ImageCache(object):
+    """Image files that have been read, decoded and converted (ready to be
+    uploaded to the graphics card), so that ImageStim.setImage() and
+    SimpleImageStim.setImage() don't have to do that while frames are being
+    drawn. Get a window's cache with `win.getImageCache()`.
+
+    Images are usually preloaded in background threads with
+    `stim.preloadImages(filenames)`, e.g. for the upcoming trials of a
+    TrialHandler, and are used by setImage() when their turn comes (if one is
+    still being decoded then setImage() waits for it). The decoded images are
+    kept up to `maxBytes` in total (the least recently used are dropped first).
+
+    With shaders, ImageStim.preloadImages(filenames, upload=True) also makes
+    the textures (at a moment of your choosing, e.g. between trials), which
+    are then shared with the stimuli that show them. The cache keeps the
+    most recent `maxTextures` of those.
+    """
+    def __init__(self, win=None, maxBytes=512*2**20, maxTextures=16, nThreads=2):
+        """
+        :Parameters:
+            win: the :class:`Window` whose textures are made by
+                ImageStim.preloadImages(upload=True) and kept by holdTexture()
+            maxBytes: the most memory (in bytes) to use for decoded images
+            maxTextures: the most uploaded textures to keep
+            nThreads: the number of threads that decode images
+        """
+        self.win = win
+        self.maxBytes = maxBytes
+        self.maxTextures = maxTextures
+        self.nThreads = nThreads
+        self.nBytes = 0#used by the decoded images
+        self.nHits = 0#images that were ready when they were needed
+        self.nMisses = 0#images that had to be decoded when they were needed
+        self._decoded = _LRUDict()#key:decoded image
+        self._queued = set()#keys waiting for a thread
+        self._decoding = set()#keys being decoded by a thread
+        self._lock = threading.Condition()
+        self._toDecode = Queue.Queue()
+        self._threads = []
+        self._textures = _LRUDict()#texture number:ctypes texture id
+    def __len__(self):
+        return len(self._decoded)
+    def _key(self, filename, kind):
+        if type(filename) not in [str, unicode, numpy.string_] or not os.path.isfile(filename):
+            return None
+        #so that a changed file isn't taken from the cache
+        return (os.path.abspath(filename), os.path.getmtime(filename), kind)
+    def preload(self, filenames, kind):
+        """Decodes the image files in background threads, unless they are
+        already in the cache. Returns straight away.
+
+        `kind` is what the images are decoded for: (mode, forcePOW2) for
+        createTexture() (see _imageIntensity), or 'pixels' for SimpleImageStim.
+        """
+        for filename in filenames:
+            key = self._key(filename, kind)
+            if key is None:
+                continue#not a file (setImage will report that)
+            with self._lock:
+                if key in self._decoded:
+                    self._decoded[key] = self._decoded.pop(key)#now the most recently used
+                    continue
+                if key in self._queued or key in self._decoding:
+                    continue
+                self._queued.add(key)
+            self._startThreads()
+            self._toDecode.put((filename, kind, key))
+    def decode(self, filename, kind):
+        """Returns the decoded image, from the cache if it is there (waiting
+        if it is being decoded) or else by decoding it now (and keeping it)
+        """
+        key = self._key(filename, kind)
+        if key is None:
+            return _decodeImageFile(filename, kind)#raises the usual errors
+        with self._lock:
+            while key in self._decoding:
+                self._lock.wait()
+            decoded = self._decoded.pop(key, None)
+            if decoded is not None:
+                self._decoded[key] = decoded#now the most recently used
+                self.nHits += 1
+                return decoded
+            self.nMisses += 1
+            self._queued.discard(key)#so that a thread doesn't decode it too
+        #not preloaded (or still queued) so decode it here, rather than wait
+        decoded = _decodeImageFile(filename, kind)
+        with self._lock:
+            self._add(key, decoded)
+        return decoded
+    def wait(self, timeout=None):
+        """Waits until the images that were preloaded have been decoded (or
+        for `timeout` seconds). Returns True if they all have been.
+        """
+        if timeout is not None:
+            endTime = core.getTime()+timeout
+        with self._lock:
+            while self._queued or self._decoding:
+                if timeout is None:
+                    self._lock.wait()
+                else:
+                    remaining = endTime-core.getTime()
+                    if remaining<=0:
+                        break
+                    self._lock.wait(remaining)
+            return not (self._queued or self._decoding)
+    def holdTexture(self, id):
+        """Keeps the window's (shared) texture in `id` (a ctypes GLuint) until
+        `maxTextures` newer ones are held. Used by ImageStim.preloadImages().
+        """
+        if id.value in self._textures:
+            self.win._textureCache.delete(id)#already held
+            return
+        self._textures[id.value] = id
+        while len(self._textures)>self.maxTextures:
+            texture, oldID = self._textures.popOldest()
+            self.win._textureCache.delete(oldID)
+    def clear(self):
+        """Forgets the decoded images and releases the held textures
+        """
+        with self._lock:
+            self._decoded.clear()
+            self.nBytes = 0
+        for id in self._textures.values():
+            self.win._textureCache.delete(id)
+        self._textures.clear()
+    def close(self):
+        """Stops the decoding threads (after their current image) and clears
+        the cache. Called by `win.close()`.
+        """
+        with self._lock:
+            self._queued.clear()#so that the threads skip the rest
+        for thread in self._threads:
+            self._toDecode.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.clear()
+    def _add(self, key, decoded):
+        #call with the lock held
+        if key in self._decoded:
+            return
+        self._decoded[key] = decoded
+        self.nBytes += decoded[0].nbytes
+        while self.nBytes>self.maxBytes and len(self._decoded)>1:
+            oldKey, old = self._decoded.popOldest()
+            self.nBytes -= old[0].nbytes
+    def _startThreads(self):
+        while len(self._threads)<self.nThreads:
+            thread = threading.Thread(target=self._run, name='ImageCache')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+    def _run(self):
+        while True:
+            item = self._toDecode.get()
+            if item is None:
+                break
+            filename, kind, key = item
+            with self._lock:
+                if key not in self._queued:
+                    continue#cleared, or already decoded by decode()
+                self._queued.discard(key)
+                self._decoding.add(key)
+            try:
+                decoded = _decodeImageFile(filename, kind)
+            except Exception, err:
+                logging.warning("ImageCache failed to preload '%s': %s" %(filename, err))
+                decoded = None
+            with self._lock:
+                self._decoding.discard(key)
+                if decoded is not None:
+                    self._add(key, decoded)
+                self._lock.notifyAll()
+
+class _LRUDict(object):
+    """A dict that knows which of its keys was set least recently, for
+    caches (python 2.6 has no collections.OrderedDict). Setting a key again
+    makes it the most recently used.
+    """
+    def __init__(self):
+        self._items = {}#key:(useN, value)
+        self._useN = 0
+    def __len__(self):
+        return len(self._items)
+    def __contains__(self, key):
+        return key in self._items
+    def __getitem__(self, key):
+        return self._items[key][1]
+    def __setitem__(self, key, value):
+        self._useN += 1
+        self._items[key] = (self._useN, value)
+    def pop(self, key, *default):
+        if key not in self._items and default:
+            return default[0]
+        return self._items.pop(key)[1]
+    def popOldest(self):
+        """Removes the least recently set item and returns (key, value)"""
+        key = min(self._items, key=lambda k: self._items[k][0])
+        return key, self._items.pop(key)[1]
+    def values(self):
+        return [value for useN, value in self._items.values()]
+    def clear(self):
+        self._items.clear()
+
+class _GlyphAtlas(object):
+    """The glyphs of a pyglet font and the layouts of the texts that have
+    recently been set in that font.
+
+    pyglet renders each glyph of a font only once, into textures shared by all
+    the text in that font, so laying out a text only needs the glyphs to be
+    looked up and their quads placed. That is much quicker than building a new
+    pyglet.font.Text each time a TextStim's text changes, and texts that were
+    used recently (e.g. the items of an RSVP stream) are not even laid out again.
+
+    Use _GlyphAtlas.forFont(font) so that all stimuli share a font's atlas.
+    The layouts are placed the same way as pyglet.font.Text wraps and aligns them.
+    """
+    _atlases = weakref.WeakKeyDictionary()#font:atlas
+    maxLayouts = 256#the number of recent layouts that are kept
+    tabWidth = 50.0#pyglet's default tab stops
+    def __init__(self, font):
+        self._font = weakref.ref(font)#so that unused fonts can still be freed
+        self._layouts = _LRUDict()#(text,width,alignHoriz,alignVert):_TextLayout
+    @classmethod
+    def forFont(cls, font):
+        """Returns the atlas of a (pyglet) font, creating it if needed
+        """
+        atlas = cls._atlases.get(font)
+        if atlas is None:
+            atlas = cls._atlases[font] = cls(font)
+        return atlas
+    def __len__(self):
+        return len(self._layouts)
+    def getLayout(self, text, width, alignHoriz='left', alignVert='baseline'):
+        """Returns the :class:`_TextLayout` of `text` wrapped to `width` pixels
+        and aligned like pyglet.font.Text(halign=alignHoriz, valign=alignVert)
+        """
+        key = (text, width, alignHoriz, alignVert)
+        layout = self._layouts.pop(key, None)
+        if layout is None:
+            layout = self._makeLayout(text, width, alignHoriz, alignVert)
+            if len(self._layouts)>=self.maxLayouts:
+                self._layouts.popOldest()#forget the least recently used
+        self._layouts[key] = layout#(again) as the most recently used
+        return layout
+    def _wrapLines(self, text, glyphs, width):
+        """Word-wraps the glyphs into lines no wider than `width` (except for
+        words that are too long by themselves), as pyglet's TextLayout does.
+
+        Returns a list of (glyphs, width) with glyphs as a list of (kern, glyph)
+        """
+        lines = []
+        line, lineWidth = [], 0
+        pending, pendingWidth = [], 0#the glyphs of a word that isn't finished yet
+        x = 0
+        eolSpace = 0#the width of whitespace at the end of the line
+        for char, glyph in zip(text, glyphs):
+            if char in u' \u200b\t':
+                #whitespace, so the pending word fits on this line
+                kern = 0
+                if char==u'\t':
+                    tabStop = (x//self.tabWidth+1)*self.tabWidth
+                    kern = int(tabStop - x - glyph.advance)
+                line.extend(pending)
+                lineWidth += pendingWidth
+                pending, pendingWidth = [], 0
+                line.append((kern, glyph))
+                lineWidth += glyph.advance+kern
+                eolSpace += glyph.advance+kern
+                x += glyph.advance+kern
+                continue
+            newLine = char in u'\n\u2028\u2029'
+            if newLine or x+glyph.advance>=width:
+                if newLine:
+                    line.extend(pending)
+                    lineWidth += pendingWidth
+                    pending, pendingWidth = [], 0
+                #a word that is too long by itself stays on its line
+                if line or newLine:
+                    lines.append((line, lineWidth-eolSpace))
+                    line, lineWidth = [], 0
+                    x = pendingWidth
+            if not newLine:
+                pending.append((0, glyph))
+                pendingWidth += glyph.advance
+                x += glyph.advance
+            eolSpace = 0
+        line.extend(pending)
+        lines.append((line, lineWidth+pendingWidth))
+        return lines
+    def _makeLayout(self, text, width, alignHoriz, alignVert):
+        font = self._font()
+        if text:
+            lines = self._wrapLines(text, font.get_glyphs(text), width)
+        else:
+            lines = []#pyglet has no lines at all, rather than an empty one
+        lineHeight = font.ascent-font.descent
+        contentWidth = max([0]+[lineWidth for glyphs, lineWidth in lines])
+        contentHeight = len(lines)*lineHeight
+        #the offset of the text within its frame, as in pyglet.font.Text
+        if alignHoriz in ['center', 'centre']: left = (width-contentWidth//2) - width//2
+        elif alignHoriz=='right': left = 2*width-contentWidth - width
+        else: left = 0
+        if alignVert=='baseline': top = font.ascent
+        elif alignVert=='bottom': top = contentHeight
+        elif alignVert in ['center', 'centre']:
+            if len(lines)==1: top = font.ascent//2 - font.descent//4
+            else: top = contentHeight//2
+        else: top = 0
+        #build the quads of the visible glyphs, grouped by the texture they are in
+        quads = {}#texture id:[vertices, texCoords]
+        for lineN, (glyphs, lineWidth) in enumerate(lines):
+            x = left
+            y = top - font.ascent - lineN*lineHeight#the line's baseline
+            for kern, glyph in glyphs:
+                x += kern
+                v0, v1, v2, v3 = glyph.vertices
+                if v0!=v2 and v1!=v3:#i.e. not whitespace
+                    v0, v1, v2, v3 = int(v0+x), int(v1+y), int(v2+x), int(v3+y)
+                    vertices, texCoords = quads.setdefault(glyph.owner.id, ([], []))
+                    vertices.extend([v0, v1, v2, v1, v2, v3, v0, v3])
+                    texCoords.extend(glyph.tex_coords)
+                x += glyph.advance
+        return _TextLayout(quads, width, contentHeight)
+
+class _TextLayout(object):
+    """The glyph quads of a text (see :class:`_GlyphAtlas`), ready to be drawn
+    with vertex arrays
+    """
+    def __init__(self, quads, width, height):
+        """`quads` is a dict of {textureID: (vertices, texCoords)} with the
+        vertices as x,y (2 values) and texCoords as s,t,r (3 values) per corner
+        """
+        self.width = width
+        self.height = height
+        self._draws = []#(textureID, first, count)
+        vertices, texCoords = [], []
+        for texID, (texVertices, texTexCoords) in sorted(quads.items()):
+            self._draws.append((texID, len(vertices)//2, len(texVertices)//2))
+            vertices.extend(texVertices)
+            texCoords.extend(texTexCoords)
+        self._vertices = numpy.array(vertices, numpy.float32)
+        self._texCoords = numpy.array(texCoords, numpy.float32)
+    def draw(self):
+        """Draws the glyphs, with the current color, on texture unit 0 (which
+        should already be enabled)
+        """
+        if not self._draws:
+            return
+        GL.glPushClientAttrib(GL.GL_CLIENT_VERTEX_ARRAY_BIT)
+        GL.glVertexPointer(2, GL.GL_FLOAT, 0, self._vertices.ctypes)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glClientActiveTexture(GL.GL_TEXTURE0)
+        GL.glTexCoordPointer(3, GL.GL_FLOAT, 0, self._texCoords.ctypes)
+        GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        for texID, first, count in self._draws:
+            GL.glBindTexture(GL.GL_TEXTURE_2D, texID)
+            GL.glDrawArrays(GL.GL_QUADS, first, count)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glPopClientAttrib()
 
 def pointInPolygon(x, y, poly):
     """Determine if a point (`x`, `y`) is inside a polygon, using the ray casting method.
@@ -7326,11 +8823,11 @@ def pointInPolygon(x, y, poly):
     If given a `ShapeStim`-based object, will use the
     rendered vertices and position as the polygon.
 
-    Returns True (inside) or False (outside). Used by :class:`~psychopy.visual.ShapeStim` `.contains()`
-    """
-    # looks powerful but has a C dependency: http://pypi.python.org/pypi/Shapely
-    # see also https://github.com/jraedler/Polygon2/
+    `x` and `y` can also be arrays, to test many points in one go.
 
+    Returns True (inside) or False (outside), or an array of them for arrays
+    of points. Used by :class:`~psychopy.visual.ShapeStim` `.contains()`
+    """
     if hasattr(poly, '_verticesRendered') and hasattr(poly, '_posRendered'):
         poly = poly._verticesRendered + poly._posRendered
     nVert = len(poly)
@@ -7339,35 +8836,35 @@ def pointInPolygon(x, y, poly):
         logging.warning(msg)
         return False
 
-    # faster if have matplotlib.nxutils:
-    if haveNxutils:
-        return bool(nxutils.pnpoly(x, y, poly))
-
-    # fall through to pure python:
     # as adapted from http://local.wasp.uwa.edu.au/~pbourke/geometry/insidepoly/
     # via http://www.ariel.com.au/a/python-point-int-poly.html
-
-    inside = False
-    # trace (horizontal?) rays, flip inside status if cross an edge:
-    p1x, p1y = poly[-1]
-    for p2x, p2y in poly:
-        if y > min(p1y, p2y) and y <= max(p1y, p2y) and x <= max(p1x, p2x):
-            if p1y != p2y:
-                xints = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-            if p1x == p2x or x <= xints:
-                inside = not inside
-        p1x, p1y = p2x, p2y
+    # but for all the points and edges at once (points along the first axis)
+    isScalar = numpy.isscalar(x) and numpy.isscalar(y)
+    x = numpy.asarray(x, float).reshape([-1,1])
+    y = numpy.asarray(y, float).reshape([-1,1])
+    poly = numpy.asarray(poly, float)
+    p1x, p1y = numpy.roll(poly[:,0], 1), numpy.roll(poly[:,1], 1)#the previous vertex
+    p2x, p2y = poly[:,0], poly[:,1]
+    # trace horizontal rays, flip inside status each time one crosses an edge:
+    crosses = (y > numpy.minimum(p1y, p2y)) & (y <= numpy.maximum(p1y, p2y)) \
+        & (x <= numpy.maximum(p1x, p2x))
+    dy = numpy.where(p1y != p2y, p2y - p1y, 1.0)#horizontal edges never cross anyway
+    xints = (y - p1y) * (p2x - p1x) / dy + p1x
+    crosses &= (p1x == p2x) | (x <= xints)
+    inside = crosses.sum(axis=1) % 2 == 1
+    if isScalar:
+        return bool(inside[0])
     return inside
 
 def polygonsOverlap(poly1, poly2):
-    """Determine if two polygons intersect; can fail for pointy polygons.
+    """Determine if two polygons intersect.
 
     Accepts two polygons, as lists of vertices (x,y) pairs. If given `ShapeStim`-based
     instances, will use rendered (vertices + pos) as the polygon.
 
-    Checks if any vertex of one polygon is inside the other polygon; will fail in
-    some cases, especially for pointy polygons. "crossed-swords" configurations
-    overlap but may not be detected by the algorithm.
+    The polygons overlap if a vertex of one is inside the other or if any of
+    their edges cross (which also catches "crossed-swords" configurations,
+    where neither has a vertex inside the other).
 
     Used by :class:`~psychopy.visual.ShapeStim` `.overlaps()`
     """
@@ -7375,22 +8872,125 @@ def polygonsOverlap(poly1, poly2):
         poly1 = poly1._verticesRendered + poly1._posRendered
     if hasattr(poly2, '_verticesRendered') and hasattr(poly2, '_posRendered'):
         poly2 = poly2._verticesRendered + poly2._posRendered
+    poly1 = numpy.asarray(poly1, float)
+    poly2 = numpy.asarray(poly2, float)
+
+    if numpy.any(pointInPolygon(poly1[:,0], poly1[:,1], poly2)):
+        return True
+    if numpy.any(pointInPolygon(poly2[:,0], poly2[:,1], poly1)):
+        return True
+    return _edgesCross(poly1, poly2)
+
+def _edgesCross(poly1, poly2):
+    """True if any edge of polygon `poly1` intersects (or touches) any edge of
+    `poly2` (both arrays of Nx2 vertices)"""
+    a1 = poly1[:,numpy.newaxis,:]; a2 = numpy.roll(poly1, -1, axis=0)[:,numpy.newaxis,:]
+    b1 = poly2[numpy.newaxis,:,:]; b2 = numpy.roll(poly2, -1, axis=0)[numpy.newaxis,:,:]
+    def orientation(o, p, q):#sign of the cross product (p-o)x(q-o)
+        return numpy.sign((p[...,0]-o[...,0])*(q[...,1]-o[...,1]) -
+                          (p[...,1]-o[...,1])*(q[...,0]-o[...,0]))
+    d1 = orientation(b1, b2, a1); d2 = orientation(b1, b2, a2)
+    d3 = orientation(a1, a2, b1); d4 = orientation(a1, a2, b2)
+    cross = (d1*d2 <= 0) & (d3*d4 <= 0)
+    #edges on the same line only touch if their extents overlap
+    collinear = (d1==0) & (d2==0) & (d3==0) & (d4==0)
+    if numpy.any(collinear):
+        separate = numpy.zeros(collinear.shape, bool)
+        for dim in [0,1]:
+            separate |= (numpy.maximum(a1[...,dim], a2[...,dim]) < numpy.minimum(b1[...,dim], b2[...,dim])) \
+                | (numpy.maximum(b1[...,dim], b2[...,dim]) < numpy.minimum(a1[...,dim], a2[...,dim]))
+        cross &= ~(collinear & separate)
+    return bool(numpy.any(cross))
+
+class StimulusIndex(object):
+    """Finds which of many stimuli contain a point, e.g. the mouse on every
+    frame, much more quickly than calling each stimulus' `contains()`::
+
+        targets = [visual.Circle(win, radius=10, pos=xy) for xy in positions]
+        index = visual.StimulusIndex(targets)
+        ...
+        hits = index.contains(mouse)#the stimuli under the mouse
+
+    The stimuli (ShapeStims and others with rendered vertices) must all use
+    the same units. Their outlines (with pos, ori and size applied) and
+    bounding boxes are worked out when the index is created. The boxes are
+    stored in a grid of cells so each query only looks at the stimuli near
+    the point, and only those whose box contains the point get the full
+    point-in-polygon test. Call :meth:`update` after moving, resizing or
+    rotating any of the stimuli.
+    """
+    def __init__(self, stimuli, cellSize=None):
+        """
+        :Parameters:
 
-    # faster if have matplotlib.nxutils:
-    if haveNxutils:
-        if any(nxutils.points_inside_poly(poly1, poly2)):
-            return True
-        return any(nxutils.points_inside_poly(poly2, poly1))
-
-    # fall through to pure python:
-    for p1 in poly1:
-        if pointInPolygon(p1[0], p1[1], poly2):
-            return True
-    for p2 in poly2:
-        if pointInPolygon(p2[0], p2[1], poly1):
-            return True
-    return False
-
+            stimuli : a list of stimuli
+            cellSize : size of the (square) grid cells, in the rendered units of
+                the stimuli (pix for 'deg', 'cm' and 'pix'). By default twice the
+                median width of the stimuli
+        """
+        self.stimuli = list(stimuli)
+        units = set([stim.units for stim in self.stimuli])
+        if len(units)>1:
+            raise ValueError("The stimuli of a StimulusIndex must all use the same units (got %s)" %list(units))
+        self.cellSize = cellSize
+        self.update()
+    def update(self):
+        """Recalculates the outlines of the stimuli and the grid (after any of
+        them have changed)
+        """
+        self._polygons = []
+        bounds = numpy.zeros([len(self.stimuli), 4])#left, bottom, right, top
+        for stimN, stim in enumerate(self.stimuli):
+            if getattr(stim, 'needVertexUpdate', False):
+                stim._calcVerticesRendered()
+            if stim.ori:
+                poly = stim._getPolyAsRendered()
+            else:
+                poly = stim._verticesRendered + stim._posRendered
+            poly = numpy.asarray(poly, float)
+            self._polygons.append(poly)
+            bounds[stimN] = poly.min(axis=0).tolist() + poly.max(axis=0).tolist()
+        self._bounds = bounds
+        #put each stimulus in every grid cell that its bounding box touches
+        self._cells = {}
+        if not len(self.stimuli):
+            return
+        cellSize = self.cellSize
+        if cellSize is None:
+            cellSize = 2*numpy.median(bounds[:,2]-bounds[:,0])
+        self._cellSize = max(cellSize, 1e-9)
+        cellBounds = numpy.floor(bounds/self._cellSize).astype(int)
+        for stimN, (left, bottom, right, top) in enumerate(cellBounds):
+            for cellX in range(left, right+1):
+                for cellY in range(bottom, top+1):
+                    self._cells.setdefault((cellX, cellY), []).append(stimN)
+        for cell in self._cells:
+            self._cells[cell] = numpy.array(self._cells[cell])
+    def contains(self, x, y=None):
+        """Returns the list of stimuli (in their original order) that contain
+        the point. Accepts the same arguments as the stimuli's `contains()`:
+        x and y, an (x,y) pair or an object with getPos() such as a mouse.
+        """
+        if not len(self.stimuli):
+            return []
+        if hasattr(x, 'getPos'):
+            x, y = x.getPos()
+        elif type(x) in [list, tuple, numpy.ndarray]:
+            x, y = x[0], x[1]
+        stim = self.stimuli[0]
+        if stim.units in ['deg','degs']:
+            x, y = stim.win.getUnitConverter().deg2pix(numpy.array((x, y)))
+        elif stim.units == 'cm':
+            x, y = stim.win.getUnitConverter().cm2pix(numpy.array((x, y)))
+        cell = (int(numpy.floor(x/self._cellSize)), int(numpy.floor(y/self._cellSize)))
+        candidates = self._cells.get(cell)
+        if candidates is None:
+            return []
+        bounds = self._bounds[candidates]
+        candidates = candidates[(bounds[:,0]<=x) & (bounds[:,2]>=x) &
+                                (bounds[:,1]<=y) & (bounds[:,3]>=y)]
+        return [self.stimuli[stimN] for stimN in candidates
+                if pointInPolygon(x, y, self._polygons[stimN])]
 
 def _setTexIfNoShaders(obj):
     """Useful decorator for classes that need to update Texture after other properties